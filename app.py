@@ -1,6 +1,16 @@
+import codecs
+import hashlib
+import io
 import json
+import logging
+import os
+import random
+import re
+import sqlite3
 import sys
-from datetime import datetime
+import time
+from array import array
+from datetime import datetime, timezone
 from pathlib import Path
 
 import numpy as np
@@ -11,6 +21,8 @@ import streamlit.components.v1 as components
 import html
 import urllib.parse
 
+logger = logging.getLogger(__name__)
+
 # 获取应用程序所在目录（支持打包后的EXE和直接运行的脚本）
 if getattr(sys, 'frozen', False):
     # 作为打包后的可执行文件运行
@@ -26,6 +38,12 @@ except ImportError:  # pragma: no cover - optional dependency
     float_init = None
     STREAMLIT_FLOAT_READY = False
 
+try:
+    import pyarrow  # type: ignore  # noqa: F401 - lets pandas use its multithreaded CSV engine
+    PYARROW_READY = True
+except ImportError:  # pragma: no cover - optional dependency
+    PYARROW_READY = False
+
 
 st.set_page_config(
     page_title="Hevy Analyzer",
@@ -153,39 +171,6 @@ st.markdown(
     [data-testid="stSidebar"] div[data-testid="stSelectbox"] div[data-baseweb="select"] * {
         color: #111111 !important;
     }
-    .fetch-overlay {
-        position: fixed;
-        inset: 0;
-        background: rgba(8, 12, 22, 0.88);
-        z-index: 9999;
-        display: flex;
-        flex-direction: column;
-        align-items: center;
-        justify-content: center;
-        gap: 0.75rem;
-        color: #f5f6fa;
-        font-size: 1.1rem;
-        font-weight: 500;
-    }
-    .fetch-overlay .spinner {
-        width: 48px;
-        height: 48px;
-        border-radius: 50%;
-        border: 3px solid rgba(255, 255, 255, 0.18);
-        border-top-color: rgba(79, 123, 255, 0.9);
-        animation: spin 0.8s linear infinite;
-    }
-    .fetch-overlay .log-line {
-        font-size: 0.85rem;
-        color: rgba(245, 246, 250, 0.82);
-    }
-    .fetch-overlay .log-line strong {
-        color: #f5f6fa;
-    }
-    @keyframes spin {
-        from { transform: rotate(0deg); }
-        to { transform: rotate(360deg); }
-    }
     main h1 {
         margin-bottom: 0.35rem;
     }
@@ -570,39 +555,6 @@ st.markdown(
     [data-testid="stSidebar"] div[data-testid="stSelectbox"] div[data-baseweb="select"] * {
         color: #111111 !important;
     }
-    .fetch-overlay {
-        position: fixed;
-        inset: 0;
-        background: rgba(8, 12, 22, 0.88);
-        z-index: 999999;
-        display: flex;
-        flex-direction: column;
-        align-items: center;
-        justify-content: center;
-        gap: 0.75rem;
-        color: #f5f6fa;
-        font-size: 1.1rem;
-        font-weight: 500;
-    }
-    .fetch-overlay .spinner {
-        width: 48px;
-        height: 48px;
-        border-radius: 50%;
-        border: 3px solid rgba(255, 255, 255, 0.18);
-        border-top-color: rgba(79, 123, 255, 0.9);
-        animation: spin 0.8s linear infinite;
-    }
-    .fetch-overlay .log-line {
-        font-size: 0.85rem;
-        color: rgba(245, 246, 250, 0.82);
-    }
-    .fetch-overlay .log-line strong {
-        color: #f5f6fa;
-    }
-    @keyframes spin {
-        from { transform: rotate(0deg); }
-        to { transform: rotate(360deg); }
-    }
     main h1 {
         margin-bottom: 0.35rem;
     }
@@ -1311,6 +1263,7 @@ IN_TO_CM = 2.54
 CM_TO_IN = 1 / IN_TO_CM
 
 MUSCLE_GROUPS = ["Back", "Chest", "Core", "Shoulders", "Arms", "Legs"]
+MUSCLE_DISTRIBUTION_METRICS = ["Workouts", "Duration", "Volume", "Sets"]
 
 # 细肌肉 -> 六大肌群映射（根据 exercises.csv 里的 primary_muscle / other_muscles）
 MUSCLE_TO_GROUP = {
@@ -1454,22 +1407,6 @@ def render_segmented_buttons(
     return selected
 
 
-def build_fetch_overlay(progress_lines: list[str]) -> str:
-    """Compose the HTML for the full-screen fetch overlay including progress logs."""
-    logs_html = "".join(
-        f"<div class='log-line'><strong>Step {idx + 1}:</strong> {line}</div>"
-        for idx, line in enumerate(progress_lines)
-    )
-    return (
-        "<div class=\"fetch-overlay\">"
-        "<div class=\"spinner\"></div>"
-        "<div>Fetching workouts from Hevy...</div>"
-        "<div style=\"font-size:0.85rem; font-weight:400; color: rgba(245,246,250,0.75);\">Hang tight—this might take a few seconds.</div>"
-        f"<div style=\"margin-top:0.75rem; text-align:center;\">{logs_html}</div>"
-        "</div>"
-    )
-
-
 # -----------------------------------
 # 数据加载
 # -----------------------------------
@@ -1719,6 +1656,62 @@ def convert_distance_for_display(value_km: float | pd.Series) -> float | pd.Seri
 API_KEY_STORE_PATH = APP_DIR / ".remembered_api_key.json"
 USER_PREFS_PATH = APP_DIR / ".user_preferences.json"
 CUSTOM_EXERCISES_PATH = APP_DIR / "custom_exercises.csv"
+WORKOUT_STORE_PATH = APP_DIR / ".workout_store.sqlite3"
+WORKOUT_STORE_SCHEMA_VERSION = 1
+# data source -> table holding that source's normalized set rows
+WORKOUT_STORE_TABLES = {
+    "Upload CSV File": "csv_sets",
+    "Connect to Hevy API": "api_sets",
+}
+
+# Hevy API endpoint; override with HEVY_API_BASE_URL to point at a local fake server
+HEVY_API_BASE_URL = os.environ.get("HEVY_API_BASE_URL", "https://api.hevyapp.com").rstrip("/")
+HEVY_API_PAGE_SIZE = 10  # Hevy API限制最大为10
+HEVY_API_MAX_CONCURRENCY = 4  # parallel page requests during a full fetch
+HEVY_API_MAX_RETRIES = 5  # retries per request on 429/5xx/connection errors
+HEVY_API_RETRY_BASE_DELAY = 0.5  # seconds, doubled per attempt (with jitter)
+HEVY_API_MAX_RETRY_DELAY = 30.0  # upper bound for backoff and Retry-After waits
+HEVY_FETCH_POLL_INTERVAL = 1.0  # seconds between UI refreshes while a background fetch runs
+HEVY_FETCH_CANCELLED_MESSAGE = "Fetch cancelled"
+
+# CSV uploads: encoding is detected from this many leading bytes
+CSV_ENCODING_SAMPLE_BYTES = 64 * 1024
+# tried after UTF-8, in order; gbk only counts when the text reads as Chinese (see count_gb2312_characters),
+# latin-1 accepts any byte sequence so it goes last
+CSV_FALLBACK_ENCODINGS = ("gbk", "cp1252", "latin-1")
+NON_ASCII_BYTE = re.compile(rb"[\x80-\xff]")
+CSV_CHUNK_BYTES = 16 * 2**20  # CSV uploads are parsed and normalized this many bytes at a time
+# Parsed uploads are cached on disk by a digest of the file bytes; least recently used entries
+# are evicted once the cache grows past CSV_PARSE_CACHE_MAX_BYTES
+CSV_PARSE_CACHE_DIR = APP_DIR / ".csv_parse_cache"
+CSV_PARSE_CACHE_MAX_BYTES = 512 * 2**20
+CSV_PARSE_CACHE_VERSION = 1  # bump when ingest_hevy_csv output changes so stale entries are ignored
+# Frames kept per pipeline stage (see get_processed_workouts) and session, least recently used first out
+PIPELINE_CACHE_MAX_ENTRIES = 2
+# Timestamp layouts seen in Hevy data (API, then CSV exports like "1 Dec 2025, 12:05"); each
+# column is parsed with the first one that fits a sample of its distinct values
+HEVY_TIMESTAMP_FORMATS = ("ISO8601", "%d %b %Y, %H:%M", "%d %B %Y, %H:%M", "%d %b %Y, %H:%M:%S")
+TIMESTAMP_FORMAT_SAMPLE_SIZE = 50
+# Declared dtypes for the columns of a Hevy export; other columns keep pandas' inference.
+# Timestamps stay text (their format varies between exports) and are parsed in prepare_workout_df.
+HEVY_CSV_SCHEMA = {
+    "title": "category",
+    "start_time": str,
+    "end_time": str,
+    "description": str,
+    "exercise_title": "category",
+    "superset_id": "category",
+    "exercise_notes": str,
+    "set_index": "float64",
+    "set_type": "category",
+    "weight_kg": "float64",
+    "weight_lbs": "float64",
+    "reps": "float64",
+    "distance_km": "float64",
+    "distance_miles": "float64",
+    "duration_seconds": "float64",
+    "rpe": "float64",
+}
 
 
 def load_custom_exercises() -> pd.DataFrame:
@@ -1885,36 +1878,666 @@ def update_user_preferences(**kwargs) -> None:
         pass
 
 
-@st.cache_data
-def load_hevy_workouts(file) -> pd.DataFrame:
+def open_workout_store() -> sqlite3.Connection:
+    """Open the on-disk workout store, resetting it if the schema version changed."""
+    conn = sqlite3.connect(WORKOUT_STORE_PATH)
+    conn.execute("CREATE TABLE IF NOT EXISTS store_info (key TEXT PRIMARY KEY, value TEXT)")
+    row = conn.execute("SELECT value FROM store_info WHERE key = 'schema_version'").fetchone()
+    if row is None or row[0] != str(WORKOUT_STORE_SCHEMA_VERSION):
+        with conn:
+            tables = [
+                name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+                if name != "store_info"
+            ]
+            for name in tables:
+                conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+            conn.execute("CREATE TABLE datasets (source TEXT PRIMARY KEY, meta TEXT NOT NULL)")
+            conn.execute(
+                "INSERT OR REPLACE INTO store_info (key, value) VALUES ('schema_version', ?)",
+                (str(WORKOUT_STORE_SCHEMA_VERSION),),
+            )
+    return conn
+
+
+def write_store_meta(conn: sqlite3.Connection, source: str, meta: dict) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO datasets (source, meta) VALUES (?, ?)",
+        (source, json.dumps(meta, default=str)),
+    )
+
+
+def save_dataset_to_store(source: str, df: pd.DataFrame, meta: dict) -> None:
+    """Replace everything stored for `source` with the given set rows.
+
+    Errors (sqlite3.Error, OSError, ValueError) propagate; the app runs this
+    through queue_store_write, which reports them.
     """
-    用户上传的 hevy_workouts.csv
-    必须至少包含列：
-      - title
-      - start_time
-      - end_time
-      - exercise_title
-      - set_type
-      - weight_kg
-      - reps
+    table = WORKOUT_STORE_TABLES.get(source)
+    if table is None or df is None:
+        return
+    conn = open_workout_store()
+    try:
+        with conn:
+            conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+            df.to_sql(table, conn, index=False)
+            write_store_meta(conn, source, meta)
+    finally:
+        conn.close()
+
+
+def apply_workout_changes_to_store(source: str, new_rows: pd.DataFrame, touched_workout_ids, meta: dict,
+                                   full_df: pd.DataFrame) -> None:
+    """Incrementally update `source`: drop rows of touched workouts, append new rows.
+
+    With no touched workouts this is a plain append (see append_import_to_dataset).
+
+    Falls back to rewriting the whole dataset (full_df) when the stored table is
+    missing or its columns no longer match. Errors propagate, as in
+    save_dataset_to_store.
     """
-    # Try multiple encodings to handle different file sources
-    encodings_to_try = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252', 'gbk', 'gb2312']
-    
-    for encoding in encodings_to_try:
+    table = WORKOUT_STORE_TABLES.get(source)
+    if table is None:
+        return
+    touched = [str(wid) for wid in touched_workout_ids]
+    conn = open_workout_store()
+    try:
+        stored_columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+        needs_rewrite = stored_columns != list(full_df.columns) or bool(touched and "workout_uuid" not in stored_columns)
+        if not needs_rewrite:
+            with conn:
+                for start in range(0, len(touched), 500):
+                    chunk = touched[start : start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    conn.execute(f'DELETE FROM "{table}" WHERE workout_uuid IN ({placeholders})', chunk)
+                if new_rows is not None and not new_rows.empty:
+                    new_rows[stored_columns].to_sql(table, conn, index=False, if_exists="append")
+                write_store_meta(conn, source, meta)
+    finally:
+        conn.close()
+    if needs_rewrite:
+        save_dataset_to_store(source, full_df, meta)
+
+
+@st.cache_resource
+def get_workout_store_writer():
+    """Single background thread for workout store writes, so they land in the order they were queued."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="workout-store")
+
+
+def queue_store_write(source: str, write, *args) -> None:
+    """Run a store write (save_dataset_to_store / apply_workout_changes_to_store) off the script thread.
+
+    Saving a large upload takes seconds; the data is already in session state,
+    so the page doesn't wait for it. collect_store_writes reports failures.
+    """
+    future = get_workout_store_writer().submit(write, *args)
+    st.session_state.setdefault("store_write_jobs", []).append({"source": source, "future": future})
+
+
+def collect_store_writes() -> None:
+    """Drop finished background store writes, logging and showing the ones that failed."""
+    pending = []
+    for job in st.session_state.get("store_write_jobs", []):
+        future = job["future"]
+        if not future.done():
+            pending.append(job)
+            continue
+        error = future.exception()
+        if error is not None:
+            logger.error("Saving %s to the local workout store failed", job["source"], exc_info=error)
+            st.session_state.setdefault("header_messages", []).append(
+                ("error", f"Could not save {job['source']} data locally ({error}); it won't be restored after a restart.")
+            )
+    st.session_state["store_write_jobs"] = pending
+
+
+def read_stored_dataset(conn: sqlite3.Connection, source: str, table: str) -> pd.DataFrame:
+    """Read one source's set rows back with the dtypes they were saved with.
+
+    SQLite keeps no pandas dtypes: parsed start_dt/end_dt come back as text,
+    categoricals as plain strings and all-NULL numeric columns as object.
+    CSV uploads get their HEVY_CSV_SCHEMA dtypes back; API data (whose text
+    columns were never categorical) and merged API rows only their floats.
+    """
+    stored_columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+    df = pd.read_sql(
+        f'SELECT * FROM "{table}"',
+        conn,
+        # to_sql writes ISO text, with fractional seconds only on the rows that have them
+        parse_dates={column: {"format": "ISO8601"} for column in ("start_dt", "end_dt") if column in stored_columns},
+    )
+    if source == "Upload CSV File":
+        df = apply_hevy_csv_schema(df)
+    float_columns = [column for column, dtype in HEVY_CSV_SCHEMA.items() if dtype == "float64"] + ["body_weight"]
+    for column in float_columns:
+        if column in df.columns and df[column].dtype == object:
+            df[column] = pd.to_numeric(df[column], errors="coerce").astype("float64")
+    return df
+
+
+def load_datasets_from_store() -> tuple[dict, dict]:
+    """Load every stored source as ({source: df}, {source: meta})."""
+    data_cache, data_meta = {}, {}
+    if not WORKOUT_STORE_PATH.exists():
+        return data_cache, data_meta
+    try:
+        conn = open_workout_store()
         try:
-            # Reset file position if it's a file-like object
-            if hasattr(file, 'seek'):
-                file.seek(0)
-            df = pd.read_csv(file, encoding=encoding)
-            return df
-        except (UnicodeDecodeError, UnicodeError):
+            for source, meta_json in conn.execute("SELECT source, meta FROM datasets").fetchall():
+                table = WORKOUT_STORE_TABLES.get(source)
+                if table is None:
+                    continue
+                try:
+                    df = read_stored_dataset(conn, source, table)
+                except (sqlite3.Error, pd.errors.DatabaseError):
+                    continue
+                data_cache[source] = df
+                data_meta[source] = json.loads(meta_json)
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError, json.JSONDecodeError):
+        return {}, {}
+    return data_cache, data_meta
+
+
+def count_gb2312_characters(text: str) -> tuple[int, int]:
+    """(non-ASCII characters, how many of them are GB2312 characters) in decoded text.
+
+    Western cp1252 text often decodes as GBK too ("Crème" -> "Cr鑝e"): an accented
+    letter and the ASCII letter after it form one double-byte character, but
+    always a rare GBK-extension one, never one of GB2312's common characters.
+    """
+    ascii_count = len(text.encode("ascii", "ignore"))
+    # GB2312 characters take two bytes, the rest are dropped
+    return len(text) - ascii_count, (len(text.encode("gb2312", "ignore")) - ascii_count) // 2
+
+
+def reads_as_chinese(wide: int, common: int) -> bool:
+    """GBK-decoded text is accepted when most of its non-ASCII characters are GB2312 ones."""
+    return common * 2 > wide
+
+
+def detect_csv_encoding(sample: bytes) -> str:
+    """Guess a CSV's encoding from its first bytes: BOM, then strict UTF-8, then legacy code pages."""
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    for encoding in ("utf-8",) + CSV_FALLBACK_ENCODINGS:
+        try:
+            # Incremental so a multi-byte character cut off by the sample end doesn't count as an error
+            text = codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+        except UnicodeDecodeError:
             continue
-    
-    # If all encodings fail, try with error handling
-    if hasattr(file, 'seek'):
+        if encoding == "gbk" and not reads_as_chinese(*count_gb2312_characters(text)):
+            continue
+        return encoding
+    return CSV_FALLBACK_ENCODINGS[-1]
+
+
+def csv_encoding_candidates(stream, start: int = 0) -> list[str]:
+    """Encodings to try for an uploaded CSV, best guess first.
+
+    Only CSV_ENCODING_SAMPLE_BYTES from start are inspected. Bytes past the
+    sample are checked by the CSV reader itself: a decode error there makes
+    ingest_hevy_csv move on to the next candidate, so a normal upload is read
+    exactly once.
+    """
+    stream.seek(start)
+    detected = detect_csv_encoding(stream.read(CSV_ENCODING_SAMPLE_BYTES))
+    return [detected] + [enc for enc in ("utf-8",) + CSV_FALLBACK_ENCODINGS if enc != detected]
+
+
+def first_non_ascii_offset(stream) -> int:
+    """Byte offset of the first non-ASCII byte in a binary stream (0 if there is none)."""
+    stream.seek(0)
+    offset = 0
+    while True:
+        block = stream.read(CSV_ENCODING_SAMPLE_BYTES)
+        if not block:
+            return 0
+        match = NON_ASCII_BYTE.search(block)
+        if match:
+            return offset + match.start()
+        offset += len(block)
+
+
+def open_csv_stream(file):
+    """Seekable binary stream for an upload, a path or a text file-like object."""
+    if not hasattr(file, "read"):
+        return open(file, "rb")
+    if hasattr(file, "seek"):
+        # Reset file position if it's a file-like object
         file.seek(0)
-    df = pd.read_csv(file, encoding='utf-8', errors='replace')
+    if isinstance(file, io.TextIOBase) or isinstance(file.read(0), str):
+        return io.BytesIO(file.read().encode("utf-8"))
+    return file
+
+
+def iter_hevy_csv_chunks(stream, encoding: str, chunk_bytes: int = CSV_CHUNK_BYTES, declared_types: bool = True):
+    """Parse a binary CSV stream about chunk_bytes at a time; yields (df, bytes_read).
+
+    Known columns get their HEVY_CSV_SCHEMA dtype (pyarrow's streaming reader
+    when available, otherwise pandas' C engine). declared_types=False infers
+    each chunk and coerces it instead, for files whose values don't fit the
+    declared types; a ValueError from the first pass means that is needed.
+    Bytes that don't fit encoding raise UnicodeDecodeError from either reader.
+    """
+    stream.seek(0)
+    if PYARROW_READY and declared_types:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+
+        arrow_types = {
+            "category": pa.dictionary(pa.int32(), pa.string()),
+            "float64": pa.float64(),
+            str: pa.string(),
+        }
+        try:
+            reader = pa_csv.open_csv(
+                stream,
+                # pyarrow skips a UTF-8 BOM on its own
+                read_options=pa_csv.ReadOptions(
+                    encoding="utf8" if encoding == "utf-8-sig" else encoding,
+                    block_size=chunk_bytes,
+                ),
+                convert_options=pa_csv.ConvertOptions(
+                    column_types={column: arrow_types[dtype] for column, dtype in HEVY_CSV_SCHEMA.items()},
+                    strings_can_be_null=True,
+                ),
+            )
+            for batch in reader:
+                # An undeclared column with invalid UTF-8 in the first block is inferred as binary
+                binary = [field.name for field in batch.schema if pa.types.is_binary(field.type)]
+                if binary:
+                    raise UnicodeDecodeError(encoding, b"", 0, 0, f"invalid UTF8 data in column {binary[0]}")
+                # Dictionary columns arrive as categoricals
+                yield apply_hevy_csv_schema(batch.to_pandas()), stream.tell()
+        except pa.ArrowInvalid as exc:
+            # pyarrow validates UTF-8 itself; other encodings fail in Python's codec
+            if "invalid UTF8" not in str(exc):
+                raise
+            raise UnicodeDecodeError(encoding, b"", 0, 0, str(exc)) from None
+        return
+
+    # pandas chunks by rows: size them from the sample's average line length
+    sample = stream.read(CSV_ENCODING_SAMPLE_BYTES)
+    stream.seek(0)
+    rows_per_chunk = max(chunk_bytes * max(sample.count(b"\n"), 1) // max(len(sample), 1), 1000)
+    reader = pd.read_csv(
+        stream,
+        encoding=encoding,
+        dtype=HEVY_CSV_SCHEMA if declared_types else None,
+        chunksize=rows_per_chunk,
+    )
+    with reader:
+        for chunk in reader:
+            yield apply_hevy_csv_schema(chunk), stream.tell()
+
+
+def concat_csv_columns(pieces: dict) -> pd.DataFrame:
+    """Join per-chunk column pieces into one frame, one column at a time.
+
+    Categorical pieces are unioned so they stay categorical; each column's
+    pieces are released as soon as it is built.
+    """
+    from pandas.api.types import union_categoricals
+
+    columns = {}
+    for name in list(pieces):
+        parts = pieces.pop(name)
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            columns[name] = pd.Series(union_categoricals(parts, ignore_order=True), name=name)
+        else:
+            columns[name] = pd.concat(parts, ignore_index=True)
+        del parts
+    return pd.DataFrame(columns, copy=False)
+
+
+def merge_measurement_info(merged: dict, chunk_info: dict) -> None:
+    """Fold one chunk's normalize_measurement_units info into merged, keeping the first detected unit per key."""
+    for key, unit_info in chunk_info.items():
+        if not (merged.get(key) or {}).get("raw_column"):
+            merged[key] = unit_info
+
+
+def read_hevy_csv_pieces(stream, encoding: str, info: dict, chunk_bytes: int = CSV_CHUNK_BYTES,
+                         normalize: bool = True, progress_hook=None, total_bytes: int = 0) -> dict:
+    """Parse the whole stream with one encoding; returns column name -> list of per-chunk pieces.
+
+    Fills info's measurement_info and skipped_duplicate_sets. Raises
+    UnicodeDecodeError as soon as a byte doesn't fit encoding.
+    """
+    for declared_types in (True, False):
+        pieces = {}
+        seen_keys = np.empty(0, dtype=np.uint64)  # sorted hashes of the kept sets
+        info["measurement_info"] = {}
+        info["skipped_duplicate_sets"] = 0
+        try:
+            for chunk, bytes_read in iter_hevy_csv_chunks(stream, encoding, chunk_bytes, declared_types):
+                if normalize:
+                    chunk, chunk_units = normalize_measurement_units(chunk)
+                    merge_measurement_info(info["measurement_info"], chunk_units)
+                    chunk["start_dt"] = parse_workout_timestamps(chunk["start_time"])
+                    chunk["end_dt"] = parse_workout_timestamps(chunk["end_time"])
+                    chunk, seen_keys, skipped = drop_duplicate_csv_sets(chunk, seen_keys)
+                    info["skipped_duplicate_sets"] += skipped
+                for name, column in chunk.items():
+                    pieces.setdefault(name, []).append(column.reset_index(drop=True))
+                del chunk
+                if progress_hook is not None:
+                    progress_hook(bytes_read, total_bytes)
+            return pieces
+        except UnicodeDecodeError:
+            raise
+        except ValueError:
+            if not declared_types:
+                raise
+            # A declared column holds values of another type (e.g. text in reps): infer, then coerce
+
+
+def ingest_hevy_csv(file, progress_hook=None, chunk_bytes: int = CSV_CHUNK_BYTES,
+                    normalize: bool = True) -> tuple[pd.DataFrame, dict]:
+    """Stream a Hevy CSV export into one DataFrame, chunk by chunk.
+
+    With normalize=True each chunk gets metric units (normalize_measurement_units),
+    parsed start_dt/end_dt columns and duplicate sets dropped (same workout
+    title and start, exercise and set index, as in the API converter) before
+    it is kept, so peak memory is the result plus about one chunk rather than
+    several copies of the whole file.
+    progress_hook(bytes_read, total_bytes) is called after every chunk.
+    Returns (df, info) with encoding, measurement_info and skipped_duplicate_sets.
+    """
+    stream = open_csv_stream(file)
+    try:
+        stream.seek(0, os.SEEK_END)
+        total_bytes = stream.tell()
+        encodings = csv_encoding_candidates(stream)
+        info = {"encoding": encodings[0], "measurement_info": {}, "skipped_duplicate_sets": 0}
+
+        while True:
+            encoding = encodings.pop(0)
+            info["encoding"] = encoding
+            try:
+                pieces = read_hevy_csv_pieces(stream, encoding, info, chunk_bytes, normalize, progress_hook, total_bytes)
+                break
+            except UnicodeDecodeError:
+                if not encodings:
+                    raise
+                # A byte past the detection sample doesn't fit: rank the remaining
+                # candidates on a sample from the first non-ASCII byte, then parse again
+                ranked = csv_encoding_candidates(stream, first_non_ascii_offset(stream))
+                encodings = [enc for enc in ranked if enc in encodings]
+
+        if pieces:
+            df = concat_csv_columns(pieces)
+        else:
+            stream.seek(0)
+            df = pd.read_csv(stream, encoding=encoding, nrows=0)
+            if normalize:
+                df, info["measurement_info"] = normalize_measurement_units(df)
+        return df, info
+    finally:
+        if stream is not file:
+            stream.close()
+
+
+def drop_duplicate_csv_sets(chunk: pd.DataFrame, seen_keys: np.ndarray) -> tuple[pd.DataFrame, np.ndarray, int]:
+    """Drop sets already seen in this chunk or earlier ones; returns (chunk, seen_keys, dropped).
+
+    Sets are keyed on workout title and start, exercise and set index. Rows
+    without a set index are kept, like in the API converter.
+    """
+    key_columns = ["title", "start_dt", "exercise_title", "set_index"]
+    if any(column not in chunk.columns for column in key_columns):
+        return chunk, seen_keys, 0
+
+    has_key = chunk["set_index"].notna().to_numpy()
+    hashes = pd.util.hash_pandas_object(chunk[key_columns], index=False).to_numpy()
+    return drop_seen_sets(chunk, hashes, has_key, seen_keys)
+
+
+def drop_seen_sets(frame: pd.DataFrame, hashes: np.ndarray, has_key: np.ndarray,
+                   seen_keys: np.ndarray) -> tuple[pd.DataFrame, np.ndarray, int]:
+    """Drop rows whose key hash repeats within frame or is in seen_keys; returns (frame, seen_keys, dropped).
+
+    seen_keys is a sorted uint64 array of key hashes, so the memory kept for
+    deduplication is 8 bytes per set and a lookup is a binary search. Rows
+    with has_key False are always kept.
+    """
+    # Work on the sorted hashes: repeats become neighbours and lookups into seen_keys stay cache-friendly
+    order = np.argsort(hashes, kind="stable")
+    sorted_hashes = hashes[order]
+    duplicate_sorted = np.zeros(len(sorted_hashes), dtype=bool)
+    duplicate_sorted[1:] = sorted_hashes[1:] == sorted_hashes[:-1]
+    if len(seen_keys):
+        positions = np.minimum(np.searchsorted(seen_keys, sorted_hashes), len(seen_keys) - 1)
+        duplicate_sorted |= seen_keys[positions] == sorted_hashes
+    duplicate_sorted &= has_key[order]
+    duplicate = np.empty_like(duplicate_sorted)
+    duplicate[order] = duplicate_sorted
+    kept_hashes = sorted_hashes[has_key[order] & ~duplicate_sorted]
+    # Both runs are sorted, so the stable sort is effectively a merge
+    seen_keys = np.sort(np.concatenate([seen_keys, kept_hashes]), kind="stable")
+    dropped = int(duplicate.sum())
+    if dropped:
+        frame = frame[~duplicate]
+    return frame, seen_keys, dropped
+
+
+def to_local_workout_times(values: pd.Series) -> pd.Series:
+    """Workout times as naive local time, so CSV exports (local clock) and API data (UTC) line up."""
+    parsed = values if pd.api.types.is_datetime64_any_dtype(values) else parse_workout_timestamps(values)
+    if parsed.dt.tz is not None:
+        from dateutil import tz as dateutil_tz
+
+        parsed = parsed.dt.tz_convert(dateutil_tz.tzlocal()).dt.tz_localize(None)
+    return parsed
+
+
+def prepare_import_batch(df: pd.DataFrame) -> pd.DataFrame:
+    """Bring a CSV or API set frame to the shared import layout before merging.
+
+    Known columns get their HEVY_CSV_SCHEMA dtype and start_dt/end_dt hold
+    naive local times. UTC start_time/end_time text (API data) is rewritten
+    to the same local times, so a merged dataset never mixes UTC and local
+    clock strings. Cheap for frames that are already in this layout.
+    """
+    df = apply_hevy_csv_schema(df.copy(deep=False))
+    for raw_column, parsed_column in (("start_time", "start_dt"), ("end_time", "end_dt")):
+        if parsed_column in df.columns:
+            parsed = df[parsed_column]
+        elif raw_column in df.columns:
+            parsed = parse_workout_timestamps(df[raw_column])
+        else:
+            continue
+        if not pd.api.types.is_datetime64_any_dtype(parsed):
+            parsed = parse_workout_timestamps(parsed)
+        df[parsed_column] = to_local_workout_times(parsed)
+        if parsed.dt.tz is not None and raw_column in df.columns:
+            # "2025-12-01 12:05:00", with fractional seconds only when there are any
+            df[raw_column] = df[parsed_column].astype(str).where(df[parsed_column].notna())
+    return df
+
+
+def hash_import_set_keys(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """Key hashes for merging imports, and which rows have a full key.
+
+    A set is identified by its workout start (to the minute, which is all a
+    CSV export keeps), exercise and set index, so the same workout coming
+    from two exports or from an export and the API matches.
+    """
+    keys = pd.DataFrame({
+        "start": df["start_dt"].dt.floor("min").astype("datetime64[s]"),
+        "exercise_title": df["exercise_title"],
+        "set_index": df["set_index"],
+    })
+    has_key = (keys["start"].notna() & keys["set_index"].notna()).to_numpy()
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy(), has_key
+
+
+def concat_set_frames(frames: list) -> pd.DataFrame:
+    """Stack set frames whose columns may differ; missing columns are filled with NA."""
+    names = list(dict.fromkeys(name for frame in frames for name in frame.columns))
+    pieces = {}
+    for name in names:
+        template = next(frame[name] for frame in frames if name in frame.columns)
+        pieces[name] = [
+            frame[name].reset_index(drop=True) if name in frame.columns
+            else template.iloc[:0].reindex(pd.RangeIndex(len(frame)))
+            for frame in frames
+        ]
+    return concat_csv_columns(pieces)
+
+
+def merge_import_batch(existing_df: pd.DataFrame, new_df: pd.DataFrame, seen_keys: np.ndarray = None):
+    """Append a CSV or API batch onto an existing dataset, keeping overlapping sets once.
+
+    seen_keys is the sorted key hash array of existing_df from the previous
+    merge (see hash_import_set_keys); with it only the new batch is hashed,
+    so an import costs O(batch log history) plus the final concatenation.
+    Returns (merged_df, added_rows, seen_keys, skipped_sets).
+    """
+    new_df = prepare_import_batch(new_df)
+    if existing_df is None or existing_df.empty:
+        existing_df, seen_keys = None, np.empty(0, dtype=np.uint64)
+    elif seen_keys is None:
+        existing_df = prepare_import_batch(existing_df)
+        hashes, has_key = hash_import_set_keys(existing_df)
+        seen_keys = np.sort(hashes[has_key])
+    else:
+        existing_df = prepare_import_batch(existing_df)
+
+    hashes, has_key = hash_import_set_keys(new_df)
+    added, seen_keys, skipped = drop_seen_sets(new_df, hashes, has_key, seen_keys)
+    added = added.reset_index(drop=True)
+    merged = added if existing_df is None else concat_set_frames([existing_df, added])
+    return merged, added, seen_keys, skipped
+
+
+def hash_csv_stream(stream, block_bytes: int = 2**20) -> str:
+    """Streaming digest of a binary stream's bytes (plus the cache version), used as the parse cache key."""
+    digest = hashlib.blake2b(f"hevy-csv-v{CSV_PARSE_CACHE_VERSION}".encode(), digest_size=20)
+    stream.seek(0)
+    while True:
+        block = stream.read(block_bytes)
+        if not block:
+            break
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def get_csv_parse_cache_paths(digest: str) -> tuple[Path, Path]:
+    """(frame file, info file) for a cache entry; Arrow IPC when pyarrow is available, else pickle."""
+    suffix = ".feather" if PYARROW_READY else ".pkl"
+    return CSV_PARSE_CACHE_DIR / f"{digest}{suffix}", CSV_PARSE_CACHE_DIR / f"{digest}.json"
+
+
+def read_csv_parse_cache(digest: str):
+    """Cached (df, info) for a digest, or None. A hit marks the entry as recently used."""
+    frame_path, info_path = get_csv_parse_cache_paths(digest)
+    if not frame_path.exists() or not info_path.exists():
+        return None
+    try:
+        info = json.loads(info_path.read_text(encoding="utf-8"))
+        df = pd.read_feather(frame_path) if frame_path.suffix == ".feather" else pd.read_pickle(frame_path)
+        os.utime(frame_path)
+    except Exception:
+        # Unreadable entry (partial write, format change): drop it and parse again
+        for path in (frame_path, info_path):
+            path.unlink(missing_ok=True)
+        return None
+    return df, info
+
+
+def write_csv_parse_cache(digest: str, df: pd.DataFrame, info: dict) -> None:
+    """Store a parsed upload, then evict least recently used entries over the size budget."""
+    frame_path, info_path = get_csv_parse_cache_paths(digest)
+    try:
+        CSV_PARSE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = frame_path.with_name(frame_path.name + ".tmp")
+        if frame_path.suffix == ".feather":
+            df.to_feather(tmp_path)
+        else:
+            df.to_pickle(tmp_path)
+        info_path.write_text(json.dumps(info), encoding="utf-8")
+        # The frame file appears last, so an entry is only visible once complete
+        os.replace(tmp_path, frame_path)
+        prune_csv_parse_cache()
+    except (OSError, ValueError, TypeError):
+        pass
+
+
+def prune_csv_parse_cache(max_bytes: int = CSV_PARSE_CACHE_MAX_BYTES) -> None:
+    """Delete the least recently used cache entries until the cache fits in max_bytes."""
+    entries = []
+    for frame_path in CSV_PARSE_CACHE_DIR.glob("*.*"):
+        if frame_path.suffix not in (".feather", ".pkl"):
+            continue
+        info_path = frame_path.with_suffix(".json")
+        try:
+            stat = frame_path.stat()
+            size = stat.st_size + (info_path.stat().st_size if info_path.exists() else 0)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, size, frame_path, info_path))
+    total_bytes = sum(entry[1] for entry in entries)
+    for _, size, frame_path, info_path in sorted(entries, key=lambda entry: entry[0]):
+        if total_bytes <= max_bytes:
+            break
+        frame_path.unlink(missing_ok=True)
+        info_path.unlink(missing_ok=True)
+        total_bytes -= size
+
+
+def ingest_hevy_csv_cached(file, progress_hook=None) -> tuple[pd.DataFrame, dict]:
+    """ingest_hevy_csv backed by the on-disk parse cache.
+
+    The key is a digest of the file bytes, so re-uploading an unchanged export
+    (even after a restart or under another name) loads the stored frame instead
+    of parsing it again. info["from_cache"] tells which path was taken.
+    """
+    stream = open_csv_stream(file)
+    try:
+        digest = hash_csv_stream(stream)
+        cached = read_csv_parse_cache(digest)
+        if cached is not None:
+            df, info = cached
+            if progress_hook is not None:
+                stream.seek(0, os.SEEK_END)
+                progress_hook(stream.tell(), stream.tell())
+            return df, {**info, "from_cache": True}
+        df, info = ingest_hevy_csv(stream, progress_hook=progress_hook)
+        write_csv_parse_cache(digest, df, info)
+        return df, {**info, "from_cache": False}
+    finally:
+        if stream is not file:
+            stream.close()
+
+
+def apply_hevy_csv_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Bring known Hevy columns to their HEVY_CSV_SCHEMA dtype (unparseable numbers become NaN)."""
+    text_dtype = pd.Index([], dtype=str).dtype
+    for column, dtype in HEVY_CSV_SCHEMA.items():
+        if column not in df.columns:
+            continue
+        series = df[column]
+        if dtype == "float64":
+            if series.dtype != np.float64:
+                df[column] = pd.to_numeric(series, errors="coerce").astype("float64")
+        elif dtype == "category":
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                series = series.astype("category")
+            if series.cat.categories.dtype != text_dtype:
+                # pyarrow infers e.g. integer superset ids and all-empty chunks have no category
+                # dtype; keep categories textual so chunks can be unioned
+                series = series.cat.rename_categories(series.cat.categories.astype(str))
+            df[column] = series
+        elif series.dtype != text_dtype:
+            df[column] = series.astype(str).where(series.notna())
     return df
 
 
@@ -1928,6 +2551,79 @@ def attach_muscle_groups(workouts: pd.DataFrame, exercises: pd.DataFrame) -> pd.
     return merged
 
 
+def detect_timestamp_format(samples: pd.Series):
+    """First of HEVY_TIMESTAMP_FORMATS that parses every sample, or None."""
+    for timestamp_format in HEVY_TIMESTAMP_FORMATS:
+        try:
+            pd.to_datetime(samples, format=timestamp_format)
+        except (ValueError, TypeError):
+            continue
+        return timestamp_format
+    return None
+
+
+def fill_missing_timestamps(parsed: pd.Series, fallback: pd.Series) -> pd.Series:
+    """parsed with its NaT filled from fallback (aligned on the index).
+
+    A column can mix UTC API times ("...Z") with CSV export times, which are
+    naive local clock times; when one side is tz-aware and the other isn't,
+    both are put on naive local time first, as to_local_workout_times does.
+    """
+    fallback = fallback.reindex(parsed.index)
+    if (parsed.dt.tz is None) != (fallback.dt.tz is None):
+        parsed, fallback = to_local_workout_times(parsed), to_local_workout_times(fallback)
+    return parsed.where(parsed.notna(), fallback)
+
+
+def parse_workout_timestamps(values: pd.Series) -> pd.Series:
+    """Parse timestamps from both API (ISO8601) and CSV exports (day-first).
+
+    Start and end times repeat for every set of a workout, so only the distinct
+    strings are parsed, with one format detected from a sample of them; values
+    that format doesn't fit fall back to ISO8601, then day-first inference,
+    then to parsing value by value. The results are broadcast back to every row.
+    A column mixing UTC and naive times comes back as naive local time
+    (fill_missing_timestamps).
+    """
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques)
+    timestamp_format = detect_timestamp_format(uniques.iloc[:TIMESTAMP_FORMAT_SAMPLE_SIZE]) or "ISO8601"
+    if PYARROW_READY and timestamp_format != "ISO8601":
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        # Arrow's strptime handles month names several times faster than pandas'
+        parsed = pc.strptime(
+            pa.array(uniques.astype(object), type=pa.string(), from_pandas=True),
+            format=timestamp_format,
+            unit="s",
+            error_is_null=True,
+        ).to_pandas()
+    else:
+        parsed = pd.to_datetime(uniques, format=timestamp_format, errors="coerce")
+    missing = parsed.isna()
+    if missing.any() and timestamp_format != "ISO8601":
+        # API values appended to a CSV export; day-first inference would read 2025-12-01 as 12 January
+        parsed = fill_missing_timestamps(parsed, pd.to_datetime(uniques[missing], format="ISO8601", errors="coerce"))
+        missing = parsed.isna()
+    if missing.any():
+        parsed = fill_missing_timestamps(parsed, pd.to_datetime(uniques[missing], errors="coerce", dayfirst=True))
+        missing = parsed.isna()
+    if missing.any():
+        # The day-first pass infers one format from the first value ("1 May 2024" reads as %B and
+        # then fails on "1 Jun 2024"); parse what is left value by value
+        try:
+            rest = pd.to_datetime(uniques[missing].astype(object), format="mixed", dayfirst=True, errors="coerce")
+        except ValueError:
+            # Leftovers with different UTC offsets; nothing more to recover
+            rest = None
+        if rest is not None:
+            parsed = fill_missing_timestamps(parsed, rest)
+    # code -1 (missing input) becomes NaT
+    return pd.Series(parsed.array.take(codes, allow_fill=True), index=values.index, name=values.name)
+
+
 def prepare_workout_df(raw_df: pd.DataFrame, ex_df: pd.DataFrame) -> pd.DataFrame:
     """
     从 hevy_workouts.csv + exercises.csv 构造统一的 set 级别 DataFrame。
@@ -1937,24 +2633,22 @@ def prepare_workout_df(raw_df: pd.DataFrame, ex_df: pd.DataFrame) -> pd.DataFram
     # 标准化关键文本字段，避免因为前后空格导致合并不到肌群/动作信息
     df["exercise_title"] = df["exercise_title"].astype(str).str.strip()
 
-    # 解析时间
-    # Parse timestamps from both API (ISO8601) and CSV exports (day-first)
-    df["start_dt"] = pd.to_datetime(df["start_time"], format="ISO8601", errors="coerce")
-    df["end_dt"] = pd.to_datetime(df["end_time"], format="ISO8601", errors="coerce")
-    start_missing = df["start_dt"].isna() & df["start_time"].notna()
-    end_missing = df["end_dt"].isna() & df["end_time"].notna()
-    if start_missing.any():
-        df.loc[start_missing, "start_dt"] = pd.to_datetime(
-            df.loc[start_missing, "start_time"], errors="coerce", dayfirst=True
-        )
-    if end_missing.any():
-        df.loc[end_missing, "end_dt"] = pd.to_datetime(
-            df.loc[end_missing, "end_time"], errors="coerce", dayfirst=True
-        )
+    # 解析时间（CSV 上传时已逐块解析过的列直接复用）
+    for raw_column, parsed_column in (("start_time", "start_dt"), ("end_time", "end_dt")):
+        if parsed_column not in df.columns or not pd.api.types.is_datetime64_any_dtype(df[parsed_column]):
+            df[parsed_column] = parse_workout_timestamps(df[raw_column])
     df["date"] = df["start_dt"].dt.date
 
-    # 构造 workout_id（title + start_time）
-    df["workout_id"] = df["title"].astype(str) + " | " + df["start_dt"].astype(str)
+    # 构造 workout_id：按 (title, start_dt) 编号的 int32 代码，0..n-1 按标题、开始时间排序。
+    # 缺标题或开始时间的行没有 workout（<NA>），和 groupby 跳过它们一致。
+    # 显示用的标题/时间以及链接里用的字符串 key 见 get_workout_lookup
+    title_codes, _ = pd.factorize(df["title"], sort=True)
+    start_codes, _ = pd.factorize(df["start_dt"], sort=True)
+    has_workout = (title_codes >= 0) & (start_codes >= 0)
+    pair_codes = title_codes.astype(np.int64) * (int(start_codes.max(initial=0)) + 1) + start_codes
+    workout_codes = np.full(len(df), -1, dtype=np.int32)
+    workout_codes[has_workout] = pd.factorize(pair_codes[has_workout], sort=True)[0]
+    df["workout_id"] = pd.arrays.IntegerArray(workout_codes, ~has_workout)
 
     # 重命名 weight / 处理 reps
     df["weight"] = pd.to_numeric(df["weight_kg"], errors="coerce").fillna(0.0)
@@ -1962,8 +2656,8 @@ def prepare_workout_df(raw_df: pd.DataFrame, ex_df: pd.DataFrame) -> pd.DataFram
     if "set_index" in df.columns:
         df["set_index"] = pd.to_numeric(df["set_index"], errors="coerce")
 
-    # set_type 统一小写
-    df["set_type"] = df["set_type"].fillna("").str.lower()
+    # set_type 统一小写（categorical，缺失为 ""）
+    df["set_type"] = normalize_set_types(df["set_type"])
 
     # 贴肌群信息（会得到 primary_muscle / other_muscles / primary_group / secondary_groups / format）
     df = attach_muscle_groups(df, ex_df)
@@ -1972,21 +2666,58 @@ def prepare_workout_df(raw_df: pd.DataFrame, ex_df: pd.DataFrame) -> pd.DataFram
     if "body_weight" not in df.columns:
         df["body_weight"] = None
 
-    # 计算每个 workout 的时长（分钟）
+    # 计算每个 workout 的时长（分钟）；workout_id 是 0..n-1，按代码取值贴回每一行（<NA> 取末尾的 NaN）
     workout_duration = (
         df.groupby("workout_id")["end_dt"].first()
         - df.groupby("workout_id")["start_dt"].first()
     )
-    workout_duration_min = workout_duration.dt.total_seconds() / 60.0
-    df = df.merge(
-        workout_duration_min.rename("workout_duration_min"),
-        on="workout_id",
-        how="left",
-    )
+    workout_duration_min = np.append(workout_duration.dt.total_seconds().to_numpy() / 60.0, np.nan)
+    df["workout_duration_min"] = workout_duration_min[df["workout_id"].to_numpy(dtype=np.int32, na_value=-1)]
 
     return df
 
 
+def get_workout_lookup(df: pd.DataFrame) -> pd.DataFrame:
+    """workout_id 代码 -> title / start_dt / workout_key 的小表（每个 workout 一行）。
+
+    workout_key is the "title | start" string workouts used to be identified
+    by; it stays stable when the data is reloaded (codes may not), so it is
+    what selections and ?selected_workout_id= links carry.
+    """
+    lookup = df.groupby("workout_id", sort=True)[["title", "start_dt"]].first()
+    lookup["workout_key"] = lookup["title"].astype(str) + " | " + lookup["start_dt"].astype(str)
+    return lookup
+
+
+def normalize_set_types(values: pd.Series) -> pd.Categorical:
+    """set_type 统一小写、缺失填 ""，返回 categorical；字符串处理只对每种取值做一次。"""
+    codes, uniques = pd.factorize(values)
+    # 末尾追加 "" 给缺失值（factorize 代码 -1）使用
+    labels = pd.Index(uniques, dtype=object).astype(str).str.lower().append(pd.Index([""], dtype=object))
+    label_codes, categories = pd.factorize(labels)
+    return pd.Categorical.from_codes(label_codes[codes], categories=categories)
+
+
+def get_set_type_table(set_types, drop_set_factor: float = None, include_warmups: bool = False) -> pd.DataFrame:
+    """set_type 取值 -> 系数表，每种取值调用一次 get_set_effective_factor。
+
+    Columns: effective_set_factor, metric_set_factor and counts_volume (whether
+    the set's volume goes into metric_set_volume).
+    """
+    labels = [str(s) for s in set_types]
+    is_warmup = np.array(["warm" in s for s in labels], dtype=bool)
+    effective = np.array([get_set_effective_factor(s, drop_set_factor) for s in labels], dtype=float)
+    # 开启热身组计入时，热身组按 1.0 计并计入容量
+    return pd.DataFrame(
+        {
+            "effective_set_factor": effective,
+            "metric_set_factor": np.where(is_warmup & include_warmups, 1.0, effective),
+            "counts_volume": ~is_warmup | include_warmups,
+        },
+        index=pd.Index(labels, dtype=object, name="set_type"),
+    )
+
+
 def get_set_effective_factor(set_type: str, drop_set_factor: float = None) -> float:
     """
     warmup: 0
@@ -2005,322 +2736,659 @@ def get_set_effective_factor(set_type: str, drop_set_factor: float = None) -> fl
     return 1.0
 
 
-def add_effective_metrics(df: pd.DataFrame) -> pd.DataFrame:
-    """增加 effective_set_factor + set_volume。
+def add_metric_inputs(df: pd.DataFrame) -> pd.DataFrame:
+    """add_effective_metrics 中与设置无关的部分（可缓存）。
+
+    Adds exercise_type / body_weight, makes set_type a normalized categorical
+    and adds bodyweight_adjusted_weight, the adjusted weight with bodyweight
+    inclusion on.
     对于-KG和+KG类型的exercises，调整weight计算：
     - ' -KG' (Assisted): effective_weight = body_weight - recorded_weight
     - ' +KG' (Weighted): effective_weight = body_weight + recorded_weight
     """
     df = df.copy()
-    df["effective_set_factor"] = df["set_type"].apply(get_set_effective_factor)
     
     # 获取exercise_type信息（从exercises.csv已经merge过来）
     # exercise_type字段格式如：'Assisted Bodyweight', 'Weighted Bodyweight', 'Weight & Reps' 等
     df["exercise_type"] = df.get("exercise_type", pd.Series([""] * len(df))).fillna("")
     df["body_weight"] = pd.to_numeric(df.get("body_weight", pd.Series([None] * len(df))), errors="coerce")
     
-    # 计算adjusted weight
-    def calculate_adjusted_weight(row):
-        weight = row["weight"]
-        exercise_type = str(row.get("exercise_type", "")).lower()
-        body_weight = row.get("body_weight")
-        
-        # 根据 exercise_type 判断是否是 Assisted/Weighted Bodyweight
-        is_assisted_bw = "assisted" in exercise_type and "bodyweight" in exercise_type
-        is_weighted_bw = "weighted" in exercise_type and "bodyweight" in exercise_type
-        
-        # Check if bodyweight inclusion is enabled
-        include_bodyweight = True
-        try:
-            include_bodyweight = bool(st.session_state.get("include_bodyweight", True))
-        except Exception:
-            include_bodyweight = True
-        
-        if is_assisted_bw and body_weight is not None and include_bodyweight:
-            # Assisted Bodyweight: body_weight - assistance_weight
-            try:
-                return float(body_weight) - weight
-            except (ValueError, TypeError):
-                return weight
-        elif is_weighted_bw and body_weight is not None and include_bodyweight:
-            # Weighted Bodyweight: body_weight + additional_weight
-            try:
-                return float(body_weight) + weight
-            except (ValueError, TypeError):
-                return weight
-        else:
-            # 普通weight (or bodyweight inclusion disabled)
-            return weight
-    
-    df["adjusted_weight"] = df.apply(calculate_adjusted_weight, axis=1)
-    df["set_volume"] = df["adjusted_weight"] * df["reps"]
-    # Compute metric-aware columns that respect the global setting whether to include warmup sets
-    include_warmups = False
-    try:
+    # 计算adjusted weight（包含体重时的结果；是否包含体重由 apply_calculation_settings 决定）
+    # exercise_type 只有几种取值：每种取值判断一次 Assisted/Weighted Bodyweight，再按行展开成数组
+    type_codes, type_values = pd.factorize(df["exercise_type"], use_na_sentinel=False)
+    type_names = pd.Index(type_values, dtype=object).astype(str).str.lower()
+    is_bodyweight_type = np.asarray(type_names.str.contains("bodyweight", regex=False), dtype=bool)
+    is_assisted_bw = (is_bodyweight_type & np.asarray(type_names.str.contains("assisted", regex=False), dtype=bool))[type_codes]
+    is_weighted_bw = (is_bodyweight_type & np.asarray(type_names.str.contains("weighted", regex=False), dtype=bool))[type_codes]
+
+    weight = df["weight"].to_numpy(dtype=float)
+    body_weight = df["body_weight"].to_numpy(dtype=float)
+    # Assisted Bodyweight: body_weight - assistance_weight
+    # Weighted Bodyweight: body_weight + additional_weight（两者都命中时按 Assisted 处理）
+    # 普通weight 保持不变；缺体重时结果为 NaN（与逐行计算一致）
+    df["bodyweight_adjusted_weight"] = np.where(
+        is_assisted_bw, body_weight - weight, np.where(is_weighted_bw, body_weight + weight, weight)
+    )
+
+    # apply_calculation_settings 按 set_type 的 categorical 代码查系数表
+    if not isinstance(df["set_type"].dtype, pd.CategoricalDtype) or df["set_type"].isna().any():
+        df["set_type"] = normalize_set_types(df["set_type"])
+    return df
+
+
+def apply_calculation_settings(df: pd.DataFrame, include_warmups: bool = None, drop_set_factor: float = None,
+                               include_bodyweight: bool = None) -> pd.DataFrame:
+    """add_effective_metrics 中依赖设置的部分：只做列运算，大数据量下也只需毫秒级。
+
+    Needs the add_metric_inputs columns. Settings default to the session values.
+    """
+    if include_warmups is None:
         include_warmups = bool(st.session_state.get("include_warmup_sets", False))
-    except Exception:
-        include_warmups = False
+    if drop_set_factor is None:
+        drop_set_factor = st.session_state.get("drop_set_factor", 0.5)
+    if include_bodyweight is None:
+        include_bodyweight = bool(st.session_state.get("include_bodyweight", True))
+
+    df = df.copy(deep=False)
+    # 每种 set_type 一行的系数表；三列系数都按 categorical 代码一次取出
+    set_types = df["set_type"].array
+    table = get_set_type_table(set_types.categories, float(drop_set_factor), include_warmups)
+    codes = set_types.codes.astype(np.intp)
+    df["effective_set_factor"] = table["effective_set_factor"].to_numpy()[codes]
+    df["adjusted_weight"] = df["bodyweight_adjusted_weight"] if include_bodyweight else df["weight"]
+    df["set_volume"] = df["adjusted_weight"] * df["reps"]
 
     # metric_set_volume: set_volume included only when warming-up inclusion is enabled
-    if include_warmups:
-        df["metric_set_volume"] = df["set_volume"].fillna(0.0)
-    else:
-        df["metric_set_volume"] = df["set_volume"].where(~df["set_type"].str.contains("warm", na=False), 0.0).fillna(0.0)
-
     # metric_set_factor: effective_set_factor adjusted to count warmups as 1.0 when enabled
-    if include_warmups:
-        df["metric_set_factor"] = df["effective_set_factor"].copy()
-        try:
-            df.loc[df["set_type"].str.contains("warm", na=False), "metric_set_factor"] = 1.0
-        except Exception:
-            pass
+    df["metric_set_factor"] = table["metric_set_factor"].to_numpy()[codes]
+    df["metric_set_volume"] = np.where(
+        table["counts_volume"].to_numpy()[codes], df["set_volume"].fillna(0.0).to_numpy(), 0.0
+    )
+    return df
+
+
+def add_effective_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """增加 effective_set_factor + set_volume（以及 metric_* 列），使用当前设置。"""
+    return apply_calculation_settings(add_metric_inputs(df))
+
+
+def compute_period_index(days: np.ndarray) -> dict:
+    """datetime64[D] 日期 -> 各周期的起始日（datetime64[D]，NaT 保持 NaT）。
+
+    Keys are the add_period_index column names: week_period_monday (Mon-Sun
+    weeks), week_period_sunday (Sun-Sat weeks) and month_period.
+    """
+    day_numbers = days.view("i8")
+    # 1970-01-01 是周四：距上一个周一 (n + 3) % 7 天，距上一个周日 (n + 4) % 7 天
+    return {
+        "week_period_monday": days - (day_numbers + 3) % 7,
+        "week_period_sunday": days - (day_numbers + 4) % 7,
+        "month_period": days.astype("datetime64[M]").astype("datetime64[D]"),
+    }
+
+
+def compute_period_offsets(starts: np.ndarray, origin, period_col: str) -> np.ndarray:
+    """周期起始日 starts 距 origin 周期的个数（周或月，int64）。"""
+    if period_col == "month_period":
+        return (starts.astype("datetime64[M]") - np.datetime64(origin, "M")).astype(np.int64)
+    return (starts.astype("datetime64[D]") - np.datetime64(origin, "D")).astype(np.int64) // 7
+
+
+def compute_period_range(first, count: int, period_col: str) -> np.ndarray:
+    """从周期 first 开始连续 count 个周期的起始日（datetime64[D]）。"""
+    steps = np.arange(max(count, 0))
+    if period_col == "month_period":
+        return (np.datetime64(first, "M") + steps).astype("datetime64[D]")
+    return np.datetime64(first, "D") + steps * 7
+
+
+def get_set_days(df: pd.DataFrame) -> np.ndarray:
+    """每组所在的日期（与 date 列相同），datetime64[D] 数组，缺失为 NaT。"""
+    if "start_dt" in df.columns and pd.api.types.is_datetime64_any_dtype(df["start_dt"]):
+        dates = df["start_dt"]
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
     else:
-        df["metric_set_factor"] = df["effective_set_factor"].fillna(0.0)
-    
+        dates = pd.to_datetime(df["date"], errors="coerce")
+    return dates.to_numpy().astype("datetime64[D]")
+
+
+def add_period_index(df: pd.DataFrame) -> pd.DataFrame:
+    """增加两种周起始的周期列和月份列（值为 date，缺失为 None）；已存在时原样返回。
+
+    Computed once per distinct day; get_processed_workouts caches the result,
+    so the aggregations below only pick a column (see get_period_column).
+    """
+    if all(column in df.columns for column in ("week_period_monday", "week_period_sunday", "month_period")):
+        return df
+    df = df.copy(deep=False)
+    codes, days = pd.factorize(get_set_days(df), use_na_sentinel=False)
+    for column, starts in compute_period_index(np.asarray(days, dtype="datetime64[D]")).items():
+        # datetime64[D] -> datetime.date / None，再按代码展开到每一行
+        df[column] = starts.astype(object)[codes]
     return df
 
 
+def get_period_column(view_mode: str, week_start: str = "Monday") -> str:
+    """view_mode / week_start 对应的 add_period_index 列名。"""
+    if view_mode != "Week":
+        return "month_period"
+    return "week_period_monday" if week_start == "Monday" else "week_period_sunday"
+
+
 def add_period_columns(df: pd.DataFrame, week_start: str = "Monday") -> pd.DataFrame:
     """增加 week_period / month_period。
     week_start: "Monday" 或 "Sunday"
     """
-    df = df.copy()
-    date_series = pd.to_datetime(df["date"], errors="coerce")
-    # W-SUN: week ends on Sunday (Mon-Sun), W-SAT: week ends on Saturday (Sun-Sat)
-    week_anchor = "W-SUN" if week_start == "Monday" else "W-SAT"
-    df["week_period"] = date_series.dt.to_period(week_anchor).apply(
-        lambda r: r.start_time.date() if pd.notna(r) else None
+    df = add_period_index(df).copy(deep=False)
+    df["week_period"] = df[get_period_column("Week", week_start)]
+    return df
+
+
+def get_exercises_fingerprint() -> tuple:
+    """Size and mtime of exercises.csv and custom_exercises.csv; changes when either file is edited."""
+    fingerprint = []
+    for path in (APP_DIR / "exercises.csv", CUSTOM_EXERCISES_PATH):
+        try:
+            stat = path.stat()
+            fingerprint.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            fingerprint.append(None)
+    return tuple(fingerprint)
+
+
+def get_exercises_df() -> pd.DataFrame:
+    """load_exercises(), re-read only when one of the exercise files changed."""
+    fingerprint = get_exercises_fingerprint()
+    cached = st.session_state.get("exercises_cache")
+    if cached is None or cached[0] != fingerprint:
+        cached = (fingerprint, load_exercises())
+        st.session_state["exercises_cache"] = cached
+    return cached[1].copy(deep=False)
+
+
+def get_cached_stage(stage: str, key: tuple, build) -> pd.DataFrame:
+    """Frame for `key` in one pipeline stage's session cache, built with build() on a miss."""
+    cache = st.session_state.setdefault("pipeline_cache", {}).setdefault(stage, {})
+    stats = st.session_state.setdefault("pipeline_cache_stats", {}).setdefault(stage, {"hits": 0, "misses": 0})
+    if key in cache:
+        stats["hits"] += 1
+        cache[key] = cache.pop(key)  # most recently used goes last
+        return cache[key]
+    stats["misses"] += 1
+    frame = build()
+    cache[key] = frame
+    while len(cache) > PIPELINE_CACHE_MAX_ENTRIES:
+        cache.pop(next(iter(cache)))
+    return frame
+
+
+def build_base_stage(source: str, body_weight=None) -> pd.DataFrame:
+    """Settings-independent part of the pipeline: prepare_workout_df + add_metric_inputs."""
+    raw_df = st.session_state["data_cache"][source]
+    if body_weight is not None:
+        raw_df = raw_df.copy(deep=False)
+        raw_df["body_weight"] = pd.to_numeric(pd.Series(body_weight, index=raw_df.index), errors="coerce")
+    return add_metric_inputs(prepare_workout_df(raw_df, get_exercises_df()))
+
+
+def get_base_stage_key(source: str, body_weight=None) -> tuple:
+    """Cache key of the base stage: dataset version (bumped by store_dataset), exercise files and body_weight."""
+    return (
+        source,
+        st.session_state.get("dataset_versions", {}).get(source, 0),
+        get_exercises_fingerprint(),
+        body_weight,
+    )
+
+
+# Names of the get_calculation_settings() values, which end the settings and cube stage keys
+CALCULATION_SETTING_NAMES = ("include_warmups", "drop_set_factor", "include_bodyweight")
+
+
+def get_calculation_settings() -> tuple:
+    """(include_warmups, drop_set_factor, include_bodyweight) as apply_calculation_settings takes them."""
+    return (
+        bool(st.session_state.get("include_warmup_sets", False)),
+        float(st.session_state.get("drop_set_factor", 0.5)),
+        bool(st.session_state.get("include_bodyweight", True)),
     )
-    df["month_period"] = date_series.dt.to_period("M").apply(
-        lambda r: r.start_time.date() if pd.notna(r) else None
+
+
+def get_processed_workouts(source: str, body_weight=None, week_start: str = None) -> pd.DataFrame:
+    """Processed set frame for a loaded source (as add_effective_metrics(prepare_workout_df(...))), memoized.
+
+    body_weight overrides the dataset's body_weight column; with week_start the
+    period columns are added and rows sorted by date, as the Home page needs.
+    The pipeline runs in cached stages:
+      - base: timestamps, ids, exercise join, durations and the metric inputs;
+        keyed on the dataset version (bumped by store_dataset), the exercise
+        files and body_weight
+      - periods: the week (both anchors) / month period index, sorted by date;
+        week_period for week_start is picked from it afterwards
+      - settings: apply_calculation_settings, column arithmetic only
+    so changing a calculation setting only redoes the last, cheap stage.
+    Callers get a shallow copy; copy-on-write keeps their edits out of the cache.
+    """
+    key = get_base_stage_key(source, body_weight)
+    df = get_cached_stage("base", key, lambda: build_base_stage(source, body_weight))
+    if week_start is not None:
+        base_df = df
+        df = get_cached_stage(
+            "periods", key, lambda: add_period_index(base_df).sort_values(["date", "workout_id"])
+        )
+        key += ("periods",)
+    settings = get_calculation_settings()
+    stage_df = df
+    df = get_cached_stage("settings", key + settings, lambda: apply_calculation_settings(stage_df, *settings))
+    if week_start is not None:
+        return add_period_columns(df, week_start)
+    return df.copy(deep=False)
+
+
+def get_period_cube(source: str, body_weight=None, week_start: str = None) -> pd.DataFrame:
+    """build_period_cube of the processed frame, memoized as the pipeline's "cube" stage.
+
+    The cube does not depend on week_start (it holds both week anchors);
+    week_start only picks which cached processed frame it is built from.
+    """
+    key = get_base_stage_key(source, body_weight) + get_calculation_settings()
+    return get_cached_stage(
+        "cube", key, lambda: build_period_cube(get_processed_workouts(source, body_weight, week_start))
     )
-    return df
+
+
+def render_pipeline_cache_debug():
+    """Debug panel: per-stage cache counters and cached frames of get_processed_workouts."""
+    all_stats = st.session_state.get("pipeline_cache_stats", {})
+    caches = st.session_state.get("pipeline_cache", {})
+    with st.expander("🛠️ Debug: processed data cache"):
+        stage_cols = st.columns(4)
+        for col, stage in zip(stage_cols, ("base", "periods", "settings", "cube")):
+            stats = all_stats.get(stage, {"hits": 0, "misses": 0})
+            col.metric(
+                f"{stage.title()} stage",
+                f"{stats['hits']:,} hits",
+                f"{stats['misses']:,} misses",
+                delta_color="off",
+            )
+        rows = [
+            {
+                "stage": stage,
+                "source": key[0],
+                "version": key[1],
+                "body weight": key[3],
+                "settings": (
+                    ", ".join(
+                        f"{name}={value}"
+                        for name, value in zip(CALCULATION_SETTING_NAMES, key[-len(CALCULATION_SETTING_NAMES):])
+                    )
+                    if stage in ("settings", "cube")
+                    else "—"
+                ),
+                "rows": len(frame),
+                "MB": round(frame.memory_usage(deep=False).sum() / 2**20, 1),
+            }
+            for stage, cache in caches.items()
+            for key, frame in reversed(cache.items())
+        ]
+        if rows:
+            st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+        if st.button("Clear cache", key="pipeline_cache_clear"):
+            caches.clear()
+            all_stats.clear()
+            trigger_rerun()
 
 
 # -----------------------------------
 # 聚合：周期 Summary
 # -----------------------------------
 
-def build_period_summary(df: pd.DataFrame, view_mode: str, week_start: str = "Monday") -> pd.DataFrame:
+PERIOD_CUBE_METRICS = ["workouts", "volume", "sets", "duration_hours"]
+
+# Workout Summary 的时间窗口；固定长度窗口的周期数为 (Week, Month)
+SUMMARY_WINDOWS = ["Recent", "Quarter", "Year", "All Time", "Custom"]
+SUMMARY_WINDOW_PERIODS = {"Recent": (16, 12), "Quarter": (13, 3), "Year": (52, 12)}
+
+
+def build_period_cube(df: pd.DataFrame) -> pd.DataFrame:
     """
-    返回：
-      period_start | workouts | duration_hours | volume | sets
-    
-    对于 Week 模式：返回过去 16 周的汇总（包括无数据的周）
-    对于 Month 模式：返回过去 12 个月的汇总（包括无数据的月）
-    week_start: "Monday" 或 "Sunday"
+    预先算好的周期汇总：
+      index (period_column, period_start) | workouts | volume | sets | duration_hours
+        | cumulative_workouts | cumulative_volume | cumulative_sets | cumulative_duration_hours
+
+    period_column 为 week_period_monday / week_period_sunday / month_period，
+    每种包含第一个到最后一个有数据的周期之间的所有周期（无数据的为 0），
+    cumulative_* 为前缀和，任意窗口的总和只需两次相减（见 get_period_window_totals）。
+    先按天汇总一次，再把天累加到两种周和月：
+    每个 workout 只落在开始的那一天，所以 workouts 和 duration 按天相加不会重复计算。
     """
-    # 根据week_start重新计算week_period
-    if view_mode == "Week":
-        date_series = pd.to_datetime(df["date"], errors="coerce")
-        week_anchor = "W-SUN" if week_start == "Monday" else "W-SAT"
-        df = df.copy()
-        df["week_period"] = date_series.dt.to_period(week_anchor).apply(
-            lambda r: r.start_time.date() if pd.notna(r) else None
+    days = get_set_days(df)
+    valid = ~np.isnat(days)
+    day_codes, day_values = pd.factorize(days[valid].view("int64"), sort=True)
+    day_values = np.asarray(day_values).view("datetime64[D]")
+    n_days = len(day_values)
+
+    def day_sum(column):
+        values = pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=float)[valid]
+        return np.bincount(day_codes, weights=np.nan_to_num(values), minlength=n_days)
+
+    daily = {"volume": day_sum("metric_set_volume"), "sets": day_sum("metric_set_factor")}
+
+    # 每个 (天, workout) 一次：workout 数 + 该 workout 第一个非空时长
+    workout_codes, _ = pd.factorize(df["workout_id"])
+    workout_codes = workout_codes[valid]
+    has_workout = workout_codes >= 0
+    n_workouts = int(workout_codes.max()) + 1 if has_workout.any() else 1
+    pairs = np.unique(day_codes[has_workout].astype(np.int64) * n_workouts + workout_codes[has_workout])
+    pair_days = pairs // n_workouts
+    durations = (
+        pd.Series(df["workout_duration_min"].to_numpy(dtype=float)[valid][has_workout])
+        .groupby(workout_codes[has_workout])
+        .first()
+    )
+    pair_durations = durations.reindex(pairs % n_workouts).to_numpy()
+    daily["workouts"] = np.bincount(pair_days, minlength=n_days)
+    daily["duration_hours"] = np.bincount(pair_days, weights=np.nan_to_num(pair_durations), minlength=n_days) / 60.0
+
+    tables = {}
+    for period_col, starts in compute_period_index(day_values).items():
+        if n_days:
+            positions = compute_period_offsets(starts, starts[0], period_col)
+            period_starts = compute_period_range(starts[0], int(positions[-1]) + 1, period_col)
+        else:
+            positions = np.zeros(0, dtype=np.int64)
+            period_starts = np.zeros(0, dtype="datetime64[D]")
+        table = pd.DataFrame(
+            {
+                metric: np.bincount(positions, weights=daily[metric], minlength=len(period_starts))
+                for metric in PERIOD_CUBE_METRICS
+            },
+            index=pd.Index(period_starts.astype(object), name="period_start"),
         )
-    
-    period_col = "week_period" if view_mode == "Week" else "month_period"
+        table["workouts"] = table["workouts"].round().astype("int64")
+        for metric in PERIOD_CUBE_METRICS:
+            table[f"cumulative_{metric}"] = table[metric].cumsum()
+        tables[period_col] = table
+    return pd.concat(tables, names=["period_column", "period_start"])
+
+
+def get_period_cube_table(cube: pd.DataFrame, period_col: str) -> pd.DataFrame:
+    """cube 中一种周期的连续周期表（index 为 period_start），没有数据时为空表。"""
+    if period_col in cube.index.get_level_values("period_column"):
+        return cube.xs(period_col, level="period_column")
+    return cube.iloc[:0].droplevel("period_column")
+
+
+def get_period_window_totals(cube: pd.DataFrame, period_col: str, first, last) -> dict:
+    """周期 first..last（含）内各指标的总和：前缀和相减，与窗口长度无关。"""
+    table = get_period_cube_table(cube, period_col)
+    if table.empty:
+        return {metric: 0 for metric in PERIOD_CUBE_METRICS}
+    origin = table.index[0]
+    lo, hi = np.clip(
+        compute_period_offsets(np.array([first, last], dtype="datetime64[D]"), origin, period_col) + [0, 1],
+        0,
+        len(table),
+    )
+    totals = {}
+    for metric in PERIOD_CUBE_METRICS:
+        cumulative = table[f"cumulative_{metric}"].to_numpy()
+        totals[metric] = (cumulative[hi - 1] if hi else 0) - (cumulative[lo - 1] if lo else 0)
+    return totals
 
-    # 生成完整的周期范围
-    if view_mode == "Week":
-        # 获取最新的周期日期，如果没有数据则用今天
-        # Filter out None/NaN values before getting max
-        valid_periods = df[period_col].dropna() if period_col in df.columns else pd.Series(dtype=object)
-        if len(valid_periods) > 0:
-            max_date = max(valid_periods)
-        else:
-            # 使用今天周一作为基准
-            today = pd.Timestamp.now().date()
-            max_date = today - pd.Timedelta(days=today.weekday())  # 上周一
-        
-        # 生成过去 16 周的范围（从最新周往回）
-        periods_list = []
-        for i in range(16):
-            period_date = max_date - pd.Timedelta(weeks=i)
-            periods_list.append(period_date)
-        periods_list = sorted(periods_list)
-    else:  # Month
-        # 获取最新的月份日期，如果没有数据则用本月
-        # Filter out None/NaN values before getting max
-        valid_periods = df[period_col].dropna() if period_col in df.columns else pd.Series(dtype=object)
-        if len(valid_periods) > 0:
-            max_date = max(valid_periods)
-        else:
-            max_date = pd.Timestamp.now().date().replace(day=1)
-        
-        # 生成过去 12 个月的范围（从最新月往回）
-        periods_list = []
-        current = max_date
-        for i in range(12):
-            periods_list.append(current)
-            # 往前推一个月
-            if current.month == 1:
-                current = current.replace(year=current.year - 1, month=12)
-            else:
-                current = current.replace(month=current.month - 1)
-        periods_list = sorted(periods_list)
 
-    # 对现有数据进行聚合
-    if not df.empty and period_col in df.columns:
-        # 为了正确计算duration，先按workout_id去重，再按period聚合
-        workout_durations = df.groupby(["workout_id", period_col])["workout_duration_min"].first().reset_index()
-        
-        agg = (
-            df.groupby(period_col)
-            .agg(
-                workouts=("workout_id", "nunique"),
-                volume=("metric_set_volume", "sum"),
-                sets=("metric_set_factor", "sum"),
-            )
-            .reset_index()
-            .rename(columns={period_col: "period_start"})
-        )
-        
-        # 单独计算duration
-        duration_agg = (
-            workout_durations.groupby(period_col)["workout_duration_min"]
-            .sum()
-            .reset_index()
-        )
-        duration_agg["duration_hours"] = duration_agg["workout_duration_min"] / 60.0
-        duration_agg = duration_agg[[period_col, "duration_hours"]].rename(columns={period_col: "period_start"})
-        
-        # 合并duration到主结果
-        agg = agg.merge(duration_agg, on="period_start", how="left")
-        agg["duration_hours"] = agg["duration_hours"].fillna(0)
+def get_period_cube_span(cube: pd.DataFrame) -> tuple:
+    """cube 覆盖的日期范围：(第一个有数据月份的 1 号, 最后一个有数据月份的月末)，没有数据时为 None。"""
+    months = get_period_cube_table(cube, "month_period").index
+    if len(months) == 0:
+        return None
+    last_day = (np.datetime64(months[-1], "M") + 1).astype("datetime64[D]") - 1
+    return months[0], last_day.astype(object)
+
+
+def get_summary_window(table: pd.DataFrame, view_mode: str, period_col: str,
+                       window: str = "Recent", custom_range=None) -> tuple:
+    """Workout Summary 窗口的 (第一个周期, 周期数)，见 build_period_summary。"""
+    if len(table):
+        data_first, data_last = table.index[0], table.index[-1]
     else:
-        agg = pd.DataFrame(columns=["period_start", "workouts", "duration_hours", "volume", "sets"])
+        # 没有数据：以今天所在的周期结尾
+        data_first = data_last = compute_period_index(np.array([pd.Timestamp.now().date()], dtype="datetime64[D]"))[period_col][0]
+
+    if window == "All Time" or (window == "Custom" and not custom_range):
+        # Custom 还没有选范围时和日期选择器的默认值一致：整个数据范围
+        first, last = data_first, data_last
+    elif window == "Custom":
+        # date_input 选到一半时只有开始日期
+        bounds = np.array([custom_range[0], custom_range[-1] if len(custom_range) > 1 else data_last], dtype="datetime64[D]")
+        first, last = compute_period_index(bounds)[period_col]
+    else:
+        counts = SUMMARY_WINDOW_PERIODS.get(window, SUMMARY_WINDOW_PERIODS["Recent"])
+        count = counts[0] if view_mode == "Week" else counts[1]
+        # 从最新周期往回 count - 1 个周期
+        if period_col == "month_period":
+            first = (np.datetime64(data_last, "M") - (count - 1)).astype("datetime64[D]")
+        else:
+            first = np.datetime64(data_last, "D") - (count - 1) * 7
+        return first, count
+    count = int(compute_period_offsets(np.array([last], dtype="datetime64[D]"), first, period_col)[0]) + 1
+    return np.datetime64(first, "D"), max(count, 1)
 
-    # 创建完整的周期范围 DataFrame（包括无数据的周期）
-    full_periods = pd.DataFrame({"period_start": periods_list})
-    
-    # 左连接，确保所有周期都包含（无数据的用 0 填充）
-    result = full_periods.merge(agg, on="period_start", how="left")
-    result = result.fillna(0)
 
-    return result.sort_values("period_start")
+def build_period_summary(df: pd.DataFrame, view_mode: str, week_start: str = "Monday", cube: pd.DataFrame = None,
+                         window: str = "Recent", custom_range=None) -> pd.DataFrame:
+    """
+    返回：
+      period_start | workouts | volume | sets | duration_hours
+
+    window（SUMMARY_WINDOWS）：
+      Recent：Week 过去 16 周 / Month 过去 12 个月
+      Quarter / Year：过去 13 周或 3 个月 / 过去 52 周或 12 个月
+      All Time：第一个到最后一个有数据的周期
+      Custom：custom_range = (start_date, end_date) 所在的周期（还没有选择时同 All Time）
+    固定长度的窗口以最新有数据的周期结尾（没有数据时用今天），包括无数据的周期。
+    week_start: "Monday" 或 "Sunday"
+    cube: build_period_cube(df) 的结果（可传入缓存的 get_period_cube），只取出窗口内的行
+    """
+    if cube is None:
+        cube = build_period_cube(df)
+    period_col = get_period_column(view_mode, week_start)
+    table = get_period_cube_table(cube, period_col)
+    first, count = get_summary_window(table, view_mode, period_col, window, custom_range)
+    periods = compute_period_range(first, count, period_col)
+
+    # 窗口在 cube 中的位置，只切出这些行；超出数据范围的周期用 0 填充
+    lo = int(compute_period_offsets(periods[:1], table.index[0], period_col)[0]) if len(table) else 0
+    rows = table.iloc[max(lo, 0):max(lo + count, 0)][PERIOD_CUBE_METRICS]
+    result = rows.reindex(pd.Index(periods.astype(object), name="period_start"), fill_value=0)
+    return result.reset_index()
 
 
 # -----------------------------------
 # 聚合：Muscle Distribution（大肌群）
 # -----------------------------------
 
-def build_muscle_distribution(df: pd.DataFrame, view_mode: str, metric: str, week_start: str = "Monday") -> pd.DataFrame:
+def factorize_muscle_profiles(df: pd.DataFrame, columns: list) -> tuple:
+    """按肌群相关列的取值组合编号：每行一个 profile 代码 + 每个 profile 的取值（缺失为 None）。
+
+    A profile is one distinct combination of e.g. primary_group/secondary_groups,
+    so there are about as many as there are exercises.
     """
-    返回：period_start | muscle_group | value
-    metric ∈ ["Workouts", "Duration", "Volume", "Sets"]
-    week_start: "Monday" 或 "Sunday"
+    combined = np.zeros(len(df), dtype=np.int64)
+    value_lists = []
+    for column in columns:
+        codes, uniques = pd.factorize(df[column])
+        combined = combined * (len(uniques) + 1) + (codes + 1)
+        value_lists.append([None] + list(uniques))
+    profile_codes, profile_keys = pd.factorize(combined)
+    profiles = []
+    for key in np.asarray(profile_keys, dtype=np.int64):
+        values = []
+        for value_list in reversed(value_lists):
+            key, code = divmod(int(key), len(value_list))
+            values.append(value_list[code])
+        profiles.append(tuple(reversed(values)))
+    return profile_codes, profiles
+
+
+def build_muscle_hit_matrices(profile_hits: list, muscles: list) -> tuple:
+    """每个 profile 的 [(muscle, weight), ...] -> (hits, weights) 两个 profiles × muscles 矩阵。
+
+    A muscle listed twice for a profile is hit twice, just like the two rows
+    per set the iterrows loop used to emit.
     """
-    # 根据week_start重新计算week_period
-    if view_mode == "Week":
-        date_series = pd.to_datetime(df["date"], errors="coerce")
-        week_anchor = "W-SUN" if week_start == "Monday" else "W-SAT"
-        df = df.copy()
-        df["week_period"] = date_series.dt.to_period(week_anchor).apply(
-            lambda r: r.start_time.date() if pd.notna(r) else None
-        )
-    
-    period_col = "week_period" if view_mode == "Week" else "month_period"
-    
-    # Get secondary muscle factor from session state
-    secondary_factor = 0.5
-    try:
-        secondary_factor = float(st.session_state.get("secondary_muscle_factor", 0.5))
-    except Exception:
-        secondary_factor = 0.5
+    position = {muscle: i for i, muscle in enumerate(muscles)}
+    hits = np.zeros((len(profile_hits), len(muscles)))
+    weights = np.zeros((len(profile_hits), len(muscles)))
+    for row, entries in enumerate(profile_hits):
+        for muscle, weight in entries:
+            hits[row, position[muscle]] += 1
+            weights[row, position[muscle]] += weight
+    return hits, weights
+
+
+def aggregate_muscle_hits(df: pd.DataFrame, period_col: str, profile_codes: np.ndarray,
+                          hits: np.ndarray, weights: np.ndarray) -> dict:
+    """按 (period, muscle) 汇总所有 metric，结果都是 periods × muscles 矩阵。
+
+    Matches the old one-row-per-set-and-muscle frame: Sets/Volume are the
+    per-(period, profile) sums of the set factor/volume times the weight
+    matrix; Workouts counts distinct workouts touching a muscle; Duration
+    gives each hit a workout_duration / muscles-in-that-workout share.
+    Returns {"periods", "present", "Workouts", "Duration", "Volume", "Sets"}.
+    """
+    period_codes, periods = pd.factorize(df[period_col], sort=True)
+    workout_codes, workout_ids = pd.factorize(df["workout_id"])
+    n_periods, n_profiles = len(periods), len(hits)
+    zeros = np.zeros(len(df))
+    factor = df.get("metric_set_factor", df.get("effective_set_factor", zeros))
+    volume = df.get("metric_set_volume", df.get("set_volume", zeros))
+    factor = np.nan_to_num(np.asarray(factor, dtype=float), nan=0.0, posinf=np.inf, neginf=-np.inf)
+    volume = np.nan_to_num(np.asarray(volume, dtype=float), nan=0.0, posinf=np.inf, neginf=-np.inf)
+
+    # Sets / Volume：先按 (period, profile) 求和，再乘权重矩阵
+    has_period = period_codes >= 0
+    cell = period_codes[has_period].astype(np.int64) * n_profiles + profile_codes[has_period]
+    size = n_periods * n_profiles
+
+    def per_profile(values=None):
+        return np.bincount(cell, weights=values, minlength=size).reshape(n_periods, n_profiles)
+
+    result = {
+        "periods": periods,
+        "present": per_profile() @ (hits > 0) > 0,
+        "Sets": per_profile(factor[has_period]) @ weights,
+        "Volume": per_profile(volume[has_period]) @ weights,
+        "Workouts": np.zeros((n_periods, hits.shape[1]), dtype=np.int64),
+        "Duration": np.zeros((n_periods, hits.shape[1])),
+    }
+
+    # Workouts / Duration：每个 (period, workout) 一行，合并其中各 profile 的命中
+    has_workout = has_period & (workout_codes >= 0)
+    pair_keys = period_codes[has_workout].astype(np.int64) * len(workout_ids) + workout_codes[has_workout]
+    pair_codes, pairs = pd.factorize(pair_keys, sort=True)
+    triples, triple_sets = np.unique(
+        pair_codes.astype(np.int64) * n_profiles + profile_codes[has_workout], return_counts=True
+    )
+    if len(triples):
+        triple_pairs, triple_profiles = np.divmod(triples, n_profiles)
+        starts = np.flatnonzero(np.r_[True, triple_pairs[1:] != triple_pairs[:-1]])
+        pair_present = np.logical_or.reduceat(hits[triple_profiles] > 0, starts, axis=0)
+        pair_hits = np.add.reduceat(hits[triple_profiles] * triple_sets[:, None], starts, axis=0)
+        pair_periods, pair_workouts = np.divmod(np.asarray(pairs)[triple_pairs[starts]], len(workout_ids))
+
+        durations = df["workout_duration_min"].to_numpy(dtype=float)
+        workout_duration = pd.Series(durations[workout_codes >= 0]).groupby(workout_codes[workout_codes >= 0]).first()
+        muscle_count = pair_present.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            share = workout_duration.to_numpy()[pair_workouts] / muscle_count / 60.0
+            pair_duration = np.nan_to_num(pair_hits * share[:, None])
+        np.add.at(result["Workouts"], pair_periods, pair_present)
+        np.add.at(result["Duration"], pair_periods, pair_duration)
+    return result
+
+
+def muscle_hits_to_frame(aggregated: dict, muscle_columns: dict) -> pd.DataFrame:
+    """aggregate_muscle_hits 的矩阵 -> period_start | <muscle columns> | <每个 metric 一列> 长表（只含出现过的组合）。
+
+    muscle_columns maps output column names to one label per matrix column;
+    the matrix columns must already be in the output sort order.
+    """
+    period_index, muscle_index = np.nonzero(aggregated["present"])
+    res = pd.DataFrame({"period_start": np.asarray(aggregated["periods"], dtype=object)[period_index]})
+    for column, labels in muscle_columns.items():
+        res[column] = pd.array(np.asarray(labels, dtype=object)[muscle_index], dtype="str")
+    for metric in MUSCLE_DISTRIBUTION_METRICS:
+        res[metric] = aggregated[metric][period_index, muscle_index]
+    return res
 
-    rows = []
-    for _, row in df.iterrows():
-        period = row[period_col]
-        wid = row["workout_id"]
-        factor = row.get("metric_set_factor", row.get("effective_set_factor", 0.0))
-        vol = row.get("metric_set_volume", row.get("set_volume", 0.0))
-
-        # primary：权重 1.0
-        pg = row.get("primary_group", None)
-        if isinstance(pg, str) and pg in MUSCLE_GROUPS:
-            rows.append(
-                {
-                    "period": period,
-                    "workout_id": wid,
-                    "muscle_group": pg,
-                    "set_factor": factor * 1.0,
-                    "volume": vol * 1.0,
-                }
-            )
 
-        # secondary：secondary_groups 字符串拆分，权重从设置获取
-        sg_str = row.get("secondary_groups", "") or ""
+def get_muscle_group_hits(df: pd.DataFrame, secondary_factor: float) -> tuple:
+    """大肌群的 profile 命中矩阵：(profile_codes, hits, weights, muscle_columns, hidden)。"""
+    # 每种 primary_group / secondary_groups 组合的命中：primary 权重 1.0，secondary 权重从设置获取
+    profile_codes, profiles = factorize_muscle_profiles(df, ["primary_group", "secondary_groups"])
+    profile_hits = []
+    for pg, sg_str in profiles:
+        entries = [(pg, 1.0)] if isinstance(pg, str) and pg in MUSCLE_GROUPS else []
         if isinstance(sg_str, str) and sg_str.strip():
-            for m in sg_str.split(";"):
-                m = m.strip()
-                if m and m in MUSCLE_GROUPS:
-                    rows.append(
-                        {
-                            "period": period,
-                            "workout_id": wid,
-                            "muscle_group": m,
-                            "set_factor": factor * secondary_factor,
-                            "volume": vol * secondary_factor,
-                        }
-                    )
+            entries += [(m.strip(), secondary_factor) for m in sg_str.split(";") if m.strip() in MUSCLE_GROUPS]
+        profile_hits.append(entries)
 
-    if not rows:
-        return pd.DataFrame(columns=["period_start", "muscle_group", "value"])
+    muscles = sorted(MUSCLE_GROUPS)
+    hits, weights = build_muscle_hit_matrices(profile_hits, muscles)
+    return profile_codes, hits, weights, {"muscle_group": muscles}, np.zeros(len(muscles), dtype=bool)
 
-    mdf = pd.DataFrame(rows)
 
-    # 贴回 workout_duration_min，用于 Duration 计算
-    wd = df.groupby("workout_id")["workout_duration_min"].first()
-    mdf = mdf.merge(wd.rename("workout_duration_min"), on="workout_id", how="left")
+def get_fine_muscle_hits(df: pd.DataFrame, secondary_factor: float) -> tuple:
+    """细肌肉的 profile 命中矩阵：(profile_codes, hits, weights, muscle_columns, hidden)。"""
+    # 定义肌肉组包含关系（单向映射）
+    # Traps 包含 Upper Back 的数据（Upper Back 动作也计入 Traps）
+    # 但 Upper Back 不包含 Traps 的数据
+    MUSCLE_INCLUDES = {
+        "Upper Back": ["Traps"],  # Upper Back 的数据也计入 Traps
+    }
 
-    if metric == "Workouts":
-        # 先按 workout_id 和 muscle_group 去重（同一个 workout 的多个细分肌肉只算一次大肌肉群）
-        unique_workouts = mdf[["period", "workout_id", "muscle_group"]].drop_duplicates()
-        grouped = unique_workouts.groupby(["period", "muscle_group"])["workout_id"].nunique()
-    elif metric == "Duration":
-        muscle_count = mdf.groupby(["period", "workout_id"])["muscle_group"].nunique()
-        mdf = mdf.join(muscle_count.rename("muscle_count"), on=["period", "workout_id"])
-        mdf["duration_hours_share"] = (
-            mdf["workout_duration_min"] / mdf["muscle_count"] / 60.0
-        )
-        grouped = mdf.groupby(["period", "muscle_group"])["duration_hours_share"].sum()
-    elif metric == "Volume":
-        grouped = mdf.groupby(["period", "muscle_group"])["volume"].sum()
-    else:  # Sets
-        grouped = mdf.groupby(["period", "muscle_group"])["set_factor"].sum()
-
-    res = grouped.reset_index().rename(columns={"period": "period_start"})
-    if "value" in res.columns:
-        pass
-    else:
-        # 最后一列就是 value
-        val_col = [c for c in res.columns if c not in ["period_start", "muscle_group"]][0]
-        res = res.rename(columns={val_col: "value"})
-    return res
+    def muscle_hits(muscle, weight):
+        # 该肌肉本身 + 需要计入其数据的其他肌肉
+        return [(muscle, weight)] + [(target, weight) for target in MUSCLE_INCLUDES.get(muscle, [])]
 
+    # 每种 primary_muscle / other_muscles 组合的命中：primary 权重 1.0，other_muscles 作为 secondary
+    profile_codes, profiles = factorize_muscle_profiles(df, ["primary_muscle", "other_muscles"])
+    profile_hits = []
+    for pm, om_str in profiles:
+        entries = muscle_hits(pm, 1.0) if isinstance(pm, str) and pm in MUSCLE_TO_GROUP else []
+        if isinstance(om_str, str) and om_str.strip():
+            for m in om_str.split(";"):
+                m = m.strip()
+                if m and m in MUSCLE_TO_GROUP:
+                    entries += muscle_hits(m, secondary_factor)
+        profile_hits.append(entries)
+
+    # 细肌肉按 (big_group, fine_muscle) 排序；Cardio 等没有大肌群的放最后，
+    # 它们不出现在结果里（hidden），但仍计入每个 workout 的肌肉数（Duration 分摊）
+    fine_muscles = sorted(
+        set(MUSCLE_TO_GROUP) | {t for targets in MUSCLE_INCLUDES.values() for t in targets},
+        key=lambda m: (MUSCLE_TO_GROUP[m] is None, MUSCLE_TO_GROUP[m] or "", m),
+    )
+    hits, weights = build_muscle_hit_matrices(profile_hits, fine_muscles)
+    muscle_columns = {"big_group": [MUSCLE_TO_GROUP[m] for m in fine_muscles], "fine_muscle": fine_muscles}
+    hidden = np.array([MUSCLE_TO_GROUP[m] is None for m in fine_muscles])
+    return profile_codes, hits, weights, muscle_columns, hidden
 
-# -----------------------------------
-# 新增：细肌肉分布（Biceps / Triceps / …）
-# -----------------------------------
 
-def build_detailed_muscle_distribution(df: pd.DataFrame, view_mode: str, metric: str, week_start: str = "Monday") -> pd.DataFrame:
+def build_muscle_distribution_metrics(df: pd.DataFrame, view_mode: str, week_start: str = "Monday",
+                                      detailed: bool = False) -> pd.DataFrame:
     """
-    返回：period_start | big_group | fine_muscle | value
-    metric ∈ ["Workouts", "Duration", "Volume", "Sets"]
+    返回：period_start | muscle_group | Workouts | Duration | Volume | Sets
+    detailed=True 时为细肌肉分布：period_start | big_group | fine_muscle | Workouts | ...
+    所有 metric 来自同一次聚合，雷达图、热力图和 tooltip 共用。
     week_start: "Monday" 或 "Sunday"
     """
-    # 根据week_start重新计算week_period（与build_muscle_distribution保持一致）
-    if view_mode == "Week":
-        date_series = pd.to_datetime(df["date"], errors="coerce")
-        week_anchor = "W-SUN" if week_start == "Monday" else "W-SAT"
-        df = df.copy()
-        df["week_period"] = date_series.dt.to_period(week_anchor).apply(
-            lambda r: r.start_time.date() if pd.notna(r) else None
-        )
-    
-    period_col = "week_period" if view_mode == "Week" else "month_period"
-    
+    # 按 week_start 选周期列（处理后的数据已带周期索引）
+    df = add_period_index(df)
+    period_col = get_period_column(view_mode, week_start)
+
     # Get secondary muscle factor from session state
     secondary_factor = 0.5
     try:
@@ -2328,112 +3396,43 @@ def build_detailed_muscle_distribution(df: pd.DataFrame, view_mode: str, metric:
     except Exception:
         secondary_factor = 0.5
 
-    # 定义肌肉组包含关系（单向映射）
-    # Traps 包含 Upper Back 的数据（Upper Back 动作也计入 Traps）
-    # 但 Upper Back 不包含 Traps 的数据
-    MUSCLE_INCLUDES = {
-        "Upper Back": ["Traps"],  # Upper Back 的数据也计入 Traps
-    }
+    get_hits = get_fine_muscle_hits if detailed else get_muscle_group_hits
+    profile_codes, hits, weights, muscle_columns, hidden = get_hits(df, secondary_factor)
+    aggregated = aggregate_muscle_hits(df, period_col, profile_codes, hits, weights)
+    aggregated["present"][:, hidden] = False
+    if not aggregated["present"].any():
+        return pd.DataFrame(columns=["period_start", *muscle_columns, *MUSCLE_DISTRIBUTION_METRICS])
+    return muscle_hits_to_frame(aggregated, muscle_columns)
 
-    rows = []
-    for _, row in df.iterrows():
-        period = row[period_col]
-        wid = row["workout_id"]
-        factor = row.get("metric_set_factor", row.get("effective_set_factor", 0.0))
-        vol = row.get("metric_set_volume", row.get("set_volume", 0.0))
-
-        # primary 细肌肉
-        pm = row.get("primary_muscle", None)
-        if isinstance(pm, str) and pm in MUSCLE_TO_GROUP:
-            big = MUSCLE_TO_GROUP[pm]
-            rows.append(
-                {
-                    "period": period,
-                    "workout_id": wid,
-                    "big_group": big,
-                    "fine_muscle": pm,
-                    "set_factor": factor * 1.0,
-                    "volume": vol * 1.0,
-                }
-            )
-            # 如果该肌肉的数据需要计入其他肌肉
-            if pm in MUSCLE_INCLUDES:
-                for target_muscle in MUSCLE_INCLUDES[pm]:
-                    target_big = MUSCLE_TO_GROUP.get(target_muscle, big)
-                    rows.append(
-                        {
-                            "period": period,
-                            "workout_id": wid,
-                            "big_group": target_big,
-                            "fine_muscle": target_muscle,
-                            "set_factor": factor * 1.0,  # 主肌肉权重
-                            "volume": vol * 1.0,
-                        }
-                    )
 
-        # other_muscles 作为 secondary，权重从设置获取
-        om_str = row.get("other_muscles", "") or ""
-        if isinstance(om_str, str) and om_str.strip():
-            for m in om_str.split(";"):
-                m = m.strip()
-                if m and m in MUSCLE_TO_GROUP:
-                    big = MUSCLE_TO_GROUP[m]
-                    rows.append(
-                        {
-                            "period": period,
-                            "workout_id": wid,
-                            "big_group": big,
-                            "fine_muscle": m,
-                            "set_factor": factor * secondary_factor,
-                            "volume": vol * secondary_factor,
-                        }
-                    )
-                    # 如果该肌肉的数据需要计入其他肌肉
-                    if m in MUSCLE_INCLUDES:
-                        for target_muscle in MUSCLE_INCLUDES[m]:
-                            target_big = MUSCLE_TO_GROUP.get(target_muscle, big)
-                            rows.append(
-                                {
-                                    "period": period,
-                                    "workout_id": wid,
-                                    "big_group": target_big,
-                                    "fine_muscle": target_muscle,
-                                    "set_factor": factor * secondary_factor,
-                                    "volume": vol * secondary_factor,
-                                }
-                            )
+def select_distribution_metric(metrics_df: pd.DataFrame, metric: str) -> pd.DataFrame:
+    """build_muscle_distribution_metrics 的结果 -> 只含一个 metric 的 ... | value 表。"""
+    keys = [c for c in metrics_df.columns if c not in MUSCLE_DISTRIBUTION_METRICS]
+    return metrics_df[keys + [metric]].rename(columns={metric: "value"})
 
-    if not rows:
-        return pd.DataFrame(columns=["period_start", "big_group", "fine_muscle", "value"])
 
-    mdf = pd.DataFrame(rows)
+def build_muscle_distribution(df: pd.DataFrame, view_mode: str, metric: str, week_start: str = "Monday") -> pd.DataFrame:
+    """
+    返回：period_start | muscle_group | value
+    metric ∈ ["Workouts", "Duration", "Volume", "Sets"]
+    week_start: "Monday" 或 "Sunday"
+    """
+    return select_distribution_metric(build_muscle_distribution_metrics(df, view_mode, week_start), metric)
+
 
-    # 贴回 workout_duration_min，用于 Duration 计算
-    wd = df.groupby("workout_id")["workout_duration_min"].first()
-    mdf = mdf.merge(wd.rename("workout_duration_min"), on="workout_id", how="left")
+# -----------------------------------
+# 新增：细肌肉分布（Biceps / Triceps / …）
+# -----------------------------------
 
-    if metric == "Workouts":
-        # 先按 workout_id 和 fine_muscle 去重
-        unique_workouts = mdf[["period", "big_group", "workout_id", "fine_muscle"]].drop_duplicates()
-        grouped = unique_workouts.groupby(["period", "big_group", "fine_muscle"])["workout_id"].nunique()
-    elif metric == "Duration":
-        muscle_count = mdf.groupby(["period", "workout_id"])["fine_muscle"].nunique()
-        mdf = mdf.join(muscle_count.rename("muscle_count"), on=["period", "workout_id"])
-        mdf["duration_hours_share"] = (
-            mdf["workout_duration_min"] / mdf["muscle_count"] / 60.0
-        )
-        grouped = mdf.groupby(["period", "big_group", "fine_muscle"])["duration_hours_share"].sum()
-    elif metric == "Volume":
-        grouped = mdf.groupby(["period", "big_group", "fine_muscle"])["volume"].sum()
-    else:  # Sets
-        grouped = mdf.groupby(["period", "big_group", "fine_muscle"])["set_factor"].sum()
-
-    res = grouped.reset_index().rename(columns={"period": "period_start"})
-    if "value" not in res.columns:
-        val_col = [c for c in res.columns if c not in
-                   ["period_start", "big_group", "fine_muscle"]][0]
-        res = res.rename(columns={val_col: "value"})
-    return res
+def build_detailed_muscle_distribution(df: pd.DataFrame, view_mode: str, metric: str, week_start: str = "Monday") -> pd.DataFrame:
+    """
+    返回：period_start | big_group | fine_muscle | value
+    metric ∈ ["Workouts", "Duration", "Volume", "Sets"]
+    week_start: "Monday" 或 "Sunday"
+    """
+    return select_distribution_metric(
+        build_muscle_distribution_metrics(df, view_mode, week_start, detailed=True), metric
+    )
 
 
 # -----------------------------------
@@ -2491,7 +3490,60 @@ def get_top_exercise_for_muscle(ex_stats: pd.DataFrame, muscle: str, period_star
 # UI：Workout Summary
 # -----------------------------------
 
-def render_workout_summary(period_summary: pd.DataFrame, view_mode: str, metric_label: str):
+def render_summary_window_controls(period_summary: pd.DataFrame, view_mode: str,
+                                   period_cube: pd.DataFrame, period_col: str):
+    """Workout Summary 的时间窗口选择（Recent / Quarter / Year / All Time / Custom）和窗口总和。"""
+    window_labels = {
+        "Recent": "Last 16 Weeks" if view_mode == "Week" else "Last 12 Months",
+        "Quarter": "Last Quarter",
+        "Year": "Last Year",
+        "All Time": "All Time",
+        "Custom": "Custom Range",
+    }
+    window_col, range_col, totals_col = st.columns([2, 3, 5], gap="small")
+    with window_col:
+        # key 绑定 session_state.summary_window，下一次运行开始时 build_period_summary 就用新窗口
+        st.selectbox(
+            "Range",
+            SUMMARY_WINDOWS,
+            format_func=lambda w: window_labels[w],
+            key="summary_window",
+            label_visibility="collapsed",
+        )
+    span = get_period_cube_span(period_cube)
+    if st.session_state.summary_window == "Custom" and span is not None:
+        with range_col:
+            # 默认整个数据范围；数据源切换后把已选范围限制在新数据的日期范围内
+            saved = tuple(st.session_state.get("summary_custom_range") or span)
+            clamped = tuple(min(max(d, span[0]), span[1]) for d in saved)
+            if clamped != saved or "summary_custom_range" not in st.session_state:
+                st.session_state.summary_custom_range = clamped
+            st.date_input(
+                "Custom range",
+                min_value=span[0],
+                max_value=span[1],
+                key="summary_custom_range",
+                label_visibility="collapsed",
+            )
+    if not period_summary.empty:
+        first, last = period_summary["period_start"].iloc[0], period_summary["period_start"].iloc[-1]
+        totals = get_period_window_totals(period_cube, period_col, first, last)
+        hours = totals["duration_hours"]
+        if view_mode == "Week":
+            window_str = f"{first.strftime('%b %d, %Y')} -> {(last + pd.Timedelta(days=6)).strftime('%b %d, %Y')}"
+        else:
+            window_str = f"{first.strftime('%b %Y')} -> {last.strftime('%b %Y')}"
+        with totals_col:
+            st.caption(
+                f"{window_str}: "
+                f"{int(round(totals['workouts'])):,} workouts · {int(hours)} h {int(round((hours - int(hours)) * 60)):02d} min · "
+                f"{format_compact_number(convert_volume_for_display(totals['volume']))} {get_weight_unit_suffix()} · "
+                f"{format_compact_number(totals['sets'], decimals=1)} sets"
+            )
+
+
+def render_workout_summary(period_summary: pd.DataFrame, view_mode: str, metric_label: str,
+                           period_cube: pd.DataFrame = None, period_col: str = None):
     # Initialize independent metric state for Workout Summary
     if "workout_summary_metric" not in st.session_state:
         st.session_state.workout_summary_metric = metric_label
@@ -2554,6 +3606,9 @@ def render_workout_summary(period_summary: pd.DataFrame, view_mode: str, metric_
     # Use the independent metric for this section
     metric_label = st.session_state.workout_summary_metric
 
+    if period_cube is not None:
+        render_summary_window_controls(period_summary, view_mode, period_cube, period_col)
+
     if period_summary.empty:
         st.info("No period summary data.")
         return None
@@ -2897,13 +3952,18 @@ def render_workout_summary(period_summary: pd.DataFrame, view_mode: str, metric_
 # UI：Muscle Distribution（蛛网 + 细肌肉条形图）
 # -----------------------------------
 
-def render_muscle_distribution(df: pd.DataFrame,
-                               muscle_df: pd.DataFrame,
-                               detail_df: pd.DataFrame,
+def render_muscle_distribution(muscle_metrics_df: pd.DataFrame,
+                               detail_metrics_df: pd.DataFrame,
                                metric: str,
                                active_period,
                                raw_hevy_df: pd.DataFrame = None):
-    """Render muscle distribution with radar chart and detailed breakdown."""
+    """Render muscle distribution with radar chart and detailed breakdown.
+
+    Both frames come from build_muscle_distribution_metrics (big groups and
+    fine muscles) and hold every metric, so the tooltips need no extra pass.
+    """
+    muscle_df = select_distribution_metric(muscle_metrics_df, metric)
+    detail_df = select_distribution_metric(detail_metrics_df, metric)
     if muscle_df.empty or active_period is None:
         st.info("No muscle distribution data.")
         return
@@ -2976,8 +4036,6 @@ def render_muscle_distribution(df: pd.DataFrame,
                 st.session_state["nav_page"] = "Settings"
                 st.rerun()
     
-    muscle_df = muscle_df.copy()
-    detail_df = detail_df.copy()
     metric_label = metric
     if metric == "Volume":
         suffix = get_weight_unit_suffix()
@@ -3128,8 +4186,8 @@ def render_muscle_distribution(df: pd.DataFrame,
     all_metrics_data = {}
     all_previous_data = {}  # 每个metric对应的上一期数据
     for metric_type in ["Sets", "Volume", "Workouts"]:
-        # 构建该metric的detail_df
-        temp_detail_df = build_detailed_muscle_distribution(df, st.session_state.view_mode, metric_type, st.session_state.week_start)
+        # 该metric的detail_df（从已算好的多 metric 结果里选列）
+        temp_detail_df = select_distribution_metric(detail_metrics_df, metric_type)
         
         # 获取该metric的periods并找到对应的active和prev period
         temp_periods = sorted(temp_detail_df["period_start"].unique(), reverse=True)
@@ -3343,7 +4401,7 @@ def render_workout_log(df: pd.DataFrame, view_mode: str, active_period):
             st.write("No workouts logged for this day.")
         else:
             summary = (
-                day_df.groupby(["workout_id", "title"]) 
+                day_df.groupby(["workout_id", "title"], observed=True)
                 .agg(
                     date=("date", "first"),
                     duration_min=("workout_duration_min", "first"),
@@ -3552,84 +4610,467 @@ def render_month_calendar(start_date, end_date, workout_dates):
 # 主入口
 # -----------------------------------
 
-def fetch_hevy_workouts(api_key: str, progress_hook=None):
-    """从Hevy API获取训练数据"""
-    try:
-        import requests
-    except ImportError:
-        return None, "请先安装 requests 库: pip install requests"
-    
-    url = "https://api.hevyapp.com/v1/workouts"
+@st.cache_resource
+def get_hevy_api_session():
+    """Shared keep-alive session for Hevy API calls, pooled for the fetch workers."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HEVY_API_MAX_CONCURRENCY * 2)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_retry_delay(attempt: int, retry_after: str | None = None) -> float:
+    """Seconds to wait before retry `attempt` (0-based).
+
+    Retry-After (delta seconds or HTTP date) wins when present; otherwise
+    exponential backoff with full jitter.
+    """
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                from email.utils import parsedate_to_datetime
+
+                delay = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return min(max(delay, 0.0), HEVY_API_MAX_RETRY_DELAY)
+    ceiling = min(HEVY_API_RETRY_BASE_DELAY * (2 ** attempt), HEVY_API_MAX_RETRY_DELAY)
+    return random.uniform(0, ceiling)
+
+
+class HevyFetchCancelled(Exception):
+    """Raised inside a Hevy fetch once its cancel_event is set."""
+
+
+def wait_before_retry(delay: float, cancel_event=None) -> None:
+    """Sleep for a retry delay, waking early (and raising) if the fetch is cancelled."""
+    if cancel_event is None:
+        time.sleep(delay)
+    elif cancel_event.wait(delay):
+        raise HevyFetchCancelled()
+
+
+def hevy_api_get(path: str, api_key: str, params: dict = None, on_throttle=None, cancel_event=None) -> dict:
+    """GET a Hevy API path, retrying 429/5xx responses and connection errors.
+
+    on_throttle is called (from the requesting thread) for every 429 response.
+    cancel_event is an optional threading.Event; once set, no new request or
+    retry is started and HevyFetchCancelled is raised.
+    Raises requests.exceptions.HTTPError once retries are exhausted.
+    """
+    import requests
+
+    session = get_hevy_api_session()
     headers = {
         "api-key": api_key,
         "accept": "application/json"
     }
-    
-    all_workouts = []
-    page = 0
-    page_size = 10  # Hevy API限制最大为10
-    
-    try:
-        while True:
-            params = {
-                "page": page,
-                "pageSize": page_size
-            }
+    url = f"{HEVY_API_BASE_URL}{path}"
 
-            response = requests.get(url, headers=headers, params=params, timeout=20)
-            response.raise_for_status()
-            data = response.json()
+    for attempt in range(HEVY_API_MAX_RETRIES + 1):
+        if cancel_event is not None and cancel_event.is_set():
+            raise HevyFetchCancelled()
+        last_attempt = attempt == HEVY_API_MAX_RETRIES
+        try:
+            response = session.get(url, headers=headers, params=params, timeout=20)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if last_attempt:
+                raise
+            wait_before_retry(get_retry_delay(attempt), cancel_event)
+            continue
 
-            workouts_batch = data.get("workouts", []) if isinstance(data, dict) else []
+        if response.status_code == 429 and on_throttle is not None:
+            try:
+                on_throttle()
+            except Exception:
+                pass
+        if (response.status_code == 429 or response.status_code >= 500) and not last_attempt:
+            wait_before_retry(get_retry_delay(attempt, response.headers.get("Retry-After")), cancel_event)
+            continue
 
+        response.raise_for_status()
+        data = response.json()
+        return data if isinstance(data, dict) else {}
+    return {}
+
+
+def fetch_hevy_pages(path: str, api_key: str, items_key: str, params: dict = None,
+                     progress_hook=None, max_workers: int = HEVY_API_MAX_CONCURRENCY,
+                     checkpoint: dict = None, new_accumulator=list, consume=None, cancel_event=None):
+    """Download every page of a paged Hevy endpoint and feed the items to an accumulator.
+
+    The first page is fetched alone to learn page_count; the remaining pages are
+    pulled by a bounded thread pool. Concurrency is halved whenever the server
+    answers 429 and grows back by one after a run of successful pages.
+    Pages are handed to consume(accumulator, items) and progress_hook(page,
+    items_in_page, items_so_far) from the calling thread, in page order, while
+    the workers keep downloading. By default the accumulator is a list of items.
+
+    checkpoint is an optional dict owned by the caller. The accumulator, the
+    last delivered page and any pages downloaded out of order are kept in it, so
+    when a fetch fails part-way the next call with the same checkpoint only
+    downloads the missing pages (as long as page 1 and page_count are
+    unchanged, i.e. nothing shifted the paging in between). The same applies
+    when the fetch is stopped through cancel_event (HevyFetchCancelled).
+    """
+    from collections import deque
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    if consume is None:
+        def consume(accumulator, batch):
+            accumulator.extend(batch)
+
+    page_size = HEVY_API_PAGE_SIZE
+    base_params = dict(params or {})
+    throttle_log = []
+
+    def get_page(page: int) -> tuple[list, int | None]:
+        data = hevy_api_get(
+            path,
+            api_key,
+            params={**base_params, "page": page, "pageSize": page_size},
+            on_throttle=lambda: throttle_log.append(page),
+            cancel_event=cancel_event,
+        )
+        return data.get(items_key, []), data.get("page_count")
+
+    first, page_count = get_page(1)
+
+    if page_count is None:
+        # Server did not report page_count: fall back to walking pages until a short one
+        accumulator = new_accumulator()
+        page = 1
+        batch = first
+        total = len(batch)
+        consume(accumulator, batch)
+        if progress_hook is not None:
+            progress_hook(page, len(batch), total)
+        while len(batch) == page_size:
+            page += 1
+            batch, _ = get_page(page)
+            total += len(batch)
+            consume(accumulator, batch)
             if progress_hook is not None:
-                try:
-                    progress_hook(page + 1, len(workouts_batch), len(all_workouts) + len(workouts_batch))
-                except Exception:
-                    pass
+                progress_hook(page, len(batch), total)
+        return accumulator
+
+    page_count = int(page_count)
+    signature = {
+        "path": path,
+        "params": sorted(base_params.items()),
+        "page_count": page_count,
+        "head": hashlib.sha256(json.dumps(first, sort_keys=True).encode("utf-8")).hexdigest(),
+    }
+    if checkpoint is not None and checkpoint.get("signature") == signature:
+        state = checkpoint
+    else:
+        state = {
+            "signature": signature,
+            "accumulator": new_accumulator(),
+            "delivered": 0,
+            "items": 0,
+            "pages": {},  # downloaded but not yet delivered
+        }
+        if checkpoint is not None:
+            checkpoint.update(state)
+            state = checkpoint
+    accumulator = state["accumulator"]
+    results = state["pages"]
+
+    def deliver(page: int, batch: list) -> None:
+        consume(accumulator, batch)
+        state["delivered"] = page
+        state["items"] += len(batch)
+        if progress_hook is not None:
+            try:
+                progress_hook(page, len(batch), state["items"])
+            except Exception:
+                pass
 
-            if not workouts_batch:
-                break
+    def flush() -> None:
+        while state["delivered"] + 1 in results:
+            page = state["delivered"] + 1
+            deliver(page, results.pop(page))
 
-            all_workouts.extend(workouts_batch)
+    if state["delivered"] == 0:
+        deliver(1, first)
+    flush()
 
-            if len(workouts_batch) < page_size:
-                break
+    pending = deque(
+        page for page in range(state["delivered"] + 1, page_count + 1) if page not in results
+    )
+    max_workers = max(1, int(max_workers))
+    limit = max_workers
+    streak = 0
+    throttles_seen = 0
+    in_flight = {}
 
-            page += 1
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        try:
+            while pending or in_flight:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise HevyFetchCancelled()
+                while pending and len(in_flight) < limit:
+                    page = pending.popleft()
+                    in_flight[pool.submit(get_page, page)] = page
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page = in_flight.pop(future)
+                    batch, _ = future.result()
+                    results[page] = batch
+                    streak += 1
+
+                if len(throttle_log) > throttles_seen:
+                    # Rate limited since the last check: back off concurrency
+                    throttles_seen = len(throttle_log)
+                    limit = max(1, limit // 2)
+                    streak = 0
+                elif streak >= limit and limit < max_workers:
+                    limit += 1
+                    streak = 0
+
+                flush()
+        except BaseException:
+            for future in in_flight:
+                future.cancel()
+            raise
+
+    return accumulator
+
+
+def fetch_hevy_workouts(api_key: str, progress_hook=None, max_workers: int = HEVY_API_MAX_CONCURRENCY,
+                        checkpoint: dict = None, cancel_event=None):
+    """从Hevy API获取训练数据（并发分页，见 fetch_hevy_pages）"""
+    try:
+        import requests
+    except ImportError:
+        return None, "请先安装 requests 库: pip install requests"
 
-        return {"workouts": all_workouts}, None
+    try:
+        workouts = fetch_hevy_pages(
+            "/v1/workouts",
+            api_key,
+            "workouts",
+            progress_hook=progress_hook,
+            max_workers=max_workers,
+            checkpoint=checkpoint,
+            cancel_event=cancel_event,
+        )
+        return {"workouts": workouts}, None
+    except HevyFetchCancelled:
+        return None, HEVY_FETCH_CANCELLED_MESSAGE
     except requests.exceptions.HTTPError as e:
         return None, f"HTTP错误: {e.response.status_code} - {e.response.text}"
     except Exception as e:
         return None, f"获取Hevy数据失败: {str(e)}"
 
 
-def convert_hevy_api_to_csv_format(workouts_data):
-    """将Hevy API格式转换为CSV格式"""
-    rows = []
-    metadata = {
+def fetch_hevy_workouts_frame(api_key: str, progress_hook=None, max_workers: int = HEVY_API_MAX_CONCURRENCY,
+                              checkpoint: dict = None, cancel_event=None):
+    """Fetch all workouts and convert each page into column buffers as it arrives.
+
+    Conversion runs on the calling thread while the pool downloads the next
+    pages, and only the column buffers (not the raw JSON) are kept.
+    Returns ((df, metadata), error) with the same frame as convert_hevy_api_to_csv_format.
+    """
+    try:
+        import requests
+    except ImportError:
+        return None, "请先安装 requests 库: pip install requests"
+
+    try:
+        buffers = fetch_hevy_pages(
+            "/v1/workouts",
+            api_key,
+            "workouts",
+            progress_hook=progress_hook,
+            max_workers=max_workers,
+            checkpoint=checkpoint,
+            new_accumulator=new_api_column_buffers,
+            consume=append_api_workouts,
+            cancel_event=cancel_event,
+        )
+        return finish_api_columns(buffers), None
+    except HevyFetchCancelled:
+        return None, HEVY_FETCH_CANCELLED_MESSAGE
+    except requests.exceptions.HTTPError as e:
+        return None, f"HTTP错误: {e.response.status_code} - {e.response.text}"
+    except Exception as e:
+        return None, f"获取Hevy数据失败: {str(e)}"
+
+
+def fetch_hevy_workout_events(api_key: str, since: str, progress_hook=None, checkpoint: dict = None,
+                              cancel_event=None):
+    """Fetch workout updates/deletions since the given ISO timestamp.
+
+    Returns ({"updated": [workout, ...], "deleted": [workout_id, ...], "since": str}, error).
+    When a workout has several events only the most recent one is kept.
+    """
+    try:
+        import requests
+    except ImportError:
+        return None, "请先安装 requests 库: pip install requests"
+
+    try:
+        events = fetch_hevy_pages(
+            "/v1/workouts/events",
+            api_key,
+            "events",
+            params={"since": since},
+            progress_hook=progress_hook,
+            checkpoint=checkpoint,
+            cancel_event=cancel_event,
+        )
+    except HevyFetchCancelled:
+        return None, HEVY_FETCH_CANCELLED_MESSAGE
+    except requests.exceptions.HTTPError as e:
+        return None, f"HTTP错误: {e.response.status_code} - {e.response.text}"
+    except Exception as e:
+        return None, f"获取Hevy数据失败: {str(e)}"
+
+    latest_events = {}
+    newest_stamp = pd.to_datetime(since, utc=True) if since else None
+    for event in events:
+        event_type = event.get("type")
+        if event_type == "deleted":
+            workout_id = event.get("id")
+            stamp = event.get("deleted_at")
+        else:
+            workout = event.get("workout") or {}
+            workout_id = workout.get("id")
+            stamp = workout.get("updated_at") or workout.get("created_at")
+        if not workout_id:
+            continue
+        stamp_ts = pd.to_datetime(stamp, utc=True, errors="coerce")
+        previous = latest_events.get(workout_id)
+        if (
+            previous is not None
+            and pd.notna(previous[0])
+            and (pd.isna(stamp_ts) or stamp_ts < previous[0])
+        ):
+            continue
+        latest_events[workout_id] = (stamp_ts, event)
+        if pd.notna(stamp_ts) and (newest_stamp is None or stamp_ts > newest_stamp):
+            newest_stamp = stamp_ts
+
+    updated = []
+    deleted = []
+    for workout_id, (_, event) in latest_events.items():
+        if event.get("type") == "deleted":
+            deleted.append(workout_id)
+        else:
+            updated.append(event["workout"])
+
+    return {
+        "updated": updated,
+        "deleted": deleted,
+        "since": newest_stamp.isoformat() if newest_stamp is not None else since,
+    }, None
+
+
+def get_api_key_fingerprint(api_key: str) -> str:
+    """Short non-reversible id so a sync watermark is only reused for the same account."""
+    return hashlib.sha256((api_key or "").strip().encode("utf-8")).hexdigest()[:16]
+
+
+def get_high_water_mark(stamps: list) -> str | None:
+    """Return the latest of the given updated_at stamps (ISO, UTC), or None if unknown."""
+    parsed = pd.to_datetime(
+        pd.Series(stamps, dtype=object),
+        utc=True,
+        errors="coerce",
+        format="ISO8601",
+    ).dropna()
+    if parsed.empty:
+        return None
+    return parsed.max().isoformat()
+
+
+def merge_workout_events(existing_df: pd.DataFrame, updated_workouts: list, deleted_ids: list) -> tuple[pd.DataFrame, dict]:
+    """Apply Hevy workout events to a previously fetched API dataset.
+
+    Rows belonging to deleted or updated workouts are dropped (matched on
+    workout_uuid), then the updated workouts are converted and appended.
+    """
+    new_df, meta = convert_hevy_api_to_csv_format({"workouts": updated_workouts})
+    if not new_df.empty:
+        new_df, _ = normalize_measurement_units(new_df)
+
+    touched_ids = set(deleted_ids) | {w.get("id") for w in updated_workouts if w.get("id")}
+    if existing_df is not None and not existing_df.empty:
+        kept = existing_df[~existing_df["workout_uuid"].isin(touched_ids)]
+        merged = pd.concat([kept, new_df], ignore_index=True) if not new_df.empty else kept.reset_index(drop=True)
+    else:
+        merged = new_df
+
+    meta["total_sets"] = int(len(merged))
+    meta["workouts_count"] = int(merged["workout_uuid"].nunique()) if "workout_uuid" in merged.columns else 0
+    meta["updated_workouts"] = len(updated_workouts)
+    meta["deleted_workouts"] = len(set(deleted_ids))
+    return merged, meta
+
+
+# Where an API set's distance value came from (see normalize_api_distances)
+DISTANCE_KIND_KM = 0
+DISTANCE_KIND_MILES = 1
+DISTANCE_KIND_GUESS = 2
+
+
+def new_api_column_buffers() -> dict:
+    """Empty column buffers for converting API workouts page by page.
+
+    Numeric columns are typed arrays (float64 / int64, NaN for missing values)
+    and text columns plain lists, in the column order of the converted frame.
+    """
+    return {
+        "columns": {
+            "workout_uuid": [],
+            "title": [],
+            "start_time": [],
+            "end_time": [],
+            "exercise_title": [],
+            "set_type": [],
+            "weight_kg": array("d"),
+            "reps": array("q"),
+            "set_index": array("d"),
+            "set_uuid": [],
+            "body_weight": array("d"),
+        },
+        # duration_seconds / distance_km inputs, normalized in finish_api_columns
+        "raw_durations": [],
+        "raw_distances": [],
+        "distance_kinds": array("b"),
+        "workout_ids": set(),
+        "duplicate_workouts": set(),
+        "seen_set_keys": set(),
         "skipped_duplicate_sets": 0,
-        "duplicate_workouts": [],
-        "total_sets": 0,
-        "workouts_count": 0,
+        "update_stamps": [],
     }
 
-    if not workouts_data or "workouts" not in workouts_data:
-        return pd.DataFrame(), metadata
 
-    workout_ids = set()
-    duplicate_workouts = set()
-    seen_set_keys = set()
-    skipped_duplicate_sets = 0
+def append_api_workouts(buffers: dict, workouts: list) -> None:
+    """Convert one batch of API workouts into rows appended to the column buffers."""
+    columns = buffers["columns"]
+    workout_ids = buffers["workout_ids"]
+    seen_set_keys = buffers["seen_set_keys"]
+    nan = float("nan")
 
-    for workout in workouts_data["workouts"]:
+    for workout in workouts:
         workout_id = workout.get("id", "unknown")
 
         if workout_id in workout_ids:
-            duplicate_workouts.add(workout_id)
+            buffers["duplicate_workouts"].add(workout_id)
             continue
         workout_ids.add(workout_id)
+        buffers["update_stamps"].append(workout.get("updated_at") or workout.get("created_at"))
 
         title = workout.get("title", "Untitled")
         start_time = workout.get("start_time")
@@ -3685,92 +5126,152 @@ def convert_hevy_api_to_csv_format(workouts_data):
                     unique_key = None
 
                 if unique_key is not None and unique_key in seen_set_keys:
-                    skipped_duplicate_sets += 1
+                    buffers["skipped_duplicate_sets"] += 1
                     continue
 
                 if unique_key is not None:
                     seen_set_keys.add(unique_key)
 
-                # Extract duration and distance if present in API payload
+                # Duration/distance are collected raw and normalized per column in finish_api_columns
                 duration_val = set_data.get("duration_seconds")
                 if duration_val is None:
                     # common alternatives
                     duration_val = set_data.get("duration_ms") or set_data.get("duration")
-                # normalize duration: handle hh:mm:ss strings and ms values
-                dur_seconds = None
-                if duration_val is not None and duration_val != "":
-                    try:
-                        if isinstance(duration_val, str) and ":" in duration_val:
-                            parts = [int(p) for p in duration_val.split(":")]
-                            # support H:M:S or M:S
-                            if len(parts) == 3:
-                                dur_seconds = parts[0] * 3600 + parts[1] * 60 + parts[2]
-                            elif len(parts) == 2:
-                                dur_seconds = parts[0] * 60 + parts[1]
-                            else:
-                                dur_seconds = int(parts[0])
-                        else:
-                            # numeric-ish: if very large, treat as ms
-                            dv = float(duration_val)
-                            if dv > 100000:  # >100k -> assume ms
-                                dur_seconds = int(dv / 1000)
-                            else:
-                                dur_seconds = int(dv)
-                    except Exception:
-                        dur_seconds = None
 
-                # Distance fields
-                distance_km = None
                 if "distance_km" in set_data:
-                    try:
-                        distance_km = float(set_data.get("distance_km"))
-                    except Exception:
-                        distance_km = None
+                    dist = set_data.get("distance_km")
+                    dist_kind = DISTANCE_KIND_KM
                 else:
                     # common alternatives
                     dist = set_data.get("distance") or set_data.get("distance_miles") or set_data.get("distance_m")
-                    if dist is not None and dist != "":
-                        try:
-                            dv = float(dist)
-                            # if key suggests miles, convert
-                            if set_data.get("distance_miles") is not None or (isinstance(dist, str) and "mi" in str(dist).lower()):
-                                distance_km = dv * MI_TO_KM
-                            else:
-                                # assume kilometers if value reasonable (<1000)
-                                if dv > 1000:
-                                    # maybe meters -> convert to km
-                                    distance_km = dv / 1000.0
-                                else:
-                                    distance_km = dv
-                        except Exception:
-                            distance_km = None
-
-                row = {
-                    "title": title,
-                    "start_time": start_time,
-                    "end_time": end_time,
-                    "exercise_title": exercise_title,
-                    "set_type": set_type,
-                    "weight_kg": weight,
-                    "reps": reps,
-                    "set_index": set_index,
-                    "set_uuid": set_uuid,
-                    "body_weight": final_body_weight,
-                    "duration_seconds": dur_seconds,
-                    "distance_km": distance_km,
-                }
-                rows.append(row)
+                    dist_kind = DISTANCE_KIND_MILES if set_data.get("distance_miles") is not None else DISTANCE_KIND_GUESS
+
+                columns["workout_uuid"].append(workout_id)
+                columns["title"].append(title)
+                columns["start_time"].append(start_time)
+                columns["end_time"].append(end_time)
+                columns["exercise_title"].append(exercise_title)
+                columns["set_type"].append(set_type)
+                columns["weight_kg"].append(weight)
+                columns["reps"].append(reps)
+                columns["set_index"].append(nan if set_index is None else float(set_index))
+                columns["set_uuid"].append(set_uuid)
+                columns["body_weight"].append(nan if final_body_weight is None else final_body_weight)
+                buffers["raw_durations"].append(duration_val)
+                buffers["raw_distances"].append(dist)
+                buffers["distance_kinds"].append(dist_kind)
+
+
+def normalize_api_durations(raw_values: list) -> tuple[np.ndarray, dict]:
+    """Turn raw API duration values into whole seconds (NaN when missing/unparseable).
+
+    Same heuristics the per-set converter used: "H:M:S" / "M:S" strings are
+    summed (only the first field counts when there are more than three), other
+    values are read as numbers and treated as milliseconds above 100000.
+    Each distinct raw value is parsed once and the result broadcast back.
+    Returns the seconds and how many values each heuristic touched.
+    """
+    codes, uniques = pd.factorize(pd.Series(raw_values, dtype=object))
+    values = pd.Series(uniques, dtype=object)
+    seconds = np.full(len(values), np.nan)
+    present = (values != "").to_numpy(dtype=bool)
+
+    # Anything that parses as a number takes the numeric path; a "H:M:S" string never does
+    numbers = np.array(pd.to_numeric(values, errors="coerce"), dtype=float)
+    numeric_mask = present & ~np.isnan(numbers)
+    numbers[~np.isfinite(numbers)] = np.nan
+    as_ms = numeric_mask & (numbers > 100000)  # >100k -> assume ms
+    seconds[numeric_mask] = np.trunc(np.where(as_ms, numbers / 1000, numbers))[numeric_mask]
+
+    text_mask = present & ~numeric_mask
+    clock_mask = np.zeros(len(values), dtype=bool)
+    if text_mask.any():
+        clock = values[text_mask].astype(str)
+        int_part = r"\s*([+-]?\d+)\s*"
+        hms = clock.str.extract(f"^{int_part}:{int_part}(?::{int_part})?$").astype(float)
+        clock_seconds = np.where(
+            hms[2].isna(),
+            hms[0] * 60 + hms[1],
+            hms[0] * 3600 + hms[1] * 60 + hms[2],
+        )
+        unmatched = np.isnan(clock_seconds)
+        if unmatched.any():
+            longer = clock[unmatched].str.extract(rf"^{int_part}(?::\s*[+-]?\d+\s*){{3,}}$")[0]
+            clock_seconds[unmatched] = longer.astype(float).to_numpy()
+        seconds[text_mask] = clock_seconds
+        clock_mask[text_mask] = ~np.isnan(clock_seconds)
+
+    counts = np.bincount(codes[codes >= 0], minlength=len(values))
+    report = {
+        "duration_clock_strings": int(counts[clock_mask].sum()),
+        "duration_ms_to_seconds": int(counts[as_ms].sum()),
+        "duration_unparseable": int(counts[present & np.isnan(seconds)].sum()),
+    }
+    return np.append(seconds, np.nan)[codes], report
+
 
-    df = pd.DataFrame(rows)
+def normalize_api_distances(raw_values: list, kinds) -> tuple[np.ndarray, dict]:
+    """Turn raw API distance values into kilometres (NaN when missing/unparseable).
 
-    metadata["skipped_duplicate_sets"] = skipped_duplicate_sets
-    metadata["duplicate_workouts"] = sorted(duplicate_workouts)
-    metadata["total_sets"] = len(df)
-    metadata["workouts_count"] = len(workout_ids)
+    kinds says where each value came from: DISTANCE_KIND_KM (already km),
+    DISTANCE_KIND_MILES (converted), or DISTANCE_KIND_GUESS where values above
+    1000 are taken as metres. Returns the km values and how many values each
+    heuristic touched.
+    """
+    codes, uniques = pd.factorize(pd.Series(raw_values, dtype=object))
+    values = pd.Series(uniques, dtype=object)
+    unique_numbers = np.array(pd.to_numeric(values, errors="coerce"), dtype=float)
+    present = np.append((values != "").to_numpy(dtype=bool), False)[codes]
+    numbers = np.append(unique_numbers, np.nan)[codes]
+    kinds = np.asarray(kinds, dtype=np.int8)
+
+    # The old per-set check for "mi" inside a value's text is not repeated: such a
+    # string never parses as a number, so it always ended up unparseable anyway.
+    miles = kinds == DISTANCE_KIND_MILES
+    meters = (kinds == DISTANCE_KIND_GUESS) & (numbers > 1000)
+    km = numbers.copy()
+    km[miles] *= MI_TO_KM
+    km[meters] /= 1000.0
+
+    report = {
+        "distance_miles_to_km": int(np.count_nonzero(miles & ~np.isnan(numbers))),
+        "distance_meters_to_km": int(np.count_nonzero(meters)),
+        "distance_unparseable": int(np.count_nonzero(present & np.isnan(numbers))),
+    }
+    return km, report
+
+
+def finish_api_columns(buffers: dict) -> tuple[pd.DataFrame, dict]:
+    """Build the converted DataFrame and metadata from filled column buffers."""
+    data = {}
+    for name, values in buffers["columns"].items():
+        if isinstance(values, array):
+            data[name] = np.array(values, dtype=np.int64 if values.typecode == "q" else np.float64)
+        else:
+            data[name] = values
+    data["duration_seconds"], duration_report = normalize_api_durations(buffers["raw_durations"])
+    data["distance_km"], distance_report = normalize_api_distances(buffers["raw_distances"], buffers["distance_kinds"])
+    df = pd.DataFrame(data)
 
+    metadata = {
+        "skipped_duplicate_sets": buffers["skipped_duplicate_sets"],
+        "duplicate_workouts": sorted(buffers["duplicate_workouts"]),
+        "total_sets": len(df),
+        "workouts_count": len(buffers["workout_ids"]),
+        "high_water_mark": get_high_water_mark(buffers["update_stamps"]),
+        "normalization_report": {**duration_report, **distance_report},
+    }
     return df, metadata
 
 
+def convert_hevy_api_to_csv_format(workouts_data):
+    """将Hevy API格式转换为CSV格式"""
+    buffers = new_api_column_buffers()
+    if workouts_data and "workouts" in workouts_data:
+        append_api_workouts(buffers, workouts_data["workouts"])
+    return finish_api_columns(buffers)
+
+
 def summarize_raw_sets(df: pd.DataFrame) -> dict:
     if df is None or df.empty:
         return {"total_sets": 0, "workouts_count": 0}
@@ -3785,82 +5286,352 @@ def summarize_raw_sets(df: pd.DataFrame) -> dict:
     return summary
 
 
-def store_dataset(source: str, df: pd.DataFrame, meta: dict, success_message: str, warnings=None, switch_to_source: bool = True):
+def store_dataset(source: str, df: pd.DataFrame, meta: dict, success_message: str, warnings=None, switch_to_source: bool = True,
+                  persist: bool = True):
     st.session_state["data_cache"][source] = df
+    # The dataset was replaced: merge keys and processed frames of the old one no longer apply
+    st.session_state.get("import_set_keys", {}).pop(source, None)
+    versions = st.session_state.setdefault("dataset_versions", {})
+    versions[source] = versions.get(source, 0) + 1
     meta = dict(meta) if meta is not None else {}
     meta["success_message"] = success_message
     meta["status_messages"] = [warn for warn in (warnings or []) if warn]
     st.session_state["data_source_meta"][source] = meta
+    if persist:
+        queue_store_write(source, save_dataset_to_store, source, df, dict(meta))
     if switch_to_source:
         st.session_state["data_source_choice"] = source
         st.session_state["pending_source_choice"] = source
     st.session_state["header_messages"] = []
 
 
-def process_csv_upload(uploaded_file, key_prefix: str = "", switch_to_source: bool = False):
+def append_import_to_dataset(source: str, new_df: pd.DataFrame, batch_meta: dict, label: str,
+                             switch_to_source: bool = True) -> None:
+    """Merge a CSV or API batch into `source` instead of replacing it (the "Append" import mode).
+
+    Overlapping sets are kept once (merge_import_batch). The sorted merge keys
+    of the result stay in session state, so the next import only hashes its
+    own rows, and only the added rows are written to the local store.
+    """
+    existing_df = st.session_state["data_cache"].get(source)
+    existing_meta = st.session_state["data_source_meta"].get(source) or {}
+    keys_cache = st.session_state.setdefault("import_set_keys", {})
+    cached = keys_cache.get(source)
+    # Only trust cached keys for the exact frame they were built from
+    seen_keys = cached[1] if cached is not None and existing_df is not None and cached[0] == len(existing_df) else None
+    merged, added, seen_keys, skipped = merge_import_batch(existing_df, new_df, seen_keys)
+
+    has_history = existing_df is not None and not existing_df.empty
+    meta = {
+        **existing_meta,
+        **batch_meta,
+        **summarize_raw_sets(merged),
+        "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
+        "import_batches": existing_meta.get("import_batches", 1 if has_history else 0) + 1,
+        "skipped_overlapping_sets": existing_meta.get("skipped_overlapping_sets", 0) + skipped,
+    }
+    message = f"Appended {len(added):,} sets from {label}"
+    if skipped:
+        message += f" ({skipped:,} already loaded)"
+    store_dataset(source, merged, meta, message, switch_to_source=switch_to_source, persist=False)
+    queue_store_write(
+        source, apply_workout_changes_to_store, source, added, [], dict(st.session_state["data_source_meta"][source]), merged
+    )
+    keys_cache[source] = (len(merged), seen_keys)
+
+
+def process_csv_upload(uploaded_file, key_prefix: str = "", switch_to_source: bool = False,
+                       append: bool = False):
     if uploaded_file is None:
         return
+    # The uploader hands the same file back on every rerun; only ingest it once
+    upload_id = getattr(uploaded_file, "file_id", None)
+    loaded_meta = st.session_state["data_source_meta"].get("Upload CSV File") or {}
+    if (
+        upload_id
+        and loaded_meta.get("upload_id") == upload_id
+        and st.session_state["data_cache"].get("Upload CSV File") is not None
+    ):
+        return
+
+    progress_bar = st.progress(0.0, text="Reading CSV...")
+
+    def progress_hook(bytes_read: int, total_bytes: int):
+        fraction = min(bytes_read / total_bytes, 1.0) if total_bytes else 1.0
+        progress_bar.progress(
+            fraction,
+            text=f"Reading CSV... {bytes_read / 2**20:,.1f} / {total_bytes / 2**20:,.1f} MB",
+        )
 
-    df = load_hevy_workouts(uploaded_file)
-    df, measurement_info = normalize_measurement_units(df)
+    df, load_info = ingest_hevy_csv_cached(uploaded_file, progress_hook=progress_hook)
+    progress_bar.empty()
     summary = summarize_raw_sets(df)
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
     meta = {
         **summary,
         "updated_at": timestamp,
-        "skipped_duplicate_sets": 0,
+        "skipped_duplicate_sets": load_info["skipped_duplicate_sets"],
         "duplicate_workouts": [],
-        "measurement_info": measurement_info,
+        "measurement_info": load_info["measurement_info"],
+        "encoding": load_info["encoding"],
     }
     file_name = getattr(uploaded_file, "name", None)
     if file_name:
         meta["file_name"] = file_name
-    store_dataset(
-        "Upload CSV File",
-        df,
-        meta,
-        f"Loaded {summary['total_sets']} sets from CSV",
-        switch_to_source=switch_to_source,
-    )
+    if upload_id:
+        meta["upload_id"] = upload_id
+    if append:
+        batch_meta = {key: value for key, value in meta.items() if key not in ("total_sets", "workouts_count")}
+        append_import_to_dataset("Upload CSV File", df, batch_meta, file_name or "CSV", switch_to_source=switch_to_source)
+    else:
+        store_dataset(
+            "Upload CSV File",
+            df,
+            meta,
+            f"Loaded {summary['total_sets']} sets from CSV" + (" (cached parse)" if load_info.get("from_cache") else ""),
+            switch_to_source=switch_to_source,
+        )
     if switch_to_source:
         trigger_rerun()
 
 
-def process_api_fetch(api_key: str, progress_hook=None) -> bool:
-    api_key = (api_key or "").strip()
-    if not api_key:
-        st.session_state["header_messages"] = [("error", "Hevy API key is required to fetch data.")]
-        return False
+def get_api_fetch_checkpoint(fingerprint: str) -> dict:
+    """Resume checkpoint for the given API key (see fetch_hevy_pages).
 
-    data, error = fetch_hevy_workouts(api_key, progress_hook=progress_hook)
-    if error:
-        st.session_state["header_messages"] = [("error", error)]
-        return False
+    Pages downloaded by a failed or cancelled fetch are kept here so the next
+    attempt only downloads what is missing.
+    """
+    checkpoint = st.session_state.setdefault("api_fetch_checkpoint", {})
+    if checkpoint.get("api_key_fingerprint") != fingerprint:
+        checkpoint.clear()
+        checkpoint["api_key_fingerprint"] = fingerprint
+    return checkpoint
 
-    if not data:
-        st.session_state["header_messages"] = [("warning", "No workout data returned from Hevy.")]
-        return False
 
-    df, meta = convert_hevy_api_to_csv_format(data)
-    df, measurement_info = normalize_measurement_units(df)
-    meta["measurement_info"] = measurement_info
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-    meta["updated_at"] = timestamp
+def run_api_fetch(api_key: str, existing_df: pd.DataFrame, existing_meta: dict, checkpoint: dict,
+                  full_refresh: bool = False, progress_hook=None, cancel_event=None) -> dict:
+    """Fetch workouts from Hevy and build the new API dataset without touching session state.
+
+    When existing_meta carries a sync watermark for the same API key, only the
+    workout events since then are requested and merged into existing_df.
+    Pass full_refresh=True to re-download the full history instead.
+    Safe to run on a worker thread; apply_api_fetch_result stores the outcome.
+    """
+    fingerprint = get_api_key_fingerprint(api_key)
+    existing_meta = existing_meta or {}
+    can_sync_incrementally = (
+        not full_refresh
+        and existing_df is not None
+        and not existing_df.empty
+        and "workout_uuid" in existing_df.columns
+        and bool(existing_meta.get("sync_since"))
+        and existing_meta.get("api_key_fingerprint") == fingerprint
+    )
+
+    if can_sync_incrementally:
+        events, error = fetch_hevy_workout_events(
+            api_key,
+            existing_meta["sync_since"],
+            progress_hook=progress_hook,
+            checkpoint=checkpoint,
+            cancel_event=cancel_event,
+        )
+        if error:
+            return {"ok": False, "level": "error", "message": error}
+
+        df, meta = merge_workout_events(existing_df, events["updated"], events["deleted"])
+        meta.pop("high_water_mark", None)
+        meta["measurement_info"] = existing_meta.get("measurement_info", {})
+        meta["sync_since"] = events["since"]
+        if events["updated"] or events["deleted"]:
+            success_message = (
+                f"Synced {meta['updated_workouts']} updated and "
+                f"{meta['deleted_workouts']} deleted workouts from Hevy API"
+            )
+        else:
+            success_message = "Hevy data is already up to date"
+        updated_ids = {w.get("id") for w in events["updated"] if w.get("id")}
+        changes = (updated_ids, updated_ids | set(events["deleted"]))
+    else:
+        sync_started = datetime.now(timezone.utc).isoformat()
+        converted, error = fetch_hevy_workouts_frame(
+            api_key,
+            progress_hook=progress_hook,
+            checkpoint=checkpoint,
+            cancel_event=cancel_event,
+        )
+        if error:
+            return {"ok": False, "level": "error", "message": error}
+
+        df, meta = converted
+        if df.empty:
+            return {"ok": False, "level": "warning", "message": "No workout data returned from Hevy."}
+
+        df, measurement_info = normalize_measurement_units(df)
+        meta["measurement_info"] = measurement_info
+        meta["sync_since"] = meta.pop("high_water_mark", None) or sync_started
+        success_message = f"Fetched {meta['total_sets']} sets from Hevy API"
+        changes = None
 
-    success_message = f"Fetched {meta['total_sets']} sets from Hevy API"
+    meta["api_key_fingerprint"] = fingerprint
+    meta["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M")
+    return {"ok": True, "df": df, "meta": meta, "message": success_message, "changes": changes}
+
+
+def apply_api_fetch_result(result: dict, checkpoint: dict, append: bool = False) -> bool:
+    """Store a run_api_fetch result as the API dataset, or report why it failed.
+
+    With append=True the fetched workouts are also merged into the uploaded
+    CSV data (the "Append" import mode), which then becomes the active source.
+    """
+    source = "Connect to Hevy API"
+    if not result["ok"]:
+        message = result["message"]
+        saved_pages = checkpoint.get("delivered", 0) + len(checkpoint.get("pages", {}))
+        if result["level"] == "error" and saved_pages:
+            message = f"{message} ({saved_pages} pages kept — fetch again to resume)"
+        st.session_state["header_messages"] = [(result["level"], message)]
+        return False
 
+    checkpoint.clear()
+    checkpoint["api_key_fingerprint"] = result["meta"]["api_key_fingerprint"]
+    df = result["df"]
+    changes = result["changes"]
     store_dataset(
-        "Connect to Hevy API",
+        source,
         df,
-        meta,
-        success_message,
+        result["meta"],
+        result["message"],
         None,
+        persist=changes is None,
     )
+    if changes is not None:
+        # Incremental sync: rewrite only the touched workouts in the local store
+        updated_ids, touched_ids = changes
+        queue_store_write(
+            source,
+            apply_workout_changes_to_store,
+            source,
+            df[df["workout_uuid"].isin(updated_ids)],
+            touched_ids,
+            dict(st.session_state["data_source_meta"][source]),
+            df,
+        )
+    if append:
+        batch = df if changes is None else df[df["workout_uuid"].isin(changes[0])]
+        append_import_to_dataset("Upload CSV File", batch, {}, "Hevy API")
+    return True
+
+
+def start_api_fetch_job(api_key: str, full_refresh: bool = False) -> dict:
+    """Run a Hevy fetch on a background thread and return its job handle.
+
+    The handle is a plain dict kept in st.session_state["api_fetch_job"]: the
+    worker appends to "progress" and finally sets "result", while script runs
+    poll it, set "cancel" to stop the fetch and hand the finished result to
+    apply_api_fetch_result (see collect_api_fetch_job). The worker only gets
+    copies of what it needs and never reads st.session_state, so the loaded
+    data stays browsable during the fetch.
+    """
+    import threading
+
+    source = "Connect to Hevy API"
+    job = {
+        "api_key_fingerprint": get_api_key_fingerprint(api_key),
+        "full_refresh": bool(full_refresh),
+        "append": bool(st.session_state.get("append_imports", False)),
+        "progress": ["Connecting to Hevy API"],
+        "cancel": threading.Event(),
+        "result": None,
+        "started_at": time.time(),
+    }
+    checkpoint = get_api_fetch_checkpoint(job["api_key_fingerprint"])
+    existing_df = st.session_state["data_cache"].get(source)
+    existing_meta = dict(st.session_state["data_source_meta"].get(source, {}))
+
+    def progress_hook(page_number: int, workouts_count: int, total_count: int):
+        if workouts_count == 0:
+            message = f"Page {page_number}: no workouts returned"
+        else:
+            message = f"Page {page_number}: {workouts_count} workouts fetched (total {total_count})"
+        job["progress"].append(message)
+
+    def worker():
+        try:
+            result = run_api_fetch(
+                api_key,
+                existing_df,
+                existing_meta,
+                checkpoint,
+                full_refresh=full_refresh,
+                progress_hook=progress_hook,
+                cancel_event=job["cancel"],
+            )
+        except Exception as e:
+            result = {"ok": False, "level": "error", "message": f"获取Hevy数据失败: {str(e)}"}
+        job["result"] = result
+
+    job["thread"] = threading.Thread(target=worker, name="hevy-api-fetch", daemon=True)
+    st.session_state["api_fetch_job"] = job
+    job["thread"].start()
+    return job
+
+
+def is_api_fetch_running() -> bool:
+    job = st.session_state.get("api_fetch_job")
+    return job is not None and job["result"] is None
+
+
+def collect_api_fetch_job() -> bool:
+    """Apply the background fetch result if the job has finished; True when something was applied."""
+    job = st.session_state.get("api_fetch_job")
+    if job is None or job["result"] is None:
+        return False
+    st.session_state.pop("api_fetch_job", None)
+    checkpoint = get_api_fetch_checkpoint(job["api_key_fingerprint"])
+    apply_api_fetch_result(job["result"], checkpoint, append=job["append"])
     return True
 
 
-def schedule_api_fetch(api_key: str):
-    """Queue a Hevy API fetch to run on the next app cycle."""
+def render_api_fetch_job_status():
+    """Progress card for the running background fetch, with a cancel button."""
+    job = st.session_state.get("api_fetch_job")
+    if job is None:
+        return
+    if job["result"] is not None:
+        # Finished since the last poll: rerun the whole app so main() applies the result
+        trigger_rerun()
+        return
+
+    cancelling = job["cancel"].is_set()
+    elapsed = int(time.time() - job["started_at"])
+    with st.container(border=True):
+        status_col, button_col = st.columns([5, 1])
+        with status_col:
+            title = "Cancelling Hevy fetch..." if cancelling else "Fetching workouts from Hevy..."
+            st.markdown(f"**🔄 {title}** <span style='color:#8a8f9c;'>({elapsed}s)</span>", unsafe_allow_html=True)
+            st.caption(job["progress"][-1])
+        with button_col:
+            if st.button("Cancel", key="api_fetch_cancel", disabled=cancelling, use_container_width=True):
+                job["cancel"].set()
+                trigger_rerun()
+            if not hasattr(st, "fragment"):
+                # No fragment support to poll with: let the user refresh the status
+                st.button("Refresh", key="api_fetch_refresh", use_container_width=True)
+
+
+def render_api_fetch_status():
+    """Show the background fetch card, polling it every HEVY_FETCH_POLL_INTERVAL seconds."""
+    if st.session_state.get("api_fetch_job") is None:
+        return
+    if hasattr(st, "fragment"):
+        st.fragment(render_api_fetch_job_status, run_every=HEVY_FETCH_POLL_INTERVAL)()
+    else:
+        render_api_fetch_job_status()
+
+
+def schedule_api_fetch(api_key: str, full_refresh: bool = False):
+    """Start a background Hevy API fetch (see start_api_fetch_job)."""
     api_key = (api_key or "").strip()
     if not api_key:
         st.session_state.setdefault("header_messages", [])
@@ -3868,6 +5639,12 @@ def schedule_api_fetch(api_key: str):
             ("error", "Hevy API key is required to fetch data."),
         )
         return
+    if is_api_fetch_running():
+        st.session_state.setdefault("header_messages", [])
+        st.session_state["header_messages"].append(
+            ("info", "A Hevy fetch is already running."),
+        )
+        return
 
     remember_choice = st.session_state.get("remember_api_key")
     if remember_choice:
@@ -3876,8 +5653,7 @@ def schedule_api_fetch(api_key: str):
         st.session_state["api_key_value"] = ""
     sync_persisted_api_key(api_key, bool(remember_choice))
     st.session_state["pending_api_key"] = api_key
-    st.session_state["pending_fetch"] = api_key
-    st.session_state["fetch_progress"] = ["Connecting to Hevy API"]
+    start_api_fetch_job(api_key, full_refresh=full_refresh)
     trigger_rerun()
 
 
@@ -4170,10 +5946,13 @@ def main():
         st.session_state["prev_nav_page"] = "Home"
     if "data_source_choice" not in st.session_state:
         st.session_state["data_source_choice"] = "Connect to Hevy API"
-    if "data_cache" not in st.session_state:
-        st.session_state["data_cache"] = {}
-    if "data_source_meta" not in st.session_state:
-        st.session_state["data_source_meta"] = {}
+    if "data_cache" not in st.session_state or "data_source_meta" not in st.session_state:
+        # Restore datasets saved by earlier sessions so a refresh/restart doesn't need a re-fetch
+        stored_cache, stored_meta = load_datasets_from_store()
+        st.session_state["data_cache"] = stored_cache
+        st.session_state["data_source_meta"] = stored_meta
+        if stored_cache and st.session_state["data_source_choice"] not in stored_cache:
+            st.session_state["data_source_choice"] = next(iter(stored_cache))
     if "header_messages" not in st.session_state:
         st.session_state["header_messages"] = []
 
@@ -4213,48 +5992,17 @@ def main():
         st.session_state["drop_set_factor"] = user_prefs.get("drop_set_factor", 0.5)
     if "include_bodyweight" not in st.session_state:
         st.session_state["include_bodyweight"] = user_prefs.get("include_bodyweight", True)
-    if "pending_fetch" not in st.session_state:
-        st.session_state["pending_fetch"] = None
-    if "fetch_progress" not in st.session_state:
-        st.session_state["fetch_progress"] = []
+    # Data management: merge new imports into the loaded data instead of replacing it
+    if "append_imports" not in st.session_state:
+        st.session_state["append_imports"] = user_prefs.get("append_imports", False)
     if "csv_upload_pending" not in st.session_state:
         st.session_state["csv_upload_pending"] = False
     if "source_panel_open" not in st.session_state:
         st.session_state["source_panel_open"] = False
 
-    pending_key = st.session_state.get("pending_fetch")
-    if pending_key:
-        overlay_placeholder = st.empty()
-        progress_lines = st.session_state.get("fetch_progress") or ["Connecting to Hevy API"]
-        overlay_placeholder.markdown(
-            build_fetch_overlay(progress_lines),
-            unsafe_allow_html=True,
-        )
-
-        def progress_hook(page_number: int, workouts_count: int, total_count: int):
-            if workouts_count == 0:
-                message = f"Page {page_number}: no workouts returned"
-            else:
-                message = f"Page {page_number}: {workouts_count} workouts fetched (total {total_count})"
-            progress_list = st.session_state.get("fetch_progress", [])
-            progress_list.append(message)
-            st.session_state["fetch_progress"] = progress_list
-            overlay_placeholder.markdown(
-                build_fetch_overlay(progress_list),
-                unsafe_allow_html=True,
-            )
-
-        success = process_api_fetch(pending_key, progress_hook=progress_hook)
-        st.session_state["pending_fetch"] = None
-        st.session_state["fetch_progress"] = []
-        overlay_placeholder.empty()
-
-        if not success:
-            trigger_rerun()
-            st.stop()
-
-        trigger_rerun()
-        st.stop()
+    # A background fetch finished since the last run: store its data before rendering
+    collect_api_fetch_job()
+    collect_store_writes()
 
     with st.sidebar:
         st.markdown("<div class='sidebar-brand'>HEVY ANALYZER</div>", unsafe_allow_html=True)
@@ -4371,6 +6119,7 @@ def main():
                     unsafe_allow_html=True,
                 )
         st.session_state["header_messages"] = []
+        render_api_fetch_status()
 
     if source_col is not None:
         with source_col:
@@ -4410,9 +6159,7 @@ def main():
         st.divider()
 
         # Prepare data: attach exercise metadata and compute effective metrics
-        ex_df = load_exercises()
-        processed = prepare_workout_df(raw_hevy_df, ex_df)
-        processed = add_effective_metrics(processed)
+        processed = get_processed_workouts(current_source)
 
         # Aggregate per-workout summary (use metric-aware columns so warmups can be included/excluded)
         workout_summary = (
@@ -4428,6 +6175,9 @@ def main():
             .reset_index()
             .sort_values("start_dt", ascending=False)
         )
+        # Selection and links use the stable workout_key; rows are looked up by code
+        workout_summary["workout_key"] = workout_summary["workout_id"].map(get_workout_lookup(processed)["workout_key"])
+        workout_codes = dict(zip(workout_summary["workout_key"], workout_summary["workout_id"]))
 
         # The left column provides a filter/search box; skip the redundant top search.
         filtered = workout_summary
@@ -4442,7 +6192,7 @@ def main():
                 st.info("No workouts available for the selected data source.")
             else:
                 # Build display labels and ensure a stable selection key
-                options = filtered["workout_id"].tolist()
+                options = filtered["workout_key"].tolist()
                 # Simplify long titles: truncate to a reasonable length and append ellipsis
                 max_label_title = 36
                 labels = [
@@ -4491,7 +6241,7 @@ def main():
                                 (start_short and start_short in qp_decoded) or
                                 (date_only and date_only in qp_decoded)
                             ):
-                                match = r.workout_id
+                                match = r.workout_key
                                 break
                     if match is not None:
                         st.session_state["selected_workout_id"] = match
@@ -4659,7 +6409,7 @@ def main():
             if not sel:
                 st.info("请选择左侧的某个 workout 以查看动作详情。")
             else:
-                wdf = processed[processed["workout_id"] == sel]
+                wdf = processed[processed["workout_id"] == workout_codes.get(sel, -1)]
                 if wdf.empty:
                     st.info("没有找到该 workout 的详细数据。")
                 else:
@@ -4971,9 +6721,8 @@ def main():
                 st.rerun()
 
         # Prepare data
-        ex_df = load_exercises()
-        processed = prepare_workout_df(raw_hevy_df, ex_df)
-        processed = add_effective_metrics(processed)
+        ex_df = get_exercises_df()
+        processed = get_processed_workouts(current_source)
 
         # Ensure required columns exist in ex_df
         if "equipment" not in ex_df.columns:
@@ -5003,9 +6752,9 @@ def main():
             .sort_values("total_sets", ascending=False)
         )
 
-        # Reload exercises fresh using load_exercises() which merges custom_exercises.csv
-        # This ensures we have the latest equipment/muscle data including user customizations
-        fresh_ex_df = load_exercises()
+        # Exercises as load_exercises() merges them with custom_exercises.csv; re-read whenever
+        # either file changed, so this has the latest equipment/muscle data including user customizations
+        fresh_ex_df = get_exercises_df()
         fresh_ex_df["exercise_title"] = fresh_ex_df["exercise_title"].astype(str).str.strip()
         
         # Ensure required columns exist
@@ -6567,9 +8316,11 @@ def main():
                     else:
                         # Sort workouts by date descending (use ex_data_all to show all sets including warmups)
                         workout_dates = ex_data_all.groupby("workout_id")["start_dt"].first().sort_values(ascending=False)
+                        workout_keys = get_workout_lookup(ex_data_all)["workout_key"]
+                        sets_by_workout = dict(tuple(ex_data_all.groupby("workout_id", sort=False)))
 
                         for workout_id in workout_dates.index:
-                            wdf = ex_data_all[ex_data_all["workout_id"] == workout_id]
+                            wdf = sets_by_workout[workout_id]
                             workout_title = wdf["title"].iloc[0]
                             workout_date = wdf["start_dt"].iloc[0]
                             workout_date_str = workout_date.strftime("%Y-%m-%d %H:%M") if hasattr(workout_date, "strftime") else str(workout_date)
@@ -6577,7 +8328,7 @@ def main():
                             # Workout header - Title as clickable button that navigates to Workouts Review
                             workout_btn_key = f"workout_link_{workout_id}"
                             if st.button(workout_title, key=workout_btn_key, type="tertiary"):
-                                st.session_state["selected_workout_id"] = workout_id
+                                st.session_state["selected_workout_id"] = workout_keys[workout_id]
                                 st.session_state["nav_page"] = "Workouts Review"
                                 st.rerun()
                             st.caption(workout_date_str)
@@ -6966,7 +8717,11 @@ def main():
                         label_visibility="collapsed",
                     )
                     if settings_csv_file is not None:
-                        process_csv_upload(settings_csv_file, switch_to_source=True)
+                        process_csv_upload(
+                            settings_csv_file,
+                            switch_to_source=True,
+                            append=st.session_state.get("append_imports", False),
+                        )
         
         with dm_col2:
             with st.container(border=True):
@@ -6974,6 +8729,12 @@ def main():
                 with col_label:
                     st.markdown("**🔗 Fetch from Hevy API**")
                     render_remember_api_option("settings_remember_api_key")
+                    settings_full_refresh = st.checkbox(
+                        "Re-download full history",
+                        value=False,
+                        key="settings_full_refresh",
+                        help="By default only workouts changed since the last fetch are downloaded.",
+                    )
                 with col_ctrl:
                     col_input, col_btn = st.columns([2, 1])
                     with col_input:
@@ -6989,7 +8750,32 @@ def main():
                             st.session_state["pending_api_key"] = settings_api_key
                     with col_btn:
                         if st.button("Fetch", key="settings_fetch_api", use_container_width=True):
-                            schedule_api_fetch(settings_api_key)
+                            schedule_api_fetch(settings_api_key, full_refresh=settings_full_refresh)
+        
+        with st.container(border=True):
+            col_label, col_ctrl = st.columns([2, 1])
+            with col_label:
+                st.markdown("**➕ Append Imports**")
+                st.caption(
+                    "Merge new CSV exports and API fetches into the uploaded data instead of replacing it; "
+                    "sets already loaded are skipped"
+                )
+            with col_ctrl:
+                append_current = st.session_state.get("append_imports", False)
+                append_choice = st.toggle(
+                    "Append Imports",
+                    value=append_current,
+                    key="settings_append_imports",
+                    label_visibility="collapsed",
+                )
+                if append_choice != append_current:
+                    st.session_state["append_imports"] = bool(append_choice)
+                    update_user_preferences(append_imports=bool(append_choice))
+                    st.toast(
+                        "New imports will be merged into the loaded data" if append_choice
+                        else "New imports will replace the loaded data"
+                    )
+                    trigger_rerun()
         
         st.markdown("")
         
@@ -7259,6 +9045,8 @@ def main():
                     st.toast("Changes saved!")
                     st.rerun()
         
+        st.markdown("")
+        render_pipeline_cache_debug()
         return
 
     if page not in ("Home", "Workouts Review", "Exercise Review", "Settings"):
@@ -7266,11 +9054,6 @@ def main():
         return
 
     body_weight_value = st.session_state.body_weight_setting
-    raw_hevy_df = raw_hevy_df.copy()
-    raw_hevy_df["body_weight"] = body_weight_value
-    raw_hevy_df["body_weight"] = pd.to_numeric(raw_hevy_df["body_weight"], errors="coerce")
-
-    exercises_df = load_exercises()
 
     if "view_mode" not in st.session_state:
         st.session_state.view_mode = "Week"
@@ -7279,16 +9062,24 @@ def main():
     if "summary_metric" not in st.session_state:
         st.session_state.summary_metric = "Workouts"
 
-    df = prepare_workout_df(raw_hevy_df, exercises_df)
-    df = add_effective_metrics(df)
-    df = add_period_columns(df, st.session_state.week_start)
-    df = df.sort_values(["date", "workout_id"])
+    df = get_processed_workouts(current_source, body_weight=body_weight_value, week_start=st.session_state.week_start)
 
     if df.empty:
         st.warning("数据为空，请检查 hevy_workouts.csv 内容。")
         return
 
-    period_summary = build_period_summary(df, st.session_state.view_mode, st.session_state.week_start)
+    if "summary_window" not in st.session_state:
+        st.session_state.summary_window = "Recent"
+
+    period_cube = get_period_cube(current_source, body_weight=body_weight_value, week_start=st.session_state.week_start)
+    period_summary = build_period_summary(
+        df,
+        st.session_state.view_mode,
+        st.session_state.week_start,
+        cube=period_cube,
+        window=st.session_state.summary_window,
+        custom_range=st.session_state.get("summary_custom_range"),
+    )
     
     # Initialize or validate active_period
     periods = period_summary["period_start"].sort_values(ascending=False).tolist()
@@ -7312,16 +9103,23 @@ def main():
         st.markdown("---")
         
         # Workout Summary uses its own independent metric selector
-        render_workout_summary(period_summary, st.session_state.view_mode, st.session_state.summary_metric)
+        render_workout_summary(
+            period_summary,
+            st.session_state.view_mode,
+            st.session_state.summary_metric,
+            period_cube=period_cube,
+            period_col=get_period_column(st.session_state.view_mode, st.session_state.week_start),
+        )
 
         st.markdown("---")
 
         # Muscle Distribution section - will use its own metric selector
         if "distribution_metric" not in st.session_state:
             st.session_state.distribution_metric = "Sets"
-        muscle_df = build_muscle_distribution(df, st.session_state.view_mode, st.session_state.distribution_metric, st.session_state.week_start)
-        detail_df = build_detailed_muscle_distribution(df, st.session_state.view_mode, st.session_state.distribution_metric, st.session_state.week_start)
-        render_muscle_distribution(df, muscle_df, detail_df, st.session_state.distribution_metric, st.session_state.active_period, raw_hevy_df)
+        # 所有 metric 一次算出，雷达图 / 热力图 / tooltip 共用
+        muscle_metrics_df = build_muscle_distribution_metrics(df, st.session_state.view_mode, st.session_state.week_start)
+        detail_metrics_df = build_muscle_distribution_metrics(df, st.session_state.view_mode, st.session_state.week_start, detailed=True)
+        render_muscle_distribution(muscle_metrics_df, detail_metrics_df, st.session_state.distribution_metric, st.session_state.active_period, raw_hevy_df)
 
         st.markdown("---")
 
@@ -7376,11 +9174,15 @@ def render_data_source_panel(source_options, source_labels, source_icons, curren
                 key="data_source_csv_uploader",
                 help="Export the file from the Hevy mobile app (Settings → Export Workouts).",
             )
+            append_imports = st.session_state.get("append_imports", False)
             if uploaded_file is not None:
-                process_csv_upload(uploaded_file)
+                process_csv_upload(uploaded_file, append=append_imports)
                 st.session_state["csv_upload_pending"] = True
                 csv_uploaded = True
-            st.caption("Drop a fresh export anytime to refresh your data cache.")
+            if append_imports:
+                st.caption("Append Imports is on: new exports are merged into the loaded data.")
+            else:
+                st.caption("Drop a fresh export anytime to refresh your data cache.")
         else:
             st.markdown("**Hevy API Key**")
             api_key = st.text_input(
@@ -7413,6 +9215,13 @@ def render_data_source_panel(source_options, source_labels, source_icons, curren
                 if current_source == "Upload CSV File":
                     file_name = overview_meta.get("file_name") or "hevy_workouts.csv"
                     detail_lines.append(f"File name: `{file_name}`")
+                    if overview_meta.get("encoding"):
+                        detail_lines.append(f"File encoding: `{overview_meta['encoding']}`")
+                    if overview_meta.get("import_batches", 0) > 1:
+                        detail_lines.append(
+                            f"Merged imports: {overview_meta['import_batches']} "
+                            f"({overview_meta.get('skipped_overlapping_sets', 0):,} overlapping sets skipped)"
+                        )
                 else:
                     remember_enabled = st.session_state.get("remember_api_key", False)
                     saved_key = st.session_state.get("api_key_value", "") if remember_enabled else ""
@@ -7445,6 +9254,20 @@ def render_data_source_panel(source_options, source_labels, source_icons, curren
                             f"{label}: `{raw_col}` ({raw_unit}) → stored as {normalized_unit}"
                         )
 
+                normalization_report = overview_meta.get("normalization_report") or {}
+                report_labels = {
+                    "duration_clock_strings": "Durations read from H:M:S text",
+                    "duration_ms_to_seconds": "Durations treated as milliseconds",
+                    "duration_unparseable": "Durations that could not be read",
+                    "distance_miles_to_km": "Distances converted from miles",
+                    "distance_meters_to_km": "Distances treated as metres",
+                    "distance_unparseable": "Distances that could not be read",
+                }
+                for key_name, label in report_labels.items():
+                    count = normalization_report.get(key_name)
+                    if count:
+                        detail_lines.append(f"{label}: {count:,}")
+
                 for line in detail_lines:
                     st.markdown(f"- {line}")
 
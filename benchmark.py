@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the data pipeline in app.py.
+
+    python benchmark.py api-normalize --sets 1000000
+    python benchmark.py api-sync --workouts 2000 --latency 0.05 --workers 1 4 8
+    python benchmark.py csv-ingest --rows 3000000
+    python benchmark.py timestamps --rows 1000000
+    python benchmark.py import-merge --rows 1000000 --batches 10
+    python benchmark.py settings-stage --rows 1000000
+    python benchmark.py periods --rows 1000000
+    python benchmark.py period-summary --rows 1000000
+"""
+import argparse
+import io
+import json
+import logging
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# app.py configures Streamlit at import time; keep its bare-mode warnings quiet
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+import app  # noqa: E402
+
+
+def timed(label: str, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {elapsed:8.3f} s")
+    return result, elapsed
+
+
+# -----------------------------------
+# api-normalize: duration/distance heuristics
+# -----------------------------------
+
+def legacy_normalize_set(set_data: dict) -> tuple:
+    """The per-set duration/distance branches convert_hevy_api_to_csv_format used before."""
+    duration_val = set_data.get("duration_seconds")
+    if duration_val is None:
+        duration_val = set_data.get("duration_ms") or set_data.get("duration")
+    dur_seconds = None
+    if duration_val is not None and duration_val != "":
+        try:
+            if isinstance(duration_val, str) and ":" in duration_val:
+                parts = [int(p) for p in duration_val.split(":")]
+                if len(parts) == 3:
+                    dur_seconds = parts[0] * 3600 + parts[1] * 60 + parts[2]
+                elif len(parts) == 2:
+                    dur_seconds = parts[0] * 60 + parts[1]
+                else:
+                    dur_seconds = int(parts[0])
+            else:
+                dv = float(duration_val)
+                if dv > 100000:
+                    dur_seconds = int(dv / 1000)
+                else:
+                    dur_seconds = int(dv)
+        except Exception:
+            dur_seconds = None
+
+    distance_km = None
+    if "distance_km" in set_data:
+        try:
+            distance_km = float(set_data.get("distance_km"))
+        except Exception:
+            distance_km = None
+    else:
+        dist = set_data.get("distance") or set_data.get("distance_miles") or set_data.get("distance_m")
+        if dist is not None and dist != "":
+            try:
+                dv = float(dist)
+                if set_data.get("distance_miles") is not None or (isinstance(dist, str) and "mi" in str(dist).lower()):
+                    distance_km = dv * app.MI_TO_KM
+                elif dv > 1000:
+                    distance_km = dv / 1000.0
+                else:
+                    distance_km = dv
+            except Exception:
+                distance_km = None
+    return dur_seconds, distance_km
+
+
+def make_api_sets(count: int, seed: int = 7) -> list:
+    """Mostly strength sets (no duration/distance) plus a mix of cardio encodings."""
+    rnd = random.Random(seed)
+    sets = []
+    for _ in range(count):
+        roll = rnd.random()
+        if roll < 0.7:
+            sets.append({"weight_kg": 60.0, "reps": 8})
+        elif roll < 0.8:
+            sets.append({"duration_seconds": f"{rnd.randint(0, 1)}:{rnd.randint(0, 59):02d}:{rnd.randint(0, 59):02d}",
+                         "distance_km": round(rnd.uniform(1, 15), 2)})
+        elif roll < 0.9:
+            sets.append({"duration_ms": rnd.randint(60_000, 3_600_000), "distance_m": rnd.randint(200, 20_000)})
+        else:
+            sets.append({"duration": rnd.randint(10, 600), "distance_miles": round(rnd.uniform(0.5, 10), 2)})
+    return sets
+
+
+def bench_api_normalize(args) -> None:
+    sets = make_api_sets(args.sets)
+    print(f"api-normalize: {len(sets):,} sets")
+
+    def per_set_loop():
+        return [legacy_normalize_set(s) for s in sets]
+
+    def vectorized():
+        # what append_api_workouts collects per set, then the column stage
+        durations, distances, kinds = [], [], []
+        for s in sets:
+            value = s.get("duration_seconds")
+            if value is None:
+                value = s.get("duration_ms") or s.get("duration")
+            durations.append(value)
+            if "distance_km" in s:
+                distances.append(s.get("distance_km"))
+                kinds.append(app.DISTANCE_KIND_KM)
+            else:
+                distances.append(s.get("distance") or s.get("distance_miles") or s.get("distance_m"))
+                kinds.append(app.DISTANCE_KIND_MILES if s.get("distance_miles") is not None else app.DISTANCE_KIND_GUESS)
+        seconds, duration_report = app.normalize_api_durations(durations)
+        km, distance_report = app.normalize_api_distances(distances, kinds)
+        return seconds, km, {**duration_report, **distance_report}
+
+    legacy, legacy_time = timed("per-set loop", per_set_loop)
+    (seconds, km, report), fast_time = timed("collect + vectorized", vectorized)
+
+    legacy_seconds = np.array([np.nan if d is None else d for d, _ in legacy], dtype=float)
+    legacy_km = np.array([np.nan if k is None else k for _, k in legacy], dtype=float)
+    same = np.allclose(legacy_seconds, seconds, equal_nan=True) and np.allclose(legacy_km, km, equal_nan=True)
+    print(f"  results identical: {same}")
+    print(f"  speedup: {legacy_time / fast_time:.1f}x")
+    print(f"  report: {report}")
+
+
+# -----------------------------------
+# api-sync: full fetch against the local fake Hevy server
+# -----------------------------------
+
+def bench_api_sync(args) -> None:
+    from fake_hevy_server import FakeHevyServer
+
+    server = FakeHevyServer(
+        workouts=args.workouts,
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit=args.rate_limit,
+        error_rate=args.error_rate,
+        fixture=args.fixture,
+    )
+    app.HEVY_API_BASE_URL = server.start()
+    try:
+        expected, _ = app.convert_hevy_api_to_csv_format({"workouts": server.list_workouts()})
+        print(
+            f"api-sync: {len(server.workouts):,} workouts, latency {args.latency}s, "
+            f"rate limit {args.rate_limit or 'none'}, error rate {args.error_rate}"
+        )
+        for workers in args.workers:
+            before = dict(server.stats)
+            converted, elapsed = timed(
+                f"{workers} worker(s)",
+                app.fetch_hevy_workouts_frame,
+                "benchmark",
+                None,
+                workers,
+            )
+            result, error = converted
+            if error:
+                print(f"    failed: {error}")
+                continue
+            df, meta = result
+            stats = {key: server.stats[key] - before[key] for key in before}
+            print(
+                f"    {meta['workouts_count'] / elapsed:,.0f} workouts/s · {stats['requests']} requests, "
+                f"{stats['throttled']} throttled, {stats['errors']} errors · "
+                f"matches direct conversion: {len(df) == len(expected)}"
+            )
+    finally:
+        server.stop()
+
+
+# -----------------------------------
+# csv-ingest: schema/pyarrow loader vs the previous default-inference loader
+# -----------------------------------
+
+def make_hevy_export(path: Path, rows: int, seed: int = 7) -> None:
+    """Write a synthetic Hevy CSV export with roughly 25 sets per workout."""
+    rng = np.random.default_rng(seed)
+    workouts = max(rows // 25, 1)
+    exercises = app.load_exercises()["exercise_title"].astype(str).to_numpy()
+    titles = np.array([f"{day} {kind}" for day in ("Morning", "Evening") for kind in ("Push", "Pull", "Legs", "Upper", "Lower")])
+
+    starts = pd.Timestamp("2015-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 10 * 365 * 24 * 60, workouts)), unit="min")
+    ends = starts + pd.to_timedelta(rng.integers(40, 120, workouts), unit="min")
+    workout_of_row = np.sort(rng.integers(0, workouts, rows))
+    fmt = "%-d %b %Y, %H:%M"
+    reps = rng.integers(3, 15, rows).astype(float)
+    cardio = rng.random(rows) < 0.05
+    reps[cardio] = np.nan
+    df = pd.DataFrame({
+        "title": titles[rng.integers(0, len(titles), workouts)][workout_of_row],
+        "start_time": starts.strftime(fmt).to_numpy()[workout_of_row],
+        "end_time": ends.strftime(fmt).to_numpy()[workout_of_row],
+        "description": "",
+        "exercise_title": exercises[rng.integers(0, len(exercises), rows)],
+        "superset_id": np.where(rng.random(rows) < 0.1, "0", ""),
+        "exercise_notes": "",
+        "set_index": rng.integers(0, 5, rows),
+        "set_type": np.array(["normal", "warmup", "dropset", "failure"])[rng.choice(4, rows, p=[0.8, 0.12, 0.05, 0.03])],
+        "weight_lbs": np.where(cardio, np.nan, rng.integers(10, 400, rows)),
+        "reps": reps,
+        "distance_miles": np.where(cardio, rng.uniform(0.5, 8, rows).round(2), np.nan),
+        "duration_seconds": np.where(cardio, rng.integers(300, 3600, rows), np.nan),
+        "rpe": np.nan,
+    })
+    df.to_csv(path, index=False)
+
+
+def run_csv_ingest_worker(args) -> None:
+    """Load the export in this (fresh) process and print time and memory as JSON."""
+    start = time.perf_counter()
+    if args.worker == "old":
+        df = pd.read_csv(args.path, encoding="utf-8")
+    elif args.worker == "new":
+        # schema loader alone: declared dtypes, no per-chunk normalization
+        df, _ = app.ingest_hevy_csv(args.path, chunk_bytes=args.chunk_mb[0] * 2**20, normalize=False)
+    else:
+        # chunked ingest also parses timestamps and drops duplicate sets per chunk
+        df, _ = app.ingest_hevy_csv(args.path, chunk_bytes=args.chunk_mb[0] * 2**20)
+    parsed = time.perf_counter()
+    if args.worker != "ingest":
+        # the steps chunked ingest does per chunk (prepare_workout_df parses timestamps otherwise)
+        df, _ = app.normalize_measurement_units(df)
+        df["start_dt"] = app.parse_workout_timestamps(df["start_time"])
+        df["end_dt"] = app.parse_workout_timestamps(df["end_time"])
+    done = time.perf_counter()
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    print(json.dumps({
+        "parse": parsed - start,
+        "total": done - start,
+        "frame_bytes": int(df.memory_usage(deep=True).sum()),
+        "peak_rss": peak,
+    }))
+
+
+def bench_csv_ingest(args) -> None:
+    if args.worker:
+        run_csv_ingest_worker(args)
+        return
+
+    path = Path(args.path or Path(tempfile.gettempdir()) / f"hevy_export_{args.rows}.csv")
+    if not path.exists():
+        print(f"writing {args.rows:,}-row synthetic export to {path}")
+        make_hevy_export(path, args.rows)
+    print(f"csv-ingest: {args.rows:,} rows, {path.stat().st_size / 1e6:,.0f} MB, pyarrow: {app.PYARROW_READY}")
+
+    runs = [("default inference (before)", "old", None), ("schema loader", "new", args.chunk_mb[0])]
+    runs += [(f"chunked ingest, {mb} MB chunks", "ingest", mb) for mb in args.chunk_mb]
+    for label, worker, chunk_mb in runs:
+        # Separate processes so peak RSS of one loader doesn't hide the other's
+        command = [sys.executable, "-W", "ignore", __file__, "csv-ingest", "--worker", worker, "--path", str(path)]
+        if chunk_mb:
+            command += ["--chunk-mb", str(chunk_mb)]
+        output = subprocess.run(
+            command,
+            check=True, capture_output=True, text=True,
+        ).stdout
+        stats = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"  {label:<30} parse {stats['parse']:6.2f} s · +normalize/timestamps {stats['total']:6.2f} s · "
+            f"frame {stats['frame_bytes'] / 2**20:7.0f} MiB · peak RSS {stats['peak_rss'] / 2**20:7.0f} MiB"
+        )
+
+
+# -----------------------------------
+# timestamps: start/end time parsing
+# -----------------------------------
+
+def legacy_parse_timestamps(values: pd.Series) -> pd.Series:
+    """The two-pass parser prepare_workout_df used before: ISO8601 on every row, then day-first inference."""
+    parsed = pd.to_datetime(values, format="ISO8601", errors="coerce")
+    missing = parsed.isna() & values.notna()
+    if missing.any():
+        parsed.loc[missing] = pd.to_datetime(values[missing], errors="coerce", dayfirst=True)
+    return parsed
+
+
+def bench_timestamps(args) -> None:
+    rng = np.random.default_rng(7)
+    workouts = max(args.rows // 25, 1)
+    # Export rows repeat their workout's start time; January first so the legacy inference guesses %b
+    starts = pd.Timestamp("2015-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 10 * 365 * 24 * 60, workouts)), unit="min")
+    workout_of_row = np.sort(rng.integers(0, workouts, args.rows))
+    columns = {
+        "CSV export": pd.Series(starts.strftime("%-d %b %Y, %H:%M").to_numpy()[workout_of_row], dtype=str),
+        "API (ISO8601)": pd.Series(starts.strftime("%Y-%m-%dT%H:%M:%S+00:00").to_numpy()[workout_of_row], dtype=str),
+    }
+    print(f"timestamps: {args.rows:,} rows, {workouts:,} distinct start times")
+    for label, values in columns.items():
+        print(f" {label}")
+        legacy, legacy_time = timed("two-pass per row", legacy_parse_timestamps, values)
+        fast, fast_time = timed("unique values, one format", app.parse_workout_timestamps, values)
+        same = legacy.astype("datetime64[ns, UTC]" if legacy.dt.tz else "datetime64[ns]").equals(
+            fast.astype("datetime64[ns, UTC]" if fast.dt.tz else "datetime64[ns]")
+        )
+        print(f"  results identical: {same}")
+        print(f"  speedup: {legacy_time / fast_time:.1f}x")
+
+
+# -----------------------------------
+# import-merge: appending overlapping exports onto a growing history
+# -----------------------------------
+
+def bench_import_merge(args) -> None:
+    path = Path(tempfile.gettempdir()) / f"hevy_export_{args.rows}.csv"
+    if not path.exists():
+        make_hevy_export(path, args.rows)
+    full, _ = app.ingest_hevy_csv(path)
+    # Consecutive exports that each repeat the tail of the previous one
+    step = len(full) // args.batches
+    overlap = int(step * args.overlap)
+    batches = [full.iloc[max(i * step - overlap, 0) : (i + 1) * step] for i in range(args.batches)]
+    print(f"import-merge: {len(full):,} sets in {args.batches} batches, {overlap:,} overlapping sets each")
+
+    key_columns = ["start_dt", "exercise_title", "set_index"]
+
+    def rebuild():
+        # What replacing the dataset with a de-duplicated concat of everything costs per import
+        merged, times = None, []
+        for batch in batches:
+            start = time.perf_counter()
+            merged = batch if merged is None else pd.concat([merged, batch], ignore_index=True)
+            merged = merged.drop_duplicates(key_columns, ignore_index=True)
+            times.append(time.perf_counter() - start)
+        return merged, times
+
+    def incremental():
+        merged, seen_keys, times = None, None, []
+        for batch in batches:
+            start = time.perf_counter()
+            merged, _, seen_keys, _ = app.merge_import_batch(merged, batch, seen_keys)
+            times.append(time.perf_counter() - start)
+        return merged, times
+
+    for label, func in (("concat + drop_duplicates", rebuild), ("hashed append", incremental)):
+        merged, times = func()
+        print(
+            f"  {label:<28} total {sum(times):6.2f} s · first import {times[0]:5.2f} s · "
+            f"last import {times[-1]:5.2f} s · {len(merged):,} sets"
+        )
+
+
+# -----------------------------------
+# settings-stage: recomputing metrics after a calculation setting changes
+# -----------------------------------
+
+def bench_settings_stage(args) -> None:
+    path = Path(tempfile.gettempdir()) / f"hevy_export_{args.rows}.csv"
+    if not path.exists():
+        make_hevy_export(path, args.rows)
+    raw, _ = app.ingest_hevy_csv(path)
+    exercises = app.load_exercises()
+    print(f"settings-stage: {len(raw):,} sets")
+
+    prepared, _ = timed("prepare_workout_df", app.prepare_workout_df, raw, exercises)
+    base, _ = timed("add_metric_inputs", app.add_metric_inputs, prepared)
+    _, full_time = timed("full add_effective_metrics", app.add_effective_metrics, prepared)
+    # What a Settings toggle costs now: only the settings stage runs on the cached base frame
+    settings_times = []
+    for include_warmups, drop_set_factor, include_bodyweight in ((True, 0.5, True), (False, 0.3, True), (False, 0.3, False)):
+        start = time.perf_counter()
+        app.apply_calculation_settings(base, include_warmups, drop_set_factor, include_bodyweight)
+        settings_times.append(time.perf_counter() - start)
+    print(f"  {'settings stage (per change)':<28} {np.median(settings_times) * 1000:8.1f} ms")
+
+
+# -----------------------------------
+# periods: week/month bucketing of every set
+# -----------------------------------
+
+def legacy_period_starts(dates: pd.Series, anchor: str) -> pd.Series:
+    """What add_period_columns and each aggregation did before: to_period, then start_time.date() per row."""
+    return pd.to_datetime(dates, errors="coerce").dt.to_period(anchor).apply(
+        lambda r: r.start_time.date() if pd.notna(r) else None
+    )
+
+
+def bench_periods(args) -> None:
+    rng = np.random.default_rng(7)
+    starts = pd.Timestamp("2015-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 10 * 365 * 24 * 60, args.rows)), unit="min")
+    frame = pd.DataFrame({"start_dt": starts})
+    frame["date"] = frame["start_dt"].dt.date
+    print(f"periods: {args.rows:,} sets")
+
+    def legacy():
+        # Home ran one bucketing for the periods stage plus one more per aggregation in Week mode
+        columns = {anchor: legacy_period_starts(frame["date"], anchor) for anchor in ("W-SUN", "W-SAT", "M")}
+        for _ in range(3):
+            legacy_period_starts(frame["date"], "W-SUN")
+        return columns
+
+    columns, legacy_time = timed("per-row to_period (x6)", legacy)
+    index, index_time = timed("add_period_index", app.add_period_index, frame)
+    same = all(
+        index[column].tolist() == columns[anchor].tolist()
+        for column, anchor in (("week_period_monday", "W-SUN"), ("week_period_sunday", "W-SAT"), ("month_period", "M"))
+    )
+    print(f"  results identical: {same}")
+    print(f"  speedup: {legacy_time / index_time:.1f}x")
+
+
+# -----------------------------------
+# period-summary: Home chart totals per week/month
+# -----------------------------------
+
+def legacy_period_totals(df: pd.DataFrame, period_col: str) -> pd.DataFrame:
+    """The groupby build_period_summary ran on every view mode / week_start change before the cube."""
+    durations = df.groupby(["workout_id", period_col])["workout_duration_min"].first().groupby(level=period_col).sum()
+    agg = df.groupby(period_col).agg(
+        workouts=("workout_id", "nunique"),
+        volume=("metric_set_volume", "sum"),
+        sets=("metric_set_factor", "sum"),
+    )
+    agg["duration_hours"] = (durations / 60.0).reindex(agg.index).fillna(0)
+    return agg
+
+
+def bench_period_summary(args) -> None:
+    path = Path(tempfile.gettempdir()) / f"hevy_export_{args.rows}.csv"
+    if not path.exists():
+        make_hevy_export(path, args.rows)
+    raw, _ = app.ingest_hevy_csv(path)
+    df = app.add_period_columns(app.add_effective_metrics(app.prepare_workout_df(raw, app.load_exercises())), "Monday")
+    print(f"period-summary: {len(df):,} sets")
+
+    views = [("Week", "Monday"), ("Week", "Sunday"), ("Month", "Monday")]
+
+    def legacy():
+        return [legacy_period_totals(df, app.get_period_column(view, week_start)) for view, week_start in views]
+
+    legacy_tables, legacy_time = timed("groupby per view (x3)", legacy)
+    cube, cube_time = timed("build_period_cube", app.build_period_cube, df)
+    summaries, slice_time = timed(
+        "cube slices (x3)",
+        lambda: [app.build_period_summary(df, view, week_start, cube=cube) for view, week_start in views],
+    )
+    same = all(
+        np.allclose(
+            table.reindex(summary["period_start"]).fillna(0)[app.PERIOD_CUBE_METRICS].to_numpy(dtype=float),
+            summary[app.PERIOD_CUBE_METRICS].to_numpy(dtype=float),
+        )
+        for table, summary in zip(legacy_tables, summaries)
+    )
+    print(f"  results identical: {same}")
+    print(f"  per view change: {legacy_time / len(views) * 1000:.1f} ms -> {slice_time / len(views) * 1000:.1f} ms")
+
+    # Longer windows: only the visible rows are sliced, totals come from the prefix sums
+    for window in ("Year", "All Time"):
+        summary, window_time = timed(
+            f"{window} window (Week)", app.build_period_summary, df, "Week", "Monday", cube, window
+        )
+        first, last = summary["period_start"].iloc[0], summary["period_start"].iloc[-1]
+        totals, totals_time = timed(
+            f"{window} totals", app.get_period_window_totals, cube, "week_period_monday", first, last
+        )
+        same = np.allclose([totals[metric] for metric in app.PERIOD_CUBE_METRICS], summary[app.PERIOD_CUBE_METRICS].sum())
+        print(f"  {len(summary)} weeks, totals match the visible rows: {same}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Hevy Analyzer data pipeline stages.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    api_normalize = subparsers.add_parser("api-normalize", help="duration/distance normalization of API sets")
+    api_normalize.add_argument("--sets", type=int, default=1_000_000)
+    api_normalize.set_defaults(func=bench_api_normalize)
+
+    api_sync = subparsers.add_parser("api-sync", help="full API fetch against fake_hevy_server.py")
+    api_sync.add_argument("--workouts", type=int, default=2000)
+    api_sync.add_argument("--latency", type=float, default=0.05)
+    api_sync.add_argument("--jitter", type=float, default=0.0)
+    api_sync.add_argument("--rate-limit", type=float, default=None)
+    api_sync.add_argument("--error-rate", type=float, default=0.0)
+    api_sync.add_argument("--fixture", help="replay a recorded fixture instead of generated workouts")
+    api_sync.add_argument("--workers", type=int, nargs="+", default=[1, app.HEVY_API_MAX_CONCURRENCY])
+    api_sync.set_defaults(func=bench_api_sync)
+
+    csv_ingest = subparsers.add_parser("csv-ingest", help="CSV upload loader on a synthetic Hevy export")
+    csv_ingest.add_argument("--rows", type=int, default=3_000_000)
+    csv_ingest.add_argument("--path", help="existing export to load instead of a generated one")
+    csv_ingest.add_argument("--chunk-mb", type=int, nargs="+", default=[16, 64])
+    csv_ingest.add_argument("--worker", choices=["old", "new", "ingest"], help=argparse.SUPPRESS)
+    csv_ingest.set_defaults(func=bench_csv_ingest)
+
+    timestamps = subparsers.add_parser("timestamps", help="start/end time parsing of CSV and API rows")
+    timestamps.add_argument("--rows", type=int, default=1_000_000)
+    timestamps.set_defaults(func=bench_timestamps)
+
+    import_merge = subparsers.add_parser("import-merge", help="appending overlapping exports onto a growing history")
+    import_merge.add_argument("--rows", type=int, default=1_000_000)
+    import_merge.add_argument("--batches", type=int, default=10)
+    import_merge.add_argument("--overlap", type=float, default=0.2, help="share of each batch repeated from the previous one")
+    import_merge.set_defaults(func=bench_import_merge)
+
+    settings_stage = subparsers.add_parser("settings-stage", help="metric recompute after a calculation setting changes")
+    settings_stage.add_argument("--rows", type=int, default=1_000_000)
+    settings_stage.set_defaults(func=bench_settings_stage)
+
+    periods = subparsers.add_parser("periods", help="week/month bucketing of every set")
+    periods.add_argument("--rows", type=int, default=1_000_000)
+    periods.set_defaults(func=bench_periods)
+
+    period_summary = subparsers.add_parser("period-summary", help="Home chart totals per week/month and window")
+    period_summary.add_argument("--rows", type=int, default=1_000_000)
+    period_summary.set_defaults(func=bench_period_summary)
+
+    args = parser.parse_args()
+    args.func(args)
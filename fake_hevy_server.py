@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Hevy public API (/v1/workouts endpoints).
+
+Lets the API sync in app.py be exercised without a real API key or network access:
+
+    python fake_hevy_server.py --port 8765 --workouts 500
+    HEVY_API_BASE_URL=http://127.0.0.1:8765 streamlit run app.py
+
+Any non-empty api-key header is accepted. For load testing the server can add
+latency, enforce a rate limit (429 + Retry-After) and inject 503 errors:
+
+    python fake_hevy_server.py --workouts 5000 --latency 0.05 --rate-limit 20 --error-rate 0.02
+
+Real payloads can be recorded once and replayed offline afterwards:
+
+    python fake_hevy_server.py --record fixture.json --source-url https://api.hevyapp.com --api-key KEY
+    python fake_hevy_server.py --fixture fixture.json
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+from urllib.request import Request, urlopen
+
+from generate_sample_data import EXERCISES_BY_MUSCLE
+
+MAX_PAGE_SIZE = 10  # same limit as the real API
+FIXTURE_VERSION = 1
+
+
+def format_timestamp(value: datetime) -> str:
+    """Format a UTC datetime the way the Hevy API does (ISO 8601, Z suffix)."""
+    return value.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def parse_timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class FakeHevyServer:
+    """In-memory Hevy workout store served over HTTP from a background thread.
+
+    latency (+ a random 0..jitter) seconds is added to every response.
+    rate_limit caps requests per second (token bucket, burst of the same size);
+    requests over it get 429 with a Retry-After header. error_rate is the
+    chance that a request fails with 503. With fixture set, the workouts and
+    deletions are loaded from a file written by save_fixture/record_fixture
+    instead of being generated.
+    """
+
+    def __init__(self, workouts: int = 200, host: str = "127.0.0.1", port: int = 0, seed: int = 42,
+                 latency: float = 0.0, jitter: float = 0.0, rate_limit: float = None,
+                 error_rate: float = 0.0, fixture: str = None):
+        self.host = host
+        self.port = port
+        self.random = random.Random(seed)
+        self.fault_random = random.Random(seed + 1)  # kept apart so faults don't change the data
+        self.lock = threading.Lock()
+        self.workouts = {}
+        self.deleted = {}  # workout id -> deleted_at
+        self.httpd = None
+        self.thread = None
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.tokens = rate_limit or 0.0
+        self.tokens_updated = time.monotonic()
+        self.stats = {"requests": 0, "throttled": 0, "errors": 0}
+
+        if fixture is not None:
+            self.load_fixture(fixture)
+            return
+
+        start = datetime.now(timezone.utc) - timedelta(days=max(workouts, 1) * 2)
+        for idx in range(workouts):
+            start_time = start + timedelta(days=idx * 2, hours=self.random.randint(6, 18))
+            self.add_workout(self.generate_workout(start_time), updated_at=start_time + timedelta(hours=2))
+
+    # ---------- data ----------
+
+    def generate_workout(self, start_time: datetime) -> dict:
+        """Build a workout payload shaped like GET /v1/workouts items."""
+        muscle_group = self.random.choice(list(EXERCISES_BY_MUSCLE.keys()))
+        titles = self.random.sample(EXERCISES_BY_MUSCLE[muscle_group], self.random.randint(2, 4))
+        end_time = start_time + timedelta(minutes=self.random.randint(45, 120))
+        exercises = []
+        for ex_idx, title in enumerate(titles):
+            sets = []
+            for set_idx in range(self.random.randint(2, 4)):
+                sets.append({
+                    "index": set_idx,
+                    "type": "warmup" if set_idx == 0 and ex_idx == 0 else "normal",
+                    "weight_kg": float(self.random.randint(20, 120)),
+                    "reps": self.random.randint(5, 15),
+                    "distance_meters": None,
+                    "duration_seconds": None,
+                    "rpe": None,
+                    "custom_metric": None,
+                })
+            exercises.append({
+                "index": ex_idx,
+                "title": title,
+                "notes": "",
+                "exercise_template_id": uuid.uuid5(uuid.NAMESPACE_URL, title).hex[:8].upper(),
+                "superset_id": None,
+                "sets": sets,
+            })
+        return {
+            "id": str(uuid.UUID(int=self.random.getrandbits(128))),
+            "title": f"{muscle_group} Day",
+            "description": "",
+            "start_time": format_timestamp(start_time),
+            "end_time": format_timestamp(end_time),
+            "created_at": format_timestamp(end_time),
+            "exercises": exercises,
+        }
+
+    def add_workout(self, workout: dict = None, updated_at: datetime = None) -> dict:
+        """Insert a workout (generated if omitted) and return it."""
+        if workout is None:
+            workout = self.generate_workout(datetime.now(timezone.utc) - timedelta(hours=2))
+        workout = dict(workout)
+        workout["updated_at"] = format_timestamp(updated_at or datetime.now(timezone.utc))
+        with self.lock:
+            self.workouts[workout["id"]] = workout
+            self.deleted.pop(workout["id"], None)
+        return workout
+
+    def update_workout(self, workout_id: str, **changes) -> dict:
+        """Apply field changes to an existing workout and bump its updated_at."""
+        with self.lock:
+            workout = dict(self.workouts[workout_id])
+            workout.update(changes)
+            workout["updated_at"] = format_timestamp(datetime.now(timezone.utc))
+            self.workouts[workout_id] = workout
+        return workout
+
+    def delete_workout(self, workout_id: str) -> None:
+        with self.lock:
+            self.workouts.pop(workout_id)
+            self.deleted[workout_id] = format_timestamp(datetime.now(timezone.utc))
+
+    def list_workouts(self) -> list:
+        with self.lock:
+            workouts = list(self.workouts.values())
+        return sorted(workouts, key=lambda w: w["start_time"], reverse=True)
+
+    def list_events(self, since: datetime) -> list:
+        """Latest event per workout newer than `since`, newest first."""
+        with self.lock:
+            events = [
+                (parse_timestamp(w["updated_at"]), {"type": "updated", "workout": w})
+                for w in self.workouts.values()
+            ]
+            events += [
+                (parse_timestamp(deleted_at), {"type": "deleted", "id": workout_id, "deleted_at": deleted_at})
+                for workout_id, deleted_at in self.deleted.items()
+            ]
+        events = [item for item in events if item[0] > since]
+        events.sort(key=lambda item: item[0], reverse=True)
+        return [event for _, event in events]
+
+    # ---------- fixtures ----------
+
+    def save_fixture(self, path: str) -> None:
+        """Write the current workouts and deletions to a JSON fixture."""
+        with self.lock:
+            payload = {
+                "version": FIXTURE_VERSION,
+                "workouts": list(self.workouts.values()),
+                "deleted": dict(self.deleted),
+            }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+
+    def load_fixture(self, path: str) -> None:
+        """Replace the data with a fixture written by save_fixture or record_fixture."""
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        if payload.get("version") != FIXTURE_VERSION:
+            raise ValueError(f"Unsupported fixture version: {payload.get('version')}")
+        with self.lock:
+            self.workouts = {}
+            for workout in payload.get("workouts", []):
+                workout = dict(workout)
+                # Recorded workouts always have updated_at; keep hand-written fixtures usable too
+                workout.setdefault("updated_at", workout.get("created_at") or workout.get("start_time"))
+                self.workouts[workout["id"]] = workout
+            self.deleted = dict(payload.get("deleted", {}))
+
+    # ---------- faults ----------
+
+    def take_token(self) -> float:
+        """Consume one request token; return 0 if allowed, else seconds until one is available."""
+        if not self.rate_limit:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate_limit, self.tokens + (now - self.tokens_updated) * self.rate_limit)
+            self.tokens_updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate_limit
+
+    def next_fault(self) -> tuple[int, dict]:
+        """Decide how the next request fails: (0, {}) when it should be served normally."""
+        with self.lock:
+            self.stats["requests"] += 1
+            delay = self.latency + (self.fault_random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self.error_rate and self.fault_random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        wait = self.take_token()
+        if wait:
+            with self.lock:
+                self.stats["throttled"] += 1
+            return 429, {"Retry-After": f"{wait:.3f}"}
+        if fail:
+            with self.lock:
+                self.stats["errors"] += 1
+            return 503, {}
+        return 0, {}
+
+    # ---------- http ----------
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        """Start serving in a daemon thread and return the base URL."""
+        self.httpd = ThreadingHTTPServer((self.host, self.port), FakeHevyRequestHandler)
+        self.httpd.fake = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def paginate(items: list, query: dict) -> tuple[int, int, list]:
+    """Return (page, page_count, items) using the API's 1-based paging."""
+    try:
+        page = max(int(query.get("page", ["1"])[0]), 1)
+        page_size = min(max(int(query.get("pageSize", ["5"])[0]), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        page, page_size = 1, 5
+    page_count = max((len(items) + page_size - 1) // page_size, 1)
+    start = (page - 1) * page_size
+    return page, page_count, items[start : start + page_size]
+
+
+class FakeHevyRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out in separate writes on keep-alive connections
+
+    def log_message(self, format, *args):  # noqa: A002 - keep test output quiet
+        pass
+
+    def send_json(self, status: int, payload: dict, headers: dict = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # noqa: N802 - http.server naming
+        fake = self.server.fake
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+
+        if not self.headers.get("api-key"):
+            self.send_json(401, {"error": "Unauthorized"})
+            return
+
+        status, headers = fake.next_fault()
+        if status == 429:
+            self.send_json(429, {"error": "Too many requests"}, headers)
+            return
+        if status:
+            self.send_json(status, {"error": "Injected failure"}, headers)
+            return
+
+        if parsed.path == "/v1/workouts":
+            page, page_count, workouts = paginate(fake.list_workouts(), query)
+            self.send_json(200, {"page": page, "page_count": page_count, "workouts": workouts})
+        elif parsed.path == "/v1/workouts/count":
+            self.send_json(200, {"workout_count": len(fake.list_workouts())})
+        elif parsed.path == "/v1/workouts/events":
+            since_raw = query.get("since", ["1970-01-01T00:00:00Z"])[0]
+            try:
+                since = parse_timestamp(since_raw)
+            except ValueError:
+                self.send_json(400, {"error": f"Invalid since: {since_raw}"})
+                return
+            page, page_count, events = paginate(fake.list_events(since), query)
+            self.send_json(200, {"page": page, "page_count": page_count, "events": events})
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+
+def record_fixture(path: str, base_url: str, api_key: str) -> int:
+    """Download every workout from a Hevy-compatible API into a fixture file.
+
+    Returns the number of workouts recorded. Replay it with FakeHevyServer(fixture=path).
+    """
+    workouts = []
+    page = 1
+    while True:
+        query = urlencode({"page": page, "pageSize": MAX_PAGE_SIZE})
+        request = Request(
+            f"{base_url.rstrip('/')}/v1/workouts?{query}",
+            headers={"api-key": api_key, "accept": "application/json"},
+        )
+        with urlopen(request, timeout=30) as response:
+            data = json.load(response)
+        workouts.extend(data.get("workouts", []))
+        if page >= int(data.get("page_count") or page):
+            break
+        page += 1
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"version": FIXTURE_VERSION, "workouts": workouts, "deleted": {}}, f)
+    return len(workouts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fake Hevy API data locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workouts", type=int, default=200, help="Number of workouts to generate")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency, 0..N seconds")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Requests per second before 429s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Chance (0-1) of a 503 response")
+    parser.add_argument("--fixture", help="Serve workouts from a recorded fixture instead of generating them")
+    parser.add_argument("--save-fixture", help="Write the served workouts to this fixture file and keep serving")
+    parser.add_argument("--record", help="Record workouts from --source-url into this fixture file and exit")
+    parser.add_argument("--source-url", default="https://api.hevyapp.com")
+    parser.add_argument("--api-key", help="API key used with --record")
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.api_key:
+            parser.error("--record needs --api-key")
+        count = record_fixture(args.record, args.source_url, args.api_key)
+        print(f"Recorded {count} workouts to {args.record}")
+        raise SystemExit(0)
+
+    server = FakeHevyServer(
+        workouts=args.workouts,
+        host=args.host,
+        port=args.port,
+        seed=args.seed,
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit=args.rate_limit,
+        error_rate=args.error_rate,
+        fixture=args.fixture,
+    )
+    if args.save_fixture:
+        server.save_fixture(args.save_fixture)
+    url = server.start()
+    print(f"Fake Hevy API serving {len(server.workouts)} workouts at {url}")
+    print(f"Run the app with: HEVY_API_BASE_URL={url} streamlit run app.py")
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
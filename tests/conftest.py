@@ -0,0 +1,8 @@
+import logging
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# app.py configures Streamlit at import time; keep its bare-mode warnings quiet
+logging.getLogger("streamlit").setLevel(logging.ERROR)
@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+import app
+from fake_hevy_server import FakeHevyServer
+
+API_KEY = "test-key"
+
+
+@pytest.fixture
+def server(monkeypatch):
+    with FakeHevyServer(workouts=45) as fake:
+        monkeypatch.setattr(app, "HEVY_API_BASE_URL", fake.base_url)
+        monkeypatch.setattr(app, "HEVY_API_RETRY_BASE_DELAY", 0.0)
+        yield fake
+
+
+def full_conversion(server: FakeHevyServer) -> pd.DataFrame:
+    df, _ = app.convert_hevy_api_to_csv_format({"workouts": server.list_workouts()})
+    df, _ = app.normalize_measurement_units(df)
+    return df
+
+
+def canonical(df: pd.DataFrame) -> pd.DataFrame:
+    """Row order differs between a merge and a full fetch; compare sorted plain values."""
+    df = df.astype({column: object for column in df.columns})
+    return df.sort_values(["workout_uuid", "exercise_title", "set_index", "set_type"]).reset_index(drop=True)
+
+
+def test_incremental_sync_matches_full_conversion(server):
+    first = app.run_api_fetch(API_KEY, None, None, {})
+    assert first["ok"] and first["changes"] is None
+    pd.testing.assert_frame_equal(canonical(first["df"]), canonical(full_conversion(server)))
+
+    ids = [workout["id"] for workout in server.list_workouts()]
+    server.update_workout(ids[0], title="Renamed Day")
+    server.update_workout(ids[5], exercises=server.workouts[ids[5]]["exercises"][:1])
+    server.delete_workout(ids[10])
+    server.delete_workout(ids[-1])
+    added = server.add_workout()
+
+    synced = app.run_api_fetch(API_KEY, first["df"], first["meta"], {})
+    assert synced["ok"]
+    updated_ids, touched_ids = synced["changes"]
+    assert updated_ids == {ids[0], ids[5], added["id"]}
+    assert touched_ids == updated_ids | {ids[10], ids[-1]}
+    assert synced["meta"]["deleted_workouts"] == 2
+    pd.testing.assert_frame_equal(canonical(synced["df"]), canonical(full_conversion(server)))
+
+    again = app.run_api_fetch(API_KEY, synced["df"], synced["meta"], {})
+    assert again["ok"]
+    assert again["message"] == "Hevy data is already up to date"
+    assert again["changes"] == (set(), set())
+    pd.testing.assert_frame_equal(canonical(again["df"]), canonical(synced["df"]))
+
+
+def test_full_fetch_resumes_from_checkpoint_after_server_errors(server, monkeypatch):
+    monkeypatch.setattr(app, "HEVY_API_MAX_RETRIES", 0)
+    serve = server.next_fault
+    failing = {3, 4}  # request numbers answered with 503
+
+    def next_fault():
+        status, headers = serve()
+        return (503, {}) if server.stats["requests"] in failing else (status, headers)
+
+    monkeypatch.setattr(server, "next_fault", next_fault)
+    checkpoint = {}
+
+    failed = app.run_api_fetch(API_KEY, None, None, checkpoint)
+    assert not failed["ok"] and "503" in failed["message"]
+    kept_pages = checkpoint["delivered"] + len(checkpoint["pages"])
+    assert kept_pages >= 1
+
+    requests_before = server.stats["requests"]
+    resumed = app.run_api_fetch(API_KEY, None, None, checkpoint)
+    assert resumed["ok"]
+    page_count = -(-len(server.workouts) // app.HEVY_API_PAGE_SIZE)
+    # Page 1 is always re-read to check the paging; saved pages are not downloaded again
+    assert server.stats["requests"] - requests_before == page_count - kept_pages + 1
+    pd.testing.assert_frame_equal(canonical(resumed["df"]), canonical(full_conversion(server)))
@@ -0,0 +1,81 @@
+import io
+
+import pytest
+
+import app
+
+HEADER = "title,start_time,end_time,description,exercise_title,superset_id,exercise_notes,set_index,set_type,weight_kg,reps\n"
+
+
+def make_export(titles, workout_title="Push Day", padding_rows=0):
+    rows = [f'Warm Up,"1 Dec 2025, 08:00","1 Dec 2025, 09:00",,Plank,,,{i},normal,0,1\n' for i in range(padding_rows)]
+    rows += [
+        f'{workout_title},"2 Dec 2025, 12:05","2 Dec 2025, 13:29",,{title},,,{i},normal,60,8\n'
+        for i, title in enumerate(titles)
+    ]
+    return HEADER + "".join(rows)
+
+
+@pytest.mark.parametrize("padding_rows", [0, 2000])
+def test_cp1252_export_is_not_read_as_gbk(padding_rows):
+    # 2000 padding rows push the accented titles past the detection sample
+    titles = ["Crème Press", "Übung Bankdrücken"]
+    data = make_export(titles, padding_rows=padding_rows).encode("cp1252")
+
+    df, info = app.ingest_hevy_csv(io.BytesIO(data))
+
+    assert info["encoding"] in ("cp1252", "latin-1")
+    assert set(titles) <= set(df["exercise_title"].astype(str))
+
+
+@pytest.mark.parametrize("padding_rows", [0, 2000])
+def test_gbk_export_is_read_as_gbk(padding_rows):
+    titles = ["卧推", "深蹲", "哑铃飞鸟"]
+    data = make_export(titles, workout_title="胸部训练", padding_rows=padding_rows).encode("gbk")
+
+    df, info = app.ingest_hevy_csv(io.BytesIO(data))
+
+    assert info["encoding"] == "gbk"
+    assert set(titles) <= set(df["exercise_title"].astype(str))
+    assert "胸部训练" in set(df["title"].astype(str))
+
+
+def test_gb2312_characters_count():
+    assert app.count_gb2312_characters("Cr鑝e Press") == (1, 0)
+    assert app.count_gb2312_characters("卧推 Bench") == (2, 2)
+
+
+class CountingBytesIO(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        block = super().read(size)
+        self.bytes_read += len(block)
+        return block
+
+
+def test_utf8_export_is_read_once():
+    data = make_export(["Crème Press", "卧推"], padding_rows=2000).encode("utf-8")
+    stream = CountingBytesIO(data)
+
+    df, info = app.ingest_hevy_csv(stream)
+
+    assert info["encoding"] == "utf-8"
+    assert "Crème Press" in set(df["exercise_title"].astype(str))
+    # The detection sample plus one parse, no separate validation pass
+    assert stream.bytes_read <= len(data) + 2 * app.CSV_ENCODING_SAMPLE_BYTES
+
+
+@pytest.mark.parametrize("pyarrow_ready", [True, False])
+def test_decode_error_past_sample_falls_back(monkeypatch, pyarrow_ready):
+    monkeypatch.setattr(app, "PYARROW_READY", pyarrow_ready and app.PYARROW_READY)
+    titles = ["Crème Press"]
+    data = make_export(titles, padding_rows=2000).encode("cp1252")
+
+    df, info = app.ingest_hevy_csv(io.BytesIO(data), chunk_bytes=32 * 1024)
+
+    assert info["encoding"] in ("cp1252", "latin-1")
+    assert set(titles) <= set(df["exercise_title"].astype(str))
+    assert len(df) == 2001
@@ -0,0 +1,45 @@
+import io
+
+import pytest
+
+import app
+
+HEADER = "title,start_time,end_time,exercise_title,set_index,set_type,weight_kg,reps,distance_km,range_of_motion_in\n"
+
+
+def make_export(rows: int, distance_rows: int) -> bytes:
+    lines = []
+    for i in range(rows):
+        distance, rom = ("1.5", "12") if i < distance_rows else ("", "")
+        day = 1 + i // 50
+        lines.append(f'Run,"{day} Dec 2025, 08:00","{day} Dec 2025, 09:00",Running,{i % 50},normal,0,1,{distance},{rom}\n')
+    return (HEADER + "".join(lines)).encode("utf-8")
+
+
+@pytest.mark.parametrize("pyarrow_ready", [True, False])
+def test_units_from_first_chunk_survive_later_chunks(monkeypatch, pyarrow_ready):
+    monkeypatch.setattr(app, "PYARROW_READY", pyarrow_ready and app.PYARROW_READY)
+    data = make_export(rows=1500, distance_rows=10)
+    chunks = []
+
+    df, info = app.ingest_hevy_csv(io.BytesIO(data), progress_hook=lambda done, total: chunks.append(done),
+                                   chunk_bytes=16 * 1024)
+
+    assert len(chunks) > 1
+    assert len(df) == 1500
+    units = info["measurement_info"]
+    assert units["distance"]["raw_column"] == "distance_km"
+    assert units["range_of_motion"]["raw_unit"] == "in"
+    assert units["weight"]["raw_column"] == "weight_kg"
+    assert df["distance_km"].notna().sum() == 10
+    assert df["range_of_motion_cm"].iloc[0] == pytest.approx(12 * app.IN_TO_CM)
+
+
+def test_merge_measurement_info_keeps_first_detected_unit():
+    merged = {}
+    app.merge_measurement_info(merged, {"distance": {"raw_column": "distance_km", "raw_unit": "km"}})
+    app.merge_measurement_info(merged, {"distance": {"raw_column": None, "raw_unit": None},
+                                        "weight": {"raw_column": "weight_kg", "raw_unit": "kg"}})
+
+    assert merged["distance"]["raw_unit"] == "km"
+    assert merged["weight"]["raw_column"] == "weight_kg"
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+EXERCISE_TYPES = [
+    "Assisted Bodyweight", "assisted bodyweight", "  ASSISTED BODYWEIGHT ", "Assisted  Bodyweight",
+    "Weighted Bodyweight", "WEIGHTED bodyweight", " weighted bodyweight\t", "Weighted Assisted Bodyweight",
+    "Bodyweight Reps", "Weight & Reps", "Weighted", "Assisted", "Duration", "", None, np.nan,
+]
+BODY_WEIGHTS = [80.0, 62.5, 0.0, -5.0, np.nan, None, "72.5", "n/a"]
+WEIGHTS = [0.0, 20.0, 37.5, -10.0, 100.0, np.nan]
+SET_TYPES = ["normal", "warmup", "dropset", "failure", None]
+
+
+def calculate_adjusted_weight(row):
+    """The row-wise implementation add_metric_inputs replaced (include_bodyweight on)."""
+    weight = row["weight"]
+    exercise_type = str(row.get("exercise_type", "")).lower()
+    body_weight = row.get("body_weight")
+
+    is_assisted_bw = "assisted" in exercise_type and "bodyweight" in exercise_type
+    is_weighted_bw = "weighted" in exercise_type and "bodyweight" in exercise_type
+
+    if is_assisted_bw and body_weight is not None:
+        try:
+            return float(body_weight) - weight
+        except (ValueError, TypeError):
+            return weight
+    elif is_weighted_bw and body_weight is not None:
+        try:
+            return float(body_weight) + weight
+        except (ValueError, TypeError):
+            return weight
+    else:
+        return weight
+
+
+def random_sets(rng: np.random.Generator, rows: int) -> pd.DataFrame:
+    def pick(values):
+        return pd.Series([values[i] for i in rng.integers(len(values), size=rows)], dtype=object)
+
+    return pd.DataFrame({
+        "exercise_type": pick(EXERCISE_TYPES),
+        "body_weight": pick(BODY_WEIGHTS),
+        "weight": pick(WEIGHTS).astype(float),
+        "reps": rng.integers(0, 15, size=rows).astype(float),
+        "set_type": pick(SET_TYPES),
+    })
+
+
+def reference_adjusted_weight(df: pd.DataFrame) -> pd.Series:
+    # The old code ran after the same exercise_type / body_weight cleanup as add_metric_inputs
+    df = df.copy()
+    df["exercise_type"] = df["exercise_type"].fillna("")
+    df["body_weight"] = pd.to_numeric(df["body_weight"], errors="coerce")
+    return df.apply(calculate_adjusted_weight, axis=1).astype(float)
+
+
+@pytest.mark.parametrize("include_bodyweight", [True, False])
+@pytest.mark.parametrize("seed", range(20))
+def test_vectorized_adjusted_weight_matches_row_wise(seed, include_bodyweight):
+    rng = np.random.default_rng(seed)
+    df = random_sets(rng, int(rng.integers(1, 400)))
+
+    result = app.apply_calculation_settings(app.add_metric_inputs(df), False, 0.5, include_bodyweight)
+
+    expected = reference_adjusted_weight(df) if include_bodyweight else df["weight"]
+    pd.testing.assert_series_equal(result["adjusted_weight"], expected, check_names=False, check_exact=True)
+    pd.testing.assert_series_equal(
+        result["set_volume"], expected * df["reps"], check_names=False, check_exact=True
+    )
+
+
+def test_missing_body_weight_column_is_nan_for_bodyweight_types():
+    df = pd.DataFrame({
+        "exercise_type": ["Assisted Bodyweight", "Weighted Bodyweight", "Weight & Reps"],
+        "weight": [20.0, 10.0, 50.0],
+        "reps": [5.0, 5.0, 5.0],
+        "set_type": ["normal"] * 3,
+    })
+
+    result = app.apply_calculation_settings(app.add_metric_inputs(df), False, 0.5, True)
+
+    assert result["adjusted_weight"].isna().tolist() == [True, True, False]
+    assert result["adjusted_weight"].iloc[2] == 50.0
+
+
+def test_empty_frame():
+    df = random_sets(np.random.default_rng(0), 1).iloc[:0]
+
+    result = app.apply_calculation_settings(app.add_metric_inputs(df), False, 0.5, True)
+
+    assert result.empty
+    assert "adjusted_weight" in result.columns
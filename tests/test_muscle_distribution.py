@@ -0,0 +1,196 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+SAMPLE_CSV = Path(app.APP_DIR) / "hevy_workouts_sample.csv"
+# build_muscle_distribution / build_detailed_muscle_distribution output on the
+# sample export, written by the iterrows implementation the muscle-hit
+# matrices replaced (no custom exercises, secondary factor 0.5, warmups off)
+GOLDEN_CSV = Path(__file__).parent / "data" / "muscle_distribution_golden.csv"
+METRICS = app.MUSCLE_DISTRIBUTION_METRICS
+GROUP_KEYS = ["period_start", "muscle_group"]
+DETAILED_KEYS = ["period_start", "big_group", "fine_muscle"]
+SECONDARY_FACTOR = 0.5
+
+CUSTOM_EXERCISES = """exercise_title,primary_muscle,secondary_muscles,equipment
+Custom Sled Push,Quadriceps,Glutes;Calves,Other
+Custom Mystery Move,Chest,Unknown Muscle; ;Triceps,Other
+Custom Core Thing,Abdominals,,None
+Custom Wing Flap,Wings,Biceps;Upper Back,None
+Custom Row,Upper Back,Lats;Upper Back;Biceps,Cable
+"""
+
+
+def process(raw: pd.DataFrame, exercises: pd.DataFrame) -> pd.DataFrame:
+    return app.apply_calculation_settings(
+        app.add_metric_inputs(app.prepare_workout_df(raw, exercises)), False, 0.5, True
+    )
+
+
+@pytest.fixture(scope="module")
+def sample_raw() -> pd.DataFrame:
+    raw, _ = app.ingest_hevy_csv(SAMPLE_CSV)
+    return raw
+
+
+@pytest.fixture(scope="module")
+def sample_processed(sample_raw) -> pd.DataFrame:
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(app, "CUSTOM_EXERCISES_PATH", Path("/nonexistent/custom_exercises.csv"))
+        exercises = app.load_exercises()
+    return process(sample_raw, exercises)
+
+
+@pytest.fixture
+def custom_processed(sample_raw, tmp_path, monkeypatch) -> pd.DataFrame:
+    """Sample sets plus sets of custom-mapped exercises, with empty and unknown secondary muscles."""
+    custom_path = tmp_path / "custom_exercises.csv"
+    custom_path.write_text(CUSTOM_EXERCISES, encoding="utf-8")
+    monkeypatch.setattr(app, "CUSTOM_EXERCISES_PATH", custom_path)
+    exercises = app.load_exercises()
+
+    titles = ["Custom Sled Push", "Custom Mystery Move", "Custom Core Thing", "Custom Wing Flap",
+              "Custom Row", "Not In Any Catalogue"]
+    extra = sample_raw.iloc[: 4 * len(titles)].copy()
+    extra["exercise_title"] = [titles[i % len(titles)] for i in range(len(extra))]
+    raw = pd.concat([sample_raw.astype({"exercise_title": object}), extra], ignore_index=True)
+    df = process(raw, exercises)
+
+    # secondary_groups strings the catalogue would never produce: blanks, unknown and repeated groups
+    odd = df.index[::7]
+    df.loc[odd, "secondary_groups"] = np.resize(["", " ", "Chest;Unknown; ", "Arms;Arms", "Legs;;Core"], len(odd))
+    return df
+
+
+def reference_periods(df: pd.DataFrame, view_mode: str, week_start: str) -> pd.Series:
+    dates = pd.to_datetime(df["date"], errors="coerce")
+    if view_mode == "Month":
+        return dates.dt.to_period("M").dt.start_time.dt.date
+    anchor = "W-SUN" if week_start == "Monday" else "W-SAT"
+    return dates.dt.to_period(anchor).dt.start_time.dt.date
+
+
+def reference_distribution(df: pd.DataFrame, view_mode: str, week_start: str, detailed: bool) -> pd.DataFrame:
+    """Row-wise: one hit row per set and muscle, then the four metrics, as the iterrows code did."""
+    includes = {"Upper Back": ["Traps"]} if detailed else {}
+    known = app.MUSCLE_TO_GROUP if detailed else app.MUSCLE_GROUPS
+    primary_column, secondary_column = ("primary_muscle", "other_muscles") if detailed else ("primary_group", "secondary_groups")
+    periods = reference_periods(df, view_mode, week_start)
+
+    hits = []
+    for period, row in zip(periods, df.to_dict("records")):
+        muscles = []
+        primary = row.get(primary_column)
+        if isinstance(primary, str) and primary in known:
+            muscles.append((primary, 1.0))
+        secondary = row.get(secondary_column) or ""
+        if isinstance(secondary, str):
+            muscles += [(m.strip(), SECONDARY_FACTOR) for m in secondary.split(";") if m.strip() in known]
+        muscles += [(target, weight) for muscle, weight in muscles for target in includes.get(muscle, [])]
+        for muscle, weight in muscles:
+            hits.append({
+                "period_start": period,
+                "workout_id": row["workout_id"],
+                "muscle": muscle,
+                "Sets": row["metric_set_factor"] * weight,
+                "Volume": row["metric_set_volume"] * weight,
+            })
+    hits = pd.DataFrame(hits)
+    durations = df.groupby("workout_id", observed=True)["workout_duration_min"].first()
+    hits["duration"] = hits["workout_id"].map(durations)
+    muscle_count = hits.groupby(["period_start", "workout_id"])["muscle"].transform("nunique")
+    hits["Duration"] = hits["duration"] / muscle_count / 60.0
+
+    grouped = hits.groupby(["period_start", "muscle"])
+    result = pd.concat(
+        [
+            grouped["workout_id"].nunique().rename("Workouts"),
+            grouped["Duration"].sum(),
+            grouped["Volume"].sum(),
+            grouped["Sets"].sum(),
+        ],
+        axis=1,
+    ).reset_index()
+    if not detailed:
+        return result.rename(columns={"muscle": "muscle_group"})
+    result.insert(1, "big_group", result["muscle"].map(app.MUSCLE_TO_GROUP))
+    # Muscles without a big group (Cardio, ...) only count towards the Duration split
+    return result.dropna(subset=["big_group"]).rename(columns={"muscle": "fine_muscle"})
+
+
+def canonical(df: pd.DataFrame, keys: list) -> pd.DataFrame:
+    df = df[keys + METRICS].copy()
+    df["period_start"] = pd.to_datetime(df["period_start"].astype(str)).dt.strftime("%Y-%m-%d")
+    for key in keys[1:]:
+        df[key] = df[key].astype(str)
+    df["Workouts"] = df["Workouts"].astype(np.int64)
+    return df.astype({metric: float for metric in METRICS[1:]}).sort_values(keys).reset_index(drop=True)
+
+
+def test_aggregate_muscle_hits_matches_row_wise_reference(sample_processed):
+    df = app.add_period_index(sample_processed)
+    for view_mode, week_start in [("Week", "Monday"), ("Week", "Sunday"), ("Month", "Monday")]:
+        period_col = app.get_period_column(view_mode, week_start)
+        profile_codes, hits, weights, muscle_columns, _ = app.get_muscle_group_hits(df, SECONDARY_FACTOR)
+
+        aggregated = app.aggregate_muscle_hits(df, period_col, profile_codes, hits, weights)
+
+        result = app.muscle_hits_to_frame(aggregated, muscle_columns)
+        expected = reference_distribution(sample_processed, view_mode, week_start, detailed=False)
+        pd.testing.assert_frame_equal(canonical(result, GROUP_KEYS), canonical(expected, GROUP_KEYS), rtol=1e-9)
+
+
+@pytest.mark.parametrize("detailed", [False, True], ids=["group", "detailed"])
+@pytest.mark.parametrize("week_start", ["Monday", "Sunday"])
+@pytest.mark.parametrize("view_mode", ["Week", "Month"])
+def test_distribution_matches_golden_values(sample_processed, view_mode, week_start, detailed):
+    keys = DETAILED_KEYS if detailed else GROUP_KEYS
+    golden = pd.read_csv(GOLDEN_CSV, keep_default_na=False, na_values={metric: [""] for metric in METRICS})
+    golden = golden[
+        (golden["view_mode"] == view_mode) & (golden["week_start"] == week_start) & (golden["detailed"] == detailed)
+    ]
+    assert len(golden)
+
+    metrics_df = app.build_muscle_distribution_metrics(sample_processed, view_mode, week_start, detailed=detailed)
+
+    expected = canonical(golden, keys)
+    pd.testing.assert_frame_equal(canonical(metrics_df, keys), expected, rtol=1e-9)
+    build = app.build_detailed_muscle_distribution if detailed else app.build_muscle_distribution
+    for metric in METRICS:
+        pd.testing.assert_frame_equal(
+            build(sample_processed, view_mode, metric, week_start),
+            app.select_distribution_metric(metrics_df, metric),
+        )
+
+
+@pytest.mark.parametrize("detailed", [False, True], ids=["group", "detailed"])
+@pytest.mark.parametrize("view_mode, week_start", [("Week", "Monday"), ("Week", "Sunday"), ("Month", "Monday")])
+def test_custom_and_odd_secondary_muscles_match_row_wise_reference(custom_processed, view_mode, week_start, detailed):
+    keys = DETAILED_KEYS if detailed else GROUP_KEYS
+
+    metrics_df = app.build_muscle_distribution_metrics(custom_processed, view_mode, week_start, detailed=detailed)
+
+    expected = reference_distribution(custom_processed, view_mode, week_start, detailed)
+    pd.testing.assert_frame_equal(canonical(metrics_df, keys), canonical(expected, keys), rtol=1e-9)
+
+
+def test_custom_exercises_reach_the_distribution(custom_processed):
+    detailed = app.build_muscle_distribution_metrics(custom_processed, "Month", detailed=True)
+    # Custom Row lists Upper Back as primary and secondary; Upper Back also counts for Traps
+    assert {"Traps", "Upper Back", "Quadriceps", "Calves"} <= set(detailed["fine_muscle"])
+    assert "Unknown Muscle" not in set(detailed["fine_muscle"])
+    assert "Wings" not in set(detailed["fine_muscle"])
+
+
+@pytest.mark.parametrize("columns", [["primary_group", "secondary_groups"], ["primary_muscle", "other_muscles"]])
+def test_factorize_muscle_profiles_round_trips_row_values(custom_processed, columns):
+    profile_codes, profiles = app.factorize_muscle_profiles(custom_processed, columns)
+
+    assert len(profiles) == len(set(profiles))
+    rows = custom_processed[columns].astype(object).where(custom_processed[columns].notna(), None)
+    expected = list(rows.itertuples(index=False, name=None))
+    assert [profiles[code] for code in profile_codes] == expected
@@ -0,0 +1,50 @@
+from pathlib import Path
+
+import pandas as pd
+
+import app
+from fake_hevy_server import FakeHevyServer
+
+SAMPLE_CSV = Path(app.APP_DIR) / "hevy_workouts_sample.csv"
+CSV_SOURCE = "Upload CSV File"
+
+
+def make_api_batch(workouts: int = 3) -> pd.DataFrame:
+    server = FakeHevyServer(workouts=workouts)
+    df, _ = app.convert_hevy_api_to_csv_format({"workouts": list(server.workouts.values())})
+    return df
+
+
+def test_appended_api_batch_survives_save_and_reload(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "WORKOUT_STORE_PATH", tmp_path / "store.sqlite3")
+    csv_df, _ = app.ingest_hevy_csv(SAMPLE_CSV)
+    app.save_dataset_to_store(CSV_SOURCE, csv_df, {})
+
+    merged, added, _, _ = app.merge_import_batch(csv_df, make_api_batch())
+    app.apply_workout_changes_to_store(CSV_SOURCE, added, [], {}, merged)
+    loaded = app.load_datasets_from_store()[0][CSV_SOURCE]
+
+    assert len(loaded) == len(merged) == len(csv_df) + len(added)
+    assert pd.api.types.is_datetime64_any_dtype(loaded["start_dt"])
+    assert loaded["start_dt"].dt.tz is None
+    pd.testing.assert_series_equal(loaded["start_dt"], merged["start_dt"], check_dtype=False)
+    assert isinstance(loaded["exercise_title"].dtype, pd.CategoricalDtype)
+
+    exercises = app.load_exercises()
+    prepared = app.prepare_workout_df(loaded, exercises)
+    assert prepared["start_dt"].notna().sum() == merged["start_dt"].notna().sum()
+    # Without the stored start_dt/end_dt the raw text gives the same times
+    reparsed = app.prepare_workout_df(loaded.drop(columns=["start_dt", "end_dt"]), exercises)
+    pd.testing.assert_series_equal(reparsed["start_dt"], prepared["start_dt"], check_dtype=False)
+
+
+def test_parse_mixed_utc_and_local_timestamps():
+    values = pd.Series(["1 Dec 2025, 12:05", "2025-12-01T12:05:00Z", "1 Dec 2025, 12:05", None], dtype="str")
+
+    parsed = app.parse_workout_timestamps(values)
+
+    assert parsed.dt.tz is None
+    assert parsed[0] == pd.Timestamp("2025-12-01 12:05")
+    utc_as_local = app.to_local_workout_times(pd.Series(pd.to_datetime(["2025-12-01T12:05:00Z"])))
+    assert parsed[1] == utc_as_local[0]
+    assert pd.isna(parsed[3])